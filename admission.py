@@ -0,0 +1,179 @@
+import asyncio
+import bisect
+import itertools
+import re
+from collections import Counter
+from typing import NamedTuple
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+import settings
+
+
+class AdmissionRule(NamedTuple):
+    # lower is admitted first when requests queue for a slot
+    priority: int
+    # requests of the route in flight at once, None for the global limit only
+    max_concurrency: int | None
+    # seconds a request may wait for a slot before it is rejected
+    queue_timeout: float
+
+
+class Overloaded(Exception):
+    """No slot was free within the request's queue deadline"""
+
+
+class AdmissionController:
+    """Bounds the requests in flight, queueing the rest by priority.
+
+    A queued request waits at most its rule's queue_timeout and is then
+    rejected, so when the database slows down the excess fails fast
+    instead of piling up on the connection pool. A freed slot goes to the
+    first waiter, by priority then arrival, whose route is under its limit.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._active = 0
+        self._route_active: Counter[str] = Counter()
+        # (priority, arrival, route, rule, future), kept sorted
+        self._waiters: list[tuple] = []
+        self._arrivals = itertools.count()
+
+    async def acquire(self, route: str, rule: AdmissionRule) -> None:
+        # waiters that could run were woken already, the rest wait on
+        # their own route's limit, so a free slot can be taken directly
+        if self._can_run(route, rule):
+            self._take(route)
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise Overloaded
+        future = asyncio.get_running_loop().create_future()
+        waiter = (rule.priority, next(self._arrivals), route, rule, future)
+        bisect.insort(self._waiters, waiter, key=lambda waiter: waiter[:2])
+        try:
+            await asyncio.wait([future], timeout=rule.queue_timeout)
+        except BaseException:
+            self._give_up(waiter)
+            raise
+        if not future.done():
+            self._give_up(waiter)
+            raise Overloaded
+
+    def release(self, route: str) -> None:
+        self._active -= 1
+        self._route_active[route] -= 1
+        for waiter in list(self._waiters):
+            if self._active >= self.max_concurrency:
+                break
+            _, _, waiter_route, rule, future = waiter
+            if self._can_run(waiter_route, rule):
+                self._waiters.remove(waiter)
+                self._take(waiter_route)
+                future.set_result(None)
+
+    def _can_run(self, route: str, rule: AdmissionRule) -> bool:
+        return self._active < self.max_concurrency and (
+            rule.max_concurrency is None
+            or self._route_active[route] < rule.max_concurrency
+        )
+
+    def _take(self, route: str) -> None:
+        self._active += 1
+        self._route_active[route] += 1
+
+    def _give_up(self, waiter: tuple) -> None:
+        _, _, route, _, future = waiter
+        if future.done():
+            # the slot was granted in the meantime, hand it on
+            self.release(route)
+        else:
+            self._waiters.remove(waiter)
+            future.cancel()
+
+
+PLACE_ORDER_RULE = AdmissionRule(
+    priority=0, max_concurrency=None, queue_timeout=settings.ADMISSION_ORDER_QUEUE_TIMEOUT
+)
+DEFAULT_RULE = AdmissionRule(
+    priority=1, max_concurrency=None, queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT
+)
+LIST_RULE = AdmissionRule(
+    priority=2,
+    max_concurrency=settings.ADMISSION_LIST_CONCURRENCY,
+    queue_timeout=settings.ADMISSION_LIST_QUEUE_TIMEOUT,
+)
+EXPORT_RULE = AdmissionRule(
+    priority=2,
+    max_concurrency=settings.ADMISSION_EXPORT_CONCURRENCY,
+    queue_timeout=settings.ADMISSION_LIST_QUEUE_TIMEOUT,
+)
+
+# (method, path) patterns and their rule, the first match wins. None leaves
+# the route alone: event streams stay open for as long as the client
+# watches and would hold a slot the whole time.
+ROUTE_RULES: list[tuple[str, re.Pattern, AdmissionRule | None]] = [
+    ("POST", re.compile(r"^/order/?$"), PLACE_ORDER_RULE),
+    ("GET", re.compile(r"^/order/changes/stream$"), None),
+    ("GET", re.compile(r"^/order/[^/]+/events$"), None),
+    ("GET", re.compile(r"^/order/export$"), EXPORT_RULE),
+    ("GET", re.compile(r"^/(order|product)/?$"), LIST_RULE),
+    ("GET", re.compile(r"^/analytics/"), LIST_RULE),
+]
+
+
+class AdmissionMiddleware:
+    """Admits each request through the controller before it reaches the app.
+
+    Plain ASGI rather than an http middleware, so the slot is held until
+    the last byte of a streamed response is sent.
+    """
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        route, rule = self._match(scope["method"], scope["path"])
+        if rule is None:
+            return await self.app(scope, receive, send)
+        try:
+            await self.controller.acquire(route, rule)
+        except Overloaded:
+            response = _service_unavailable("Server is overloaded, retry later.")
+            return await response(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(route)
+
+    @staticmethod
+    def _match(method: str, path: str) -> tuple[str, AdmissionRule | None]:
+        for rule_method, pattern, rule in ROUTE_RULES:
+            if method == rule_method and pattern.match(path):
+                return f"{method} {pattern.pattern}", rule
+        return "default", DEFAULT_RULE
+
+
+async def database_busy(request: Request, exc: PoolTimeoutError) -> JSONResponse:
+    """Exception handler for requests that waited DB_POOL_TIMEOUT for a connection"""
+    return _service_unavailable("Database is busy, retry later.")
+
+
+def _service_unavailable(detail: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": detail},
+        headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER)},
+    )
+
+
+admission_controller = AdmissionController(
+    max_concurrency=settings.ADMISSION_MAX_CONCURRENCY,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+)
@@ -0,0 +1,96 @@
+from datetime import datetime, timezone
+from uuid import UUID
+
+from fastapi import HTTPException
+
+from api.models.analytics import RevenueBucket, RevenueReport, TopProduct
+from db.dals.analytics_dal import AnalyticsDAL
+from enums import OrderStatusEnum, RollupGranularityEnum
+
+# statuses counted as sales unless the client asks for others
+SALE_STATUSES = [
+    OrderStatusEnum.PENDING,
+    OrderStatusEnum.SHIPPED,
+    OrderStatusEnum.DELIVERED,
+]
+
+
+def _to_utc(moment: datetime) -> datetime:
+    # order_date is naive UTC
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _utc_range(start: datetime, end: datetime) -> tuple[datetime, datetime]:
+    start, end = _to_utc(start), _to_utc(end)
+    if start >= end:
+        raise HTTPException(status_code=422, detail="start must be before end")
+    return start, end
+
+
+def _pick_granularity(start: datetime, end: datetime) -> RollupGranularityEnum:
+    """Daily rollups when the range is made of whole days, hourly otherwise"""
+    midnight = {"hour": 0, "minute": 0, "second": 0, "microsecond": 0}
+    if start == start.replace(**midnight) and end == end.replace(**midnight):
+        return RollupGranularityEnum.DAY
+    return RollupGranularityEnum.HOUR
+
+
+async def _get_revenue(
+    granularity: RollupGranularityEnum,
+    start: datetime,
+    end: datetime,
+    statuses: list[OrderStatusEnum] | None,
+    product_id: UUID | None,
+    analytics_dal: AnalyticsDAL,
+) -> RevenueReport:
+    start, end = _utc_range(start, end)
+    rows = await analytics_dal.get_revenue(
+        granularity,
+        start,
+        end,
+        statuses or SALE_STATUSES,
+        product_id=product_id,
+    )
+    return RevenueReport(
+        granularity=granularity,
+        buckets=[
+            RevenueBucket(
+                bucket_start=row.bucket_start,
+                orders=row.orders,
+                units=row.units,
+                revenue=row.revenue,
+            )
+            for row in rows
+        ],
+    )
+
+
+async def _get_top_products(
+    start: datetime,
+    end: datetime,
+    statuses: list[OrderStatusEnum] | None,
+    order_by: str,
+    limit: int,
+    analytics_dal: AnalyticsDAL,
+) -> list[TopProduct]:
+    start, end = _utc_range(start, end)
+    rows = await analytics_dal.get_top_products(
+        _pick_granularity(start, end),
+        start,
+        end,
+        statuses or SALE_STATUSES,
+        order_by=order_by,
+        limit=limit,
+    )
+    return [
+        TopProduct(
+            product_id=row.product_id,
+            name=row.name,
+            orders=row.orders,
+            units=row.units,
+            revenue=row.revenue,
+        )
+        for row in rows
+    ]
@@ -1,14 +1,28 @@
+import math
+from datetime import datetime, timedelta
 from typing import Annotated, Union
+from uuid import UUID, uuid4
 
-from fastapi import APIRouter, status, Depends, HTTPException
+from fastapi import APIRouter, status, Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
+from jose import JWTError
+from sqlalchemy.engine import Row
 
 import settings
+from api.models.user import Token
+from db.dals.refresh_token_dal import RefreshTokenDAL
+from db.dals.revoked_token_dal import RevokedTokenDAL
 from db.dals.user_dal import UserDAL
-from db.models import User
 from hashing import Hasher
-from dependencies.dals import get_user_dal
+from dependencies.dals import get_revoked_token_dal, get_user_dal
+from revocation import revocation_list
+from throttling import login_throttle
+from security import (
+    create_access_token,
+    create_refresh_token,
+    decode_access_token,
+    hash_refresh_token,
+)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login/token")
 
@@ -19,35 +33,126 @@ async def _get_user_by_email_for_auth(email: str, user_dal: UserDAL):
     return await user_dal.get_user_by_email(email=email)
 
 
+def _client_ip(request: Request) -> str:
+    forwarded_for = request.headers.get("X-Forwarded-For")
+    if settings.TRUST_FORWARDED_FOR and forwarded_for:
+        # the proxy appends the address it saw, entries before it are
+        # whatever the client sent
+        return forwarded_for.split(",")[-1].strip()
+    return request.client.host if request.client else ""
+
+
+async def _throttle_login(request: Request, email: str) -> None:
+    """Reject an attempt over the IP or email limit before any real work"""
+    retry_after = await login_throttle.check(_client_ip(request), email)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, try again later.",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+
 async def authenticate_user(
     email: str, password: str, user_dal: UserDAL
-) -> Union[User, None]:
+) -> Union[Row, None]:
     user = await _get_user_by_email_for_auth(email=email, user_dal=user_dal)
     if user is None:
+        # hash anyway so unknown emails can't be told apart by response time
+        Hasher.dummy_verify_password()
         return
     if not Hasher.verify_password(password, user.hashed_password):
         return
     return user
 
 
-async def get_current_user_from_token(
-    user_dal: Annotated[UserDAL, Depends(get_user_dal)],
+async def _issue_tokens(
+    email: str,
+    user_id: UUID,
+    refresh_token_dal: RefreshTokenDAL,
+    family_id: UUID | None = None,
+) -> Token:
+    """Sign an access token and store a refresh token for the next renewal"""
+    access_token = create_access_token(
+        data={"sub": email},
+        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+    refresh_token, refresh_token_hash = create_refresh_token()
+    await refresh_token_dal.create_token(
+        token_hash=refresh_token_hash,
+        family_id=family_id or uuid4(),
+        user_id=user_id,
+        expires_at=datetime.utcnow()
+        + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+    )
+    return Token(
+        access_token=access_token, token_type="bearer", refresh_token=refresh_token
+    )
+
+
+async def _refresh_tokens(
+    refresh_token: str, refresh_token_dal: RefreshTokenDAL
+) -> Token | None:
+    """Exchange a refresh token for new tokens, rotating the refresh token.
+
+    Presenting an already used refresh token means it was stolen or
+    replayed, so every token issued from the same login is revoked.
+    """
+    refresh_token_hash = hash_refresh_token(refresh_token)
+    owner = await refresh_token_dal.use_token(refresh_token_hash)
+    if owner is None:
+        await refresh_token_dal.revoke_reused_family(refresh_token_hash)
+        # committed now, the request's transaction is rolled back with its 401
+        await refresh_token_dal.db_session.commit()
+        return None
+    return await _issue_tokens(
+        owner.email, owner.user_id, refresh_token_dal, family_id=owner.family_id
+    )
+
+
+async def _revoke_tokens(
+    payload: dict,
+    refresh_token: str | None,
+    revoked_token_dal: RevokedTokenDAL,
+    refresh_token_dal: RefreshTokenDAL,
+) -> None:
+    """Revoke the access token until it expires, and its refresh tokens"""
+    await revoked_token_dal.revoke(
+        payload["jti"], expires_at=datetime.utcfromtimestamp(payload["exp"])
+    )
+    revocation_list.add(payload["jti"])
+    if refresh_token is not None:
+        await refresh_token_dal.revoke_family(hash_refresh_token(refresh_token))
+
+
+async def get_current_token_payload(
+    revoked_token_dal: Annotated[RevokedTokenDAL, Depends(get_revoked_token_dal)],
     token: str = Depends(oauth2_scheme),
-):
+) -> dict:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
     )
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
-        email: str = payload.get("sub")
-        print("username/email extracted is ", email)
-        if email is None:
-            raise credentials_exception
+        payload = decode_access_token(token)
     except JWTError:
         raise credentials_exception
+    if payload.get("sub") is None or payload.get("jti") is None:
+        raise credentials_exception
+    if await revocation_list.is_revoked(payload["jti"], revoked_token_dal):
+        raise credentials_exception
+    return payload
+
+
+async def get_current_user_from_token(
+    user_dal: Annotated[UserDAL, Depends(get_user_dal)],
+    payload: Annotated[dict, Depends(get_current_token_payload)],
+):
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+    )
+    email: str = payload["sub"]
     user = await _get_user_by_email_for_auth(email=email, user_dal=user_dal)
     if user is None:
         raise credentials_exception
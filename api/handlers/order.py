@@ -1,40 +1,80 @@
+import asyncio
+import hashlib
+import time
 from typing import Annotated
 from uuid import UUID
 
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Request
 
-from api.models.order import CreateOrder, ShowOrder
+import settings
+from api.models.order import (
+    CreateOrder,
+    OrderChanges,
+    OrderStatusEvent,
+    ShowOrder,
+    ShowOrderEvent,
+)
+from api.models.product import ShowProduct
 from api.models.user import ShowUser
+from db.dals.idempotency_dal import IdempotencyDAL
+from db.dals.job_dal import JobDAL
 from db.dals.order_dal import OrderDAL
 from db.dals.product_dal import ProductDAL
+from db.dals.watermark_dal import WatermarkDAL
+from db.loaders import RequestLoaders
+from db.models import Order
+from db.notifications import order_listener
+from db.session import async_session
 from enums import OrderStatusEnum
-from dependencies.dals import get_order_dal, get_product_dal
+from jobs import REFRESH_ORDER_ROLLUPS_JOB
+from dependencies.dals import get_job_dal, get_order_dal, get_product_dal
 from dataclasses_ import OrderWithUserSummary
+from sse import SSE_HEARTBEAT, format_sse
+
+# cursor of the order change feed is "<tx_id>-<seq>" of the last seen event
+ORDER_CHANGES_CURSOR_PATTERN = r"^\d+-\d+$"
+ORDER_CHANGES_START = "0-0"
 
 
 async def _create_new_order(
     body: CreateOrder,
     order_dal: Annotated[OrderDAL, Depends(get_order_dal)],
     product_dal: Annotated[ProductDAL, Depends(get_product_dal)],
+    job_dal: Annotated[JobDAL, Depends(get_job_dal)],
 ) -> ShowOrder:
-    product = await product_dal.get_product_by_id(body.product_id)
-
-    if product is None:
-        raise HTTPException(status_code=404, detail="Product not found")
-
-    if product.stock_quantity < body.quantity:
-        raise HTTPException(
-            status_code=400, detail="Insufficient stock for this product."
-        )
-
-    order = await order_dal.create_order(
+    # The price is always the product's current one, whatever the client sent
+    order = await order_dal.place_order(
         user_id=body.user_id,
         product_id=body.product_id,
         quantity=body.quantity,
-        total_price=body.total_price,
         description=body.description,
     )
-    await product_dal.update_stock(body.product_id, -body.quantity)
+    if order is None:
+        product = await product_dal.get_product_by_id(body.product_id)
+        if product is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        if not product.stock_shards or (
+            await product_dal.update_stock(body.product_id, -body.quantity) is None
+        ):
+            raise HTTPException(
+                status_code=400, detail="Insufficient stock for this product."
+            )
+        # Sharded stock is taken on its sub-counters, outside the order statement
+        order = await order_dal.create_order(
+            user_id=body.user_id,
+            product_id=body.product_id,
+            quantity=body.quantity,
+            total_price=product.price * body.quantity,
+            description=body.description,
+        )
+    # Slow follow-up work runs in the background once the order is
+    # committed, one waiting refresh covers any number of orders
+    await job_dal.enqueue(
+        REFRESH_ORDER_ROLLUPS_JOB,
+        payload={},
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+        coalesce=True,
+    )
 
     return ShowOrder(
         order_id=order.order_id,
@@ -45,17 +85,129 @@ async def _create_new_order(
     )
 
 
+# Requests with the same Idempotency-Key running in this process share one result
+_inflight_orders: dict[str, tuple[str, asyncio.Future]] = {}
+
+
+async def _create_new_order_once(
+    body: CreateOrder,
+    idempotency_key: str,
+    order_dal: OrderDAL,
+    product_dal: ProductDAL,
+    idempotency_dal: IdempotencyDAL,
+    claim_dal: IdempotencyDAL,
+    job_dal: JobDAL,
+) -> ShowOrder:
+    # total_price is ignored, a retry differing only in it is the same order
+    request_hash = hashlib.sha256(
+        body.json(exclude={"total_price"}).encode()
+    ).hexdigest()
+    inflight = _inflight_orders.get(idempotency_key)
+    if inflight is not None:
+        inflight_hash, future = inflight
+        if inflight_hash != request_hash:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key was already used with a different request.",
+            )
+        return await asyncio.shield(future)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight_orders[idempotency_key] = (request_hash, future)
+    try:
+        order = await _claim_and_create_order(
+            body,
+            idempotency_key,
+            request_hash,
+            order_dal,
+            product_dal,
+            idempotency_dal,
+            claim_dal,
+            job_dal,
+        )
+    except BaseException as err:
+        future.set_exception(err)
+        # nobody may be waiting, don't let asyncio log it as never retrieved
+        future.exception()
+        raise
+    else:
+        future.set_result(order)
+        return order
+    finally:
+        del _inflight_orders[idempotency_key]
+
+
+async def _claim_and_create_order(
+    body: CreateOrder,
+    idempotency_key: str,
+    request_hash: str,
+    order_dal: OrderDAL,
+    product_dal: ProductDAL,
+    idempotency_dal: IdempotencyDAL,
+    claim_dal: IdempotencyDAL,
+    job_dal: JobDAL,
+) -> ShowOrder:
+    # Another process may own the key, wait for its stored response. The
+    # claim commits on its own, so those processes see it at once rather
+    # than block on the row until this request ends.
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+    while True:
+        async with claim_dal.db_session.begin():
+            if await claim_dal.claim_key(
+                idempotency_key,
+                request_hash,
+                ttl_seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS,
+                lock_seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT,
+            ):
+                break
+            stored = await claim_dal.get_key(idempotency_key)
+        if stored is not None:
+            if stored.request_hash != request_hash:
+                raise HTTPException(
+                    status_code=422,
+                    detail="Idempotency-Key was already used with a different request.",
+                )
+            if stored.response_body is not None:
+                return ShowOrder.parse_raw(stored.response_body)
+        if time.monotonic() >= deadline:
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this Idempotency-Key is still in progress.",
+            )
+        await asyncio.sleep(settings.IDEMPOTENCY_POLL_INTERVAL)
+
+    try:
+        order = await _create_new_order(body, order_dal, product_dal, job_dal)
+        await idempotency_dal.save_response(
+            idempotency_key, status_code=200, response_body=order.json()
+        )
+        # The order and its stored response commit here rather than when
+        # the request ends, so requests sharing the key only ever get a
+        # committed order
+        await idempotency_dal.db_session.commit()
+    except BaseException:
+        await idempotency_dal.db_session.rollback()
+        # failed attempts are not remembered, so the client can retry them
+        async with claim_dal.db_session.begin():
+            await claim_dal.release_key(idempotency_key)
+        raise
+    return order
+
+
 async def _delete_order(
     order_id: UUID, order_dal: OrderDAL, product_dal: ProductDAL
 ) -> UUID | None:
-    # Receive order data
-    order = await order_dal.get_order_by_id(order_id)
+    # Locked until commit, so the order can't be swept or deleted meanwhile
+    order = await order_dal.get_order_for_update(order_id)
     if not order or order.order_status == OrderStatusEnum.DELETED:
         return None
-    # Returning the quantity of products to the warehouse
-    await product_dal.update_stock(order.product_id, order.quantity)
-    # Mark the order as deleted
     delete_order_id = await order_dal.delete_order(order_id)
+    if delete_order_id is None:
+        return None
+    # Returning the quantity of products to the warehouse, in the same
+    # transaction as the deletion. Canceled orders returned it already.
+    if order.order_status != OrderStatusEnum.CANCELED and order.product_id is not None:
+        await product_dal.update_stock(order.product_id, order.quantity)
     return delete_order_id
 
 
@@ -75,24 +227,146 @@ async def _get_order_by_id(
     return order
 
 
-async def _get_all_orders(order_dal: OrderDAL) -> list[ShowOrder]:
-    orders = await order_dal.get_all_orders()
-    return [
-        ShowOrder(
-            order_id=order.order_id,
-            quantity=order.quantity,
-            total_price=order.total_price,
-            description=order.description,
-            order_status=order.order_status,
-            user=ShowUser(
-                user_id=order.user.user_id,
-                name=order.user.name,
-                surname=order.user.surname,
-                email=order.user.email,
-                is_active=order.user.is_active,
-            )
-            if order.user
-            else None,
+async def _get_all_orders(
+    order_dal: OrderDAL, loaders: RequestLoaders, include_description: bool = False
+) -> list[ShowOrder]:
+    orders = await order_dal.get_all_orders(include_description)
+    # one users and one products query for the whole page
+    return await asyncio.gather(
+        *(_show_order(order, loaders, include_description) for order in orders)
+    )
+
+
+async def _show_order(
+    order: Order, loaders: RequestLoaders, include_description: bool
+) -> ShowOrder:
+    user = await loaders.users.load(order.user_id)
+    product = None
+    if order.product_id is not None:
+        product = await loaders.products.load(order.product_id)
+    return ShowOrder(
+        order_id=order.order_id,
+        quantity=order.quantity,
+        total_price=order.total_price,
+        description=order.description if include_description else None,
+        order_status=order.order_status,
+        user=ShowUser(
+            user_id=user.user_id,
+            name=user.name,
+            surname=user.surname,
+            email=user.email,
+            is_active=user.is_active,
+        )
+        if user
+        else None,
+        product=ShowProduct(
+            product_id=product.product_id,
+            name=product.name,
+            description=product.description if include_description else None,
+            price=product.price,
+            stock_quantity=product.stock_quantity,
         )
-        for order in orders
+        if product
+        else None,
+    )
+
+
+async def _get_order_changes(
+    since: str, order_dal: OrderDAL, limit: int
+) -> OrderChanges:
+    tx_id, seq = (int(part) for part in since.split("-"))
+    events = await order_dal.get_events_since(tx_id=tx_id, seq=seq, limit=limit)
+    shown_events = [
+        ShowOrderEvent(
+            seq=event.seq,
+            order_id=event.order_id,
+            event_type=event.event_type,
+            order_status=event.order_status,
+            payload=event.payload,
+            created_at=event.created_at,
+            cursor=f"{event.tx_id}-{event.seq}",
+        )
+        for event in events
     ]
+    return OrderChanges(
+        events=shown_events,
+        cursor=shown_events[-1].cursor if shown_events else since,
+    )
+
+
+async def _stream_order_changes(since: str, request: Request):
+    """Server-Sent Events with every order change after the since cursor"""
+    cursor = since
+    last_sent = time.monotonic()
+    while not await request.is_disconnected():
+        # short-lived sessions, the stream must not hold a connection between polls
+        async with async_session() as session:
+            changes = await _get_order_changes(
+                cursor, OrderDAL(session), settings.ORDER_CHANGES_PAGE_SIZE
+            )
+        for event in changes.events:
+            yield format_sse(event.json(), event="order_change", event_id=event.cursor)
+        cursor = changes.cursor
+        if changes.events:
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= settings.SSE_HEARTBEAT_INTERVAL:
+            yield SSE_HEARTBEAT
+            last_sent = time.monotonic()
+        if len(changes.events) < settings.ORDER_CHANGES_PAGE_SIZE:
+            await asyncio.sleep(settings.ORDER_CHANGES_POLL_INTERVAL)
+
+
+async def _get_order_status(
+    order_id: UUID, order_dal: OrderDAL
+) -> OrderStatusEnum | None:
+    return await order_dal.get_order_status(order_id)
+
+
+async def _stream_order_status(order_id: UUID, request: Request):
+    """Server-Sent Events with the status of one order as it changes.
+
+    Fed by the worker's shared LISTEN connection, so a watcher costs no
+    database work until the order actually changes.
+    """
+    async with order_listener.subscribe(order_id) as notifications:
+        # subscribed first, so no change can slip in after this read
+        notification = None
+        while True:
+            if notification is None:
+                # a short-lived session, the stream outlives the request's
+                async with async_session() as session:
+                    order_status = await _get_order_status(order_id, OrderDAL(session))
+                if order_status is None:
+                    return
+                event = OrderStatusEvent(order_id=order_id, order_status=order_status)
+            else:
+                event = OrderStatusEvent(**notification)
+            yield format_sse(event.json(), event="order_status")
+            if event.order_status == OrderStatusEnum.DELETED:
+                return
+            while True:
+                try:
+                    notification = await asyncio.wait_for(
+                        notifications.get(), settings.SSE_HEARTBEAT_INTERVAL
+                    )
+                    break
+                except TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield SSE_HEARTBEAT
+
+
+async def _export_orders(since: str | None, batch_size: int):
+    """Cursor to resume from and the Arrow stream of orders changed after since.
+
+    Without since every order is exported.
+    """
+    from exporting import iter_order_rows, stream_arrow
+
+    async with async_session() as session:
+        until = await WatermarkDAL(session).get_last_event_cursor()
+    changed_between = None
+    if since is not None:
+        changed_between = (tuple(int(part) for part in since.split("-")), until)
+    rows = iter_order_rows(async_session, batch_size, changed_between=changed_between)
+    return f"{until[0]}-{until[1]}", stream_arrow(rows)
@@ -1,6 +1,13 @@
 from uuid import UUID
 
-from api.models.product import CreateProduct, ShowProduct
+from api.models.product import (
+    CreateProduct,
+    ProductBatchResult,
+    ShowProduct,
+    UpdatedProductsBatchResponse,
+    UpdateProductsBatch,
+)
+from caching import make_etag
 from db.dals.product_dal import ProductDAL
 
 
@@ -36,6 +43,40 @@ async def _update_product(
     return updated_product_id
 
 
+async def _update_products(
+    body: UpdateProductsBatch, product_dal: ProductDAL
+) -> UpdatedProductsBatchResponse:
+    products = await product_dal.update_products(
+        [update.dict() for update in body.updates]
+    )
+    updated = {product.product_id: product for product in products}
+    results = []
+    for update in body.updates:
+        product = updated.get(update.product_id)
+        if product is None:
+            results.append(ProductBatchResult(product_id=update.product_id, updated=False))
+            continue
+        results.append(
+            ProductBatchResult(
+                product_id=product.product_id,
+                updated=True,
+                price=product.price,
+                stock_quantity=product.stock_quantity,
+                product_status=product.product_status,
+            )
+        )
+    return UpdatedProductsBatchResponse(results=results)
+
+
+async def _set_stock_shards(
+    product_id: UUID, shards: int, product_dal: ProductDAL
+) -> UUID | None:
+    updated_product_id = await product_dal.set_stock_shards(
+        product_id=product_id, shards=shards
+    )
+    return updated_product_id
+
+
 async def _get_product_by_id(
     product_id: UUID, product_dal: ProductDAL
 ) -> ShowProduct | None:
@@ -50,13 +91,29 @@ async def _get_product_by_id(
         )
 
 
-async def _get_all_products(product_dal: ProductDAL) -> list[ShowProduct]:
-    products = await product_dal.get_all_products()
+async def _get_product_etag(product_id: UUID, product_dal: ProductDAL) -> str | None:
+    version = await product_dal.get_product_version(product_id)
+    if version is not None:
+        return make_etag(product_id, version)
+
+
+async def _get_products_etag(
+    product_dal: ProductDAL, include_description: bool = False
+) -> str:
+    total, versions = await product_dal.get_products_version()
+    # with and without descriptions are different representations
+    return make_etag("products", include_description, total, versions)
+
+
+async def _get_all_products(
+    product_dal: ProductDAL, include_description: bool = False
+) -> list[ShowProduct]:
+    products = await product_dal.get_all_products(include_description)
     return [
         ShowProduct(
             product_id=product.product_id,
             name=product.name,
-            description=product.description,
+            description=product.description if include_description else None,
             price=product.price,
             stock_quantity=product.stock_quantity,
         )
@@ -0,0 +1,26 @@
+from datetime import datetime
+from uuid import UUID
+
+from pydantic import BaseModel
+
+from enums import RollupGranularityEnum
+
+
+class RevenueBucket(BaseModel):
+    bucket_start: datetime
+    orders: int
+    units: int
+    revenue: float
+
+
+class RevenueReport(BaseModel):
+    granularity: RollupGranularityEnum
+    buckets: list[RevenueBucket]
+
+
+class TopProduct(BaseModel):
+    product_id: UUID
+    name: str
+    orders: int
+    units: int
+    revenue: float
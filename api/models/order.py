@@ -1,9 +1,11 @@
 import uuid
+from datetime import datetime
 
 from fastapi import HTTPException
 from pydantic import BaseModel, Field, validator, root_validator
-from enums import OrderStatusEnum
+from enums import OrderEventTypeEnum, OrderStatusEnum
 
+from api.models.product import ShowProduct
 from api.models.user import ShowUser
 
 
@@ -18,7 +20,11 @@ class CreateOrder(BaseModel):
     user_id: uuid.UUID
     product_id: uuid.UUID
     quantity: int = Field(gt=0, description="Quantity should be greater than 0")
-    total_price: float = Field(gt=0.0, description="Price must be greater than 0")
+    total_price: float | None = Field(
+        default=None,
+        gt=0.0,
+        description="Ignored, the order is priced from the product's current price",
+    )
     description: str | None = None
 
 
@@ -29,6 +35,7 @@ class ShowOrder(TunedModel):
     description: str | None = None
     order_status: OrderStatusEnum
     user: ShowUser | None = None
+    product: ShowProduct | None = None
 
 
 class UpdateOrder(BaseModel):
@@ -70,3 +77,26 @@ class DeleteOrderResponse(BaseModel):
 
 class UpdatedOrderResponse(BaseModel):
     updated_order_id: uuid.UUID
+
+
+class ShowOrderEvent(TunedModel):
+    seq: int
+    order_id: uuid.UUID
+    event_type: OrderEventTypeEnum
+    order_status: OrderStatusEnum
+    payload: dict
+    created_at: datetime
+    cursor: str
+
+
+class OrderChanges(BaseModel):
+    events: list[ShowOrderEvent]
+    # pass back as `since` to continue after the last event
+    cursor: str
+
+
+class OrderStatusEvent(BaseModel):
+    order_id: uuid.UUID
+    order_status: OrderStatusEnum
+    # None for the current status sent when the stream (re)starts
+    event_type: OrderEventTypeEnum | None = None
@@ -1,5 +1,8 @@
 from uuid import UUID
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
+
+import settings
+from enums import ProductStatusEnum
 
 
 class TunedModel(BaseModel):
@@ -41,6 +44,54 @@ class UpdateProduct(TunedModel):
     )
 
 
+class UpdateStockShards(BaseModel):
+    shards: int = Field(
+        ...,
+        ge=0,
+        le=settings.MAX_STOCK_SHARDS,
+        description="Number of stock sub-counters for a hot product, 0 disables sharding",
+    )
+
+
+class ProductBatchUpdate(BaseModel):
+    product_id: UUID
+    price: float | None = Field(default=None, gt=0, description="New price")
+    stock_quantity: int | None = Field(
+        default=None,
+        ge=0,
+        description="New stock quantity, 0 marks the product out of stock",
+    )
+
+
+class UpdateProductsBatch(BaseModel):
+    updates: list[ProductBatchUpdate]
+
+    @validator("updates")
+    def validate_updates(cls, value):
+        if not value or len(value) > settings.PRODUCT_BATCH_MAX_SIZE:
+            raise ValueError(
+                f"Between 1 and {settings.PRODUCT_BATCH_MAX_SIZE} updates are allowed"
+            )
+        if len({update.product_id for update in value}) != len(value):
+            raise ValueError("Every product may be updated only once per batch")
+        if any(update.price is None and update.stock_quantity is None for update in value):
+            raise ValueError("Every update needs a price or a stock_quantity")
+        return value
+
+
+class ProductBatchResult(BaseModel):
+    product_id: UUID
+    # False when there is no such product
+    updated: bool
+    price: float | None = None
+    stock_quantity: int | None = None
+    product_status: ProductStatusEnum | None = None
+
+
+class UpdatedProductsBatchResponse(BaseModel):
+    results: list[ProductBatchResult]
+
+
 class DeleteProductResponse(BaseModel):
     deleted_product_id: UUID
 
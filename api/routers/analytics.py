@@ -0,0 +1,43 @@
+from datetime import datetime
+from typing import Annotated, Literal
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, Query
+
+from api.handlers.analytics import _get_revenue, _get_top_products
+from api.models.analytics import RevenueReport, TopProduct
+from db.dals.analytics_dal import AnalyticsDAL
+from dependencies.dals import get_read_analytics_dal
+from enums import OrderStatusEnum, RollupGranularityEnum
+
+analytics_router = APIRouter()
+
+
+@analytics_router.get("/revenue", response_model=RevenueReport)
+async def get_revenue(
+    analytics_dal: Annotated[AnalyticsDAL, Depends(get_read_analytics_dal)],
+    start: datetime,
+    end: datetime,
+    granularity: RollupGranularityEnum = RollupGranularityEnum.DAY,
+    product_id: UUID | None = None,
+    status: Annotated[list[OrderStatusEnum] | None, Query()] = None,
+) -> RevenueReport:
+    """Orders, units and revenue per hour or day bucket starting in [start, end).
+
+    Served from rollups, which trail new orders by up to
+    ORDER_ROLLUP_REFRESH_INTERVAL seconds.
+    """
+    return await _get_revenue(granularity, start, end, status, product_id, analytics_dal)
+
+
+@analytics_router.get("/products/top", response_model=list[TopProduct])
+async def get_top_products(
+    analytics_dal: Annotated[AnalyticsDAL, Depends(get_read_analytics_dal)],
+    start: datetime,
+    end: datetime,
+    by: Literal["revenue", "units", "orders"] = "revenue",
+    limit: Annotated[int, Query(gt=0, le=100)] = 10,
+    status: Annotated[list[OrderStatusEnum] | None, Query()] = None,
+) -> list[TopProduct]:
+    """Best selling products over the hour or day buckets starting in [start, end)"""
+    return await _get_top_products(start, end, status, by, limit, analytics_dal)
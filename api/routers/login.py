@@ -1,41 +1,89 @@
-from datetime import timedelta
 from typing import Annotated
 
-from fastapi import APIRouter, status, Depends, HTTPException
+from fastapi import APIRouter, status, Depends, HTTPException, Request, Response
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.engine import Row
 
-from api.handlers.login import authenticate_user, get_current_user_from_token
-import settings
-from api.models.user import Token
+from api.handlers.login import (
+    _issue_tokens,
+    _refresh_tokens,
+    _revoke_tokens,
+    _throttle_login,
+    authenticate_user,
+    get_current_token_payload,
+    get_current_user_from_token,
+)
+from api.models.user import RefreshTokenRequest, ShowUser, Token
+from db.dals.refresh_token_dal import RefreshTokenDAL
+from db.dals.revoked_token_dal import RevokedTokenDAL
 from db.dals.user_dal import UserDAL
-from db.models import User
-from security import create_access_token
-from dependencies.dals import get_user_dal
+from dependencies.dals import (
+    get_refresh_token_dal,
+    get_revoked_token_dal,
+    get_user_dal,
+)
 
 login_router = APIRouter()
 
 
 @login_router.post("/token", response_model=Token)
 async def login_for_access_token(
+    request: Request,
     user_dal: Annotated[UserDAL, Depends(get_user_dal)],
+    refresh_token_dal: Annotated[RefreshTokenDAL, Depends(get_refresh_token_dal)],
     form_data: OAuth2PasswordRequestForm = Depends(),
 ):
+    await _throttle_login(request, form_data.username)
     user = await authenticate_user(form_data.username, form_data.password, user_dal)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
         )
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email, "other_custom_data": [1, 2, 3, 4]},
-        expires_delta=access_token_expires,
+    return await _issue_tokens(user.email, user.user_id, refresh_token_dal)
+
+
+@login_router.post("/refresh", response_model=Token)
+async def refresh_access_token(
+    body: RefreshTokenRequest,
+    refresh_token_dal: Annotated[RefreshTokenDAL, Depends(get_refresh_token_dal)],
+):
+    """Renew the access token without the password, cheaper than a new login"""
+    tokens = await _refresh_tokens(body.refresh_token, refresh_token_dal)
+    if tokens is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+        )
+    return tokens
+
+
+@login_router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    payload: Annotated[dict, Depends(get_current_token_payload)],
+    revoked_token_dal: Annotated[RevokedTokenDAL, Depends(get_revoked_token_dal)],
+    refresh_token_dal: Annotated[RefreshTokenDAL, Depends(get_refresh_token_dal)],
+    body: RefreshTokenRequest | None = None,
+):
+    """Revoke the current access token, and the refresh token if given"""
+    await _revoke_tokens(
+        payload,
+        body.refresh_token if body else None,
+        revoked_token_dal,
+        refresh_token_dal,
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
 @login_router.get("/test_auth_endpoint")
 async def sample_endpoint_under_jwt(
-    current_user: User = Depends(get_current_user_from_token),
+    current_user: Row = Depends(get_current_user_from_token),
 ):
-    return {"Success": True, "current_user": current_user}
+    user = ShowUser(
+        user_id=current_user.user_id,
+        name=current_user.name,
+        surname=current_user.surname,
+        email=current_user.email,
+        is_active=current_user.is_active,
+    )
+    return {"Success": True, "current_user": user}
@@ -2,26 +2,48 @@ from logging import getLogger
 from typing import Annotated
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.exc import IntegrityError
 
+import settings
 from api.handlers.order import (
+    ORDER_CHANGES_CURSOR_PATTERN,
+    ORDER_CHANGES_START,
     _create_new_order,
+    _create_new_order_once,
     _delete_order,
+    _export_orders,
     _get_all_orders,
     _get_order_by_id,
+    _get_order_changes,
+    _get_order_status,
+    _stream_order_changes,
+    _stream_order_status,
     _update_order,
 )
 from api.models.order import (
     CreateOrder,
+    OrderChanges,
     ShowOrder,
     UpdateOrder,
     DeleteOrderResponse,
     UpdatedOrderResponse,
 )
+from db.dals.idempotency_dal import IdempotencyDAL
+from db.dals.job_dal import JobDAL
 from db.dals.order_dal import OrderDAL
 from db.dals.product_dal import ProductDAL
-from dependencies.dals import get_order_dal, get_product_dal
+from db.loaders import RequestLoaders
+from dependencies.dals import (
+    get_idempotency_claim_dal,
+    get_idempotency_dal,
+    get_job_dal,
+    get_order_dal,
+    get_product_dal,
+    get_read_loaders,
+    get_read_order_dal,
+)
 
 logger = getLogger(__name__)
 
@@ -33,9 +55,23 @@ async def create_order(
     body: CreateOrder,
     order_dal: Annotated[OrderDAL, Depends(get_order_dal)],
     product_dal: Annotated[ProductDAL, Depends(get_product_dal)],
+    idempotency_dal: Annotated[IdempotencyDAL, Depends(get_idempotency_dal)],
+    claim_dal: Annotated[IdempotencyDAL, Depends(get_idempotency_claim_dal)],
+    job_dal: Annotated[JobDAL, Depends(get_job_dal)],
+    idempotency_key: Annotated[str | None, Header(max_length=255)] = None,
 ) -> ShowOrder:
     try:
-        return await _create_new_order(body, order_dal, product_dal)
+        if idempotency_key is None:
+            return await _create_new_order(body, order_dal, product_dal, job_dal)
+        return await _create_new_order_once(
+            body,
+            idempotency_key,
+            order_dal,
+            product_dal,
+            idempotency_dal,
+            claim_dal,
+            job_dal,
+        )
     except IntegrityError as err:
         logger.error(err)
         raise HTTPException(status_code=503, detail=f"Database error: {err}")
@@ -43,9 +79,11 @@ async def create_order(
 
 @order_router.delete("/{order_id}", response_model=DeleteOrderResponse)
 async def delete_order(
-    order_id: UUID, order_dal: Annotated[OrderDAL, Depends(get_order_dal)]
+    order_id: UUID,
+    order_dal: Annotated[OrderDAL, Depends(get_order_dal)],
+    product_dal: Annotated[ProductDAL, Depends(get_product_dal)],
 ) -> DeleteOrderResponse:
-    deleted_order_id = await _delete_order(order_id, order_dal)
+    deleted_order_id = await _delete_order(order_id, order_dal, product_dal)
     if deleted_order_id is None:
         raise HTTPException(
             status_code=404, detail=f"Order with id {order_id} not found."
@@ -53,9 +91,62 @@ async def delete_order(
     return DeleteOrderResponse(deleted_order_id=deleted_order_id)
 
 
+# Declared before /{order_id} so "changes" is not parsed as an order id
+@order_router.get("/changes", response_model=OrderChanges)
+async def get_order_changes(
+    order_dal: Annotated[OrderDAL, Depends(get_read_order_dal)],
+    since: Annotated[
+        str, Query(pattern=ORDER_CHANGES_CURSOR_PATTERN)
+    ] = ORDER_CHANGES_START,
+    limit: Annotated[
+        int, Query(gt=0, le=settings.ORDER_CHANGES_PAGE_SIZE)
+    ] = settings.ORDER_CHANGES_PAGE_SIZE,
+) -> OrderChanges:
+    """Order events after the since cursor, for incremental sync"""
+    return await _get_order_changes(since, order_dal, limit)
+
+
+@order_router.get("/changes/stream")
+async def stream_order_changes(
+    request: Request,
+    since: Annotated[
+        str, Query(pattern=ORDER_CHANGES_CURSOR_PATTERN)
+    ] = ORDER_CHANGES_START,
+    last_event_id: Annotated[
+        str | None, Header(pattern=ORDER_CHANGES_CURSOR_PATTERN)
+    ] = None,
+) -> StreamingResponse:
+    # reconnecting EventSource clients resume from Last-Event-ID
+    return StreamingResponse(
+        _stream_order_changes(last_event_id or since, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@order_router.get("/export")
+async def export_orders(
+    since: Annotated[str | None, Query(pattern=ORDER_CHANGES_CURSOR_PATTERN)] = None,
+) -> StreamingResponse:
+    """Orders with user and product columns as an Arrow IPC stream.
+
+    Only orders changed after the since cursor are sent; pass the
+    X-Export-Cursor header of the response as since next time.
+    """
+    # pyarrow is heavy and only needed here, keep it out of the app's startup
+    from exporting import ARROW_STREAM_MEDIA_TYPE, pa
+
+    if pa is None:
+        raise HTTPException(status_code=501, detail="Arrow export is not installed.")
+    cursor, stream = await _export_orders(since, settings.ORDER_EXPORT_BATCH_SIZE)
+    return StreamingResponse(
+        stream, media_type=ARROW_STREAM_MEDIA_TYPE, headers={"X-Export-Cursor": cursor}
+    )
+
+
 @order_router.get("/{order_id}", response_model=ShowOrder)
 async def get_order_by_id(
-    order_id: UUID, order_dal: Annotated[OrderDAL, Depends(get_order_dal)]
+    order_id: UUID, order_dal: Annotated[OrderDAL, Depends(get_read_order_dal)]
 ) -> ShowOrder:
     order = await _get_order_by_id(order_id, order_dal)
     if order is None:
@@ -65,12 +156,34 @@ async def get_order_by_id(
     return order
 
 
+@order_router.get("/{order_id}/events")
+async def stream_order_status(
+    order_id: UUID,
+    request: Request,
+    order_dal: Annotated[OrderDAL, Depends(get_read_order_dal)],
+) -> StreamingResponse:
+    """Live status of an order as Server-Sent Events, instead of polling it"""
+    if await _get_order_status(order_id, order_dal) is None:
+        raise HTTPException(
+            status_code=404, detail=f"Order with id {order_id} not found."
+        )
+    return StreamingResponse(
+        _stream_order_status(order_id, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # Router for displaying all orders
 @order_router.get("/", response_model=list[ShowOrder])
 async def get_all_orders(
-    order_dal: Annotated[OrderDAL, Depends(get_order_dal)],
+    order_dal: Annotated[OrderDAL, Depends(get_read_order_dal)],
+    loaders: Annotated[RequestLoaders, Depends(get_read_loaders)],
+    include_description: Annotated[
+        bool, Query(description="Include the orders' and products' descriptions")
+    ] = False,
 ) -> list[ShowOrder]:
-    return await _get_all_orders(order_dal)
+    return await _get_all_orders(order_dal, loaders, include_description)
 
 
 @order_router.patch("/{order_id}", response_model=UpdatedOrderResponse)
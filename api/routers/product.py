@@ -2,25 +2,34 @@ from logging import getLogger
 from typing import Annotated
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
 from sqlalchemy.exc import IntegrityError
 
+import settings
 from api.handlers.product import (
     _create_new_product,
     _delete_product,
     _get_all_products,
     _get_product_by_id,
+    _get_product_etag,
+    _get_products_etag,
+    _set_stock_shards,
     _update_product,
+    _update_products,
 )
 from api.models.product import (
     CreateProduct,
     ShowProduct,
     UpdateProduct,
+    UpdateStockShards,
+    UpdateProductsBatch,
     DeleteProductResponse,
     UpdatedProductResponse,
+    UpdatedProductsBatchResponse,
 )
+from caching import etag_matches, not_modified
 from db.dals.product_dal import ProductDAL
-from dependencies.dals import get_product_dal
+from dependencies.dals import get_product_dal, get_read_product_dal
 
 logger = getLogger(__name__)
 
@@ -52,21 +61,62 @@ async def delete_product(
 
 @product_router.get("/{product_id}", response_model=ShowProduct)
 async def get_product_by_id(
-    product_id: UUID, product_dal: Annotated[ProductDAL, Depends(get_product_dal)]
+    product_id: UUID,
+    response: Response,
+    product_dal: Annotated[ProductDAL, Depends(get_read_product_dal)],
+    if_none_match: Annotated[str | None, Header()] = None,
 ) -> ShowProduct:
+    # The version is read before the row, so a concurrent write can only
+    # make the ETag older than the body and never the other way round
+    etag = await _get_product_etag(product_id, product_dal)
+    if etag is None:
+        raise HTTPException(
+            status_code=404, detail=f"Product with id {product_id} not found."
+        )
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, settings.PRODUCT_CACHE_CONTROL)
     product = await _get_product_by_id(product_id, product_dal)
     if product is None:
         raise HTTPException(
             status_code=404, detail=f"Product with id {product_id} not found."
         )
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = settings.PRODUCT_CACHE_CONTROL
     return product
 
 
 @product_router.get("/", response_model=list[ShowProduct])
 async def get_all_products(
-    product_dal: Annotated[ProductDAL, Depends(get_product_dal)],
+    response: Response,
+    product_dal: Annotated[ProductDAL, Depends(get_read_product_dal)],
+    include_description: Annotated[
+        bool, Query(description="Include the products' descriptions")
+    ] = False,
+    if_none_match: Annotated[str | None, Header()] = None,
 ) -> list[ShowProduct]:
-    return await _get_all_products(product_dal)
+    etag = await _get_products_etag(product_dal, include_description)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, settings.PRODUCT_LIST_CACHE_CONTROL)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = settings.PRODUCT_LIST_CACHE_CONTROL
+    return await _get_all_products(product_dal, include_description)
+
+
+# declared before /{product_id}, which would otherwise match "batch"
+@product_router.patch("/batch", response_model=UpdatedProductsBatchResponse)
+async def update_products(
+    body: UpdateProductsBatch,
+    product_dal: Annotated[ProductDAL, Depends(get_product_dal)],
+) -> UpdatedProductsBatchResponse:
+    """Update the price and stock of many products at once.
+
+    Every product gets a result, updated is false for unknown ids.
+    """
+    try:
+        return await _update_products(body, product_dal)
+    except IntegrityError as err:
+        logger.error(err)
+        raise HTTPException(status_code=503, detail=f"Database error: {err}")
 
 
 @product_router.patch("/{product_id}", response_model=UpdatedProductResponse)
@@ -95,3 +145,18 @@ async def update_product_by_id(
         logger.error(err)
         raise HTTPException(status_code=503, detail=f"Database error: {err}")
     return UpdatedProductResponse(updated_product_id=updated_product_id)
+
+
+@product_router.put("/{product_id}/stock-shards", response_model=UpdatedProductResponse)
+async def set_product_stock_shards(
+    product_id: UUID,
+    body: UpdateStockShards,
+    product_dal: Annotated[ProductDAL, Depends(get_product_dal)],
+) -> UpdatedProductResponse:
+    """Switch a hot product to sharded stock counters (or back with 0)"""
+    updated_product_id = await _set_stock_shards(product_id, body.shards, product_dal)
+    if updated_product_id is None:
+        raise HTTPException(
+            status_code=404, detail=f"Product with id {product_id} not found."
+        )
+    return UpdatedProductResponse(updated_product_id=updated_product_id)
@@ -19,7 +19,7 @@ from api.models.user import (
     UpdatedUserResponse,
 )
 from db.dals.user_dal import UserDAL
-from dependencies.dals import get_user_dal
+from dependencies.dals import get_read_user_dal, get_user_dal
 
 logger = getLogger(__name__)
 
@@ -51,7 +51,7 @@ async def delete_user(
 
 @user_router.get("/", response_model=ShowUser)
 async def get_user_by_id(
-    user_id: UUID, user_dal: Annotated[UserDAL, Depends(get_user_dal)]
+    user_id: UUID, user_dal: Annotated[UserDAL, Depends(get_read_user_dal)]
 ) -> ShowUser:
     user = await _get_user_by_id(user_id, user_dal)
     if user is None:
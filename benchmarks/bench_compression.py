@@ -0,0 +1,102 @@
+"""CPU cost of response compression against the bandwidth it saves.
+
+Compresses a GET /order/ page the way CompressionMiddleware does, as one
+body and as a stream of flushed chunks, with every available encoder at a
+few levels. The page is synthetic, orders with their user and product
+and no descriptions, so no database is needed. zstd and br are measured
+only when the "compression" extra is installed.
+
+    python -m benchmarks.bench_compression --orders 1000 --chunk-kb 64
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+
+from compression import BrotliEncoder, GzipEncoder, ZstdEncoder, brotli, zstandard
+
+LEVELS = {
+    "gzip": (GzipEncoder, [1, 6, 9]),
+    "zstd": (ZstdEncoder, [1, 3, 9]),
+    "br": (BrotliEncoder, [1, 4, 9]),
+}
+
+
+def _order_page(orders: int) -> bytes:
+    users = [
+        {
+            "user_id": str(uuid.uuid4()),
+            "name": f"Name{i}",
+            "surname": f"Surname{i}",
+            "email": f"user{i}@example.com",
+            "is_active": True,
+        }
+        for i in range(50)
+    ]
+    products = [
+        {
+            "product_id": str(uuid.uuid4()),
+            "name": f"Product {i}",
+            "description": None,
+            "price": round(random.uniform(1, 500), 2),
+            "stock_quantity": random.randint(0, 1000),
+        }
+        for i in range(200)
+    ]
+    page = [
+        {
+            "order_id": str(uuid.uuid4()),
+            "quantity": random.randint(1, 5),
+            "total_price": round(random.uniform(1, 2500), 2),
+            "description": None,
+            "order_status": random.choice(["PENDING", "CONFIRMED", "SHIPPED"]),
+            "user": random.choice(users),
+            "product": random.choice(products),
+        }
+        for _ in range(orders)
+    ]
+    return json.dumps(page).encode()
+
+
+def _compress(encoder, body: bytes, chunk_size: int | None) -> int:
+    if chunk_size is None:
+        return len(encoder.compress(body) + encoder.finish())
+    sent = 0
+    for start in range(0, len(body), chunk_size):
+        sent += len(encoder.compress(body[start:start + chunk_size]) + encoder.flush())
+    return sent + len(encoder.finish())
+
+
+def run(orders: int, chunk_kb: int, repeat: int) -> None:
+    body = _order_page(orders)
+    print(f"page of {orders} orders: {len(body) / 1024:.0f} KiB")
+    print(f"{'':8} {'level':>5} {'mode':>6} {'KiB sent':>9} {'saved':>6} "
+          f"{'CPU ms':>7} {'MB/s':>7} {'CPU us/KiB saved':>17}")
+    for encoding, (encoder_class, levels) in LEVELS.items():
+        if (encoding == "zstd" and zstandard is None) or (encoding == "br" and brotli is None):
+            print(f"{encoding:8} not installed")
+            continue
+        for level in levels:
+            for mode, chunk_size in (("body", None), ("stream", chunk_kb * 1024)):
+                started = time.process_time()
+                for _ in range(repeat):
+                    sent = _compress(encoder_class(level), body, chunk_size)
+                cpu = (time.process_time() - started) / repeat
+                saved = len(body) - sent
+                print(f"{encoding:8} {level:5} {mode:>6} {sent / 1024:9.0f} "
+                      f"{saved / len(body):6.0%} {cpu * 1e3:7.2f} "
+                      f"{len(body) / cpu / 1e6:7.0f} {cpu * 1e6 / (saved / 1024):17.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--chunk-kb", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    run(args.orders, args.chunk_kb, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
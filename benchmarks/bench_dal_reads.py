@@ -0,0 +1,140 @@
+"""Per-call latency and CPU of the hot DAL reads, ORM select vs. fast path.
+
+The ORM path is what the DALs did before: select() of the mapped class,
+built and compiled for every call, with the rows going through the
+session's identity map. The fast path is the current DAL methods, cached
+lambda statements returning plain rows. Each call uses its own session,
+the way a request does.
+
+    python -m benchmarks.bench_dal_reads --concurrency 64 --calls 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from sqlalchemy import func, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import aliased, sessionmaker
+
+import settings
+from db.dals.order_dal import OrderDAL
+from db.dals.product_dal import ProductDAL
+from db.dals.user_dal import UserDAL
+from db.models import Order, Product, User
+from enums import OrderStatusEnum
+
+
+async def _orm_product_by_id(session, product_id):
+    res = await session.execute(select(Product).where(Product.product_id == product_id))
+    return res.scalars().first()
+
+
+async def _orm_user_by_email(session, email):
+    res = await session.execute(select(User).where(User.email == email))
+    return res.scalars().first()
+
+
+async def _orm_order_by_id(session, order_id):
+    user_order = aliased(Order)
+    user_orders = (
+        select(
+            func.count(user_order.order_id).label("total_orders"),
+            func.sum(user_order.total_price).label("total_amount"),
+        )
+        .where(
+            user_order.user_id == User.user_id,
+            user_order.order_status != OrderStatusEnum.DELETED,
+        )
+        .lateral("user_orders")
+    )
+    res = await session.execute(
+        select(Order, User, user_orders.c.total_orders, user_orders.c.total_amount)
+        .join(User, User.user_id == Order.user_id)
+        .join(user_orders, literal(True))
+        .where(Order.order_id == order_id)
+    )
+    return res.first()
+
+
+async def _client(session_factory, read, key, calls: int) -> list[float]:
+    latencies = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        async with session_factory() as session:
+            await read(session, key)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def _measure(session_factory, read, key, concurrency: int, calls: int):
+    # warm up the statement and prepared statement caches first
+    await _client(session_factory, read, key, 10)
+    cpu_started = time.process_time()
+    latencies = await asyncio.gather(*[
+        _client(session_factory, read, key, calls) for _ in range(concurrency)
+    ])
+    cpu = time.process_time() - cpu_started
+    latencies = sorted(latency for client in latencies for latency in client)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    return statistics.median(latencies), p99, cpu / len(latencies)
+
+
+async def run(concurrency: int, calls: int) -> None:
+    engine = create_async_engine(
+        os.getenv("BENCH_DATABASE_URL", settings.REAL_DATABASE_URL),
+        pool_size=concurrency,
+        execution_options={"isolation_level": "AUTOCOMMIT"},
+    )
+    session_factory = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    email = f"bench-{time.time_ns()}@example.com"
+    async with session_factory() as session, session.begin():
+        user = await UserDAL(session).create_user(
+            name="Bench", surname="Bench", email=email, hashed_password="-"
+        )
+        product = await ProductDAL(session).create_product(
+            name="bench", description=None, price=1.0, stock_quantity=1
+        )
+        order = await OrderDAL(session).create_order(
+            user_id=user.user_id,
+            product_id=product.product_id,
+            quantity=1,
+            total_price=1.0,
+            description=None,
+        )
+    cases = {
+        "get_product_by_id": (
+            _orm_product_by_id,
+            lambda session, key: ProductDAL(session).get_product_by_id(key),
+            product.product_id,
+        ),
+        "get_user_by_email": (
+            _orm_user_by_email,
+            lambda session, key: UserDAL(session).get_user_by_email(key),
+            email,
+        ),
+        "get_order_by_id": (
+            _orm_order_by_id,
+            lambda session, key: OrderDAL(session).get_order_by_id(key),
+            order.order_id,
+        ),
+    }
+    print(f"{'':18} {'':5} {'p50 ms':>8} {'p99 ms':>8} {'CPU us/call':>12}")
+    for name, (orm_read, fast_read, key) in cases.items():
+        for label, read in (("orm", orm_read), ("fast", fast_read)):
+            p50, p99, cpu = await _measure(session_factory, read, key, concurrency, calls)
+            print(f"{name:18} {label:5} {p50 * 1e3:8.2f} {p99 * 1e3:8.2f} {cpu * 1e6:12.0f}")
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.concurrency, args.calls))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Orders per second on a single SKU, plain stock row vs. sharded sub-counters.
+
+Every simulated order runs in its own transaction (stock decrement plus
+order insert), so the product row lock is held until commit the way it is
+for a real order placement.
+
+    python -m benchmarks.bench_hot_sku --workers 32 --seconds 10 --shards 16
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import settings
+from db.dals.order_dal import OrderDAL
+from db.dals.product_dal import ProductDAL
+from db.dals.user_dal import UserDAL
+
+
+async def _place_orders(session_factory, user_id, product_id, deadline: float) -> int:
+    placed = 0
+    while time.monotonic() < deadline:
+        async with session_factory() as session, session.begin():
+            if await ProductDAL(session).update_stock(product_id, -1) is None:
+                continue
+            await OrderDAL(session).create_order(
+                user_id=user_id,
+                product_id=product_id,
+                quantity=1,
+                total_price=1.0,
+                description=None,
+            )
+            placed += 1
+    return placed
+
+
+async def run(workers: int, seconds: float, shards: int) -> float:
+    engine = create_async_engine(
+        os.getenv("BENCH_DATABASE_URL", settings.REAL_DATABASE_URL),
+        pool_size=workers,
+    )
+    session_factory = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with session_factory() as session, session.begin():
+        user = await UserDAL(session).create_user(
+            name="Bench", surname="Bench", email=f"bench-{time.time_ns()}@example.com",
+            hashed_password="-",
+        )
+        product_dal = ProductDAL(session)
+        product = await product_dal.create_product(
+            name="hot sku", description=None, price=1.0, stock_quantity=10_000_000
+        )
+        if shards:
+            await product_dal.set_stock_shards(product.product_id, shards)
+    deadline = time.monotonic() + seconds
+    placed = await asyncio.gather(*[
+        _place_orders(session_factory, user.user_id, product.product_id, deadline)
+        for _ in range(workers)
+    ])
+    await engine.dispose()
+    return sum(placed) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--shards", type=int, default=16)
+    args = parser.parse_args()
+    plain = asyncio.run(run(args.workers, args.seconds, shards=0))
+    sharded = asyncio.run(run(args.workers, args.seconds, shards=args.shards))
+    print(f"plain stock row:        {plain:10.1f} orders/s")
+    print(f"{args.shards:3d} stock sub-counters: {sharded:10.1f} orders/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""JWT encode/decode throughput, key parsed per call vs. cached key objects.
+
+The per-call path is what security.py did before the key ring: python-jose
+gets the raw secret or PEM and builds a key object for every token. The
+cached path goes through security.KeyRing.
+
+    python -m benchmarks.bench_jwt --iterations 2000
+"""
+import argparse
+import secrets
+import time
+from datetime import datetime, timedelta
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import jwk, jwt
+
+from security import KeyRing, SigningKey, _load_pem_key
+
+
+def _pem_pair(private_key) -> tuple[bytes, bytes]:
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return private_pem, public_pem
+
+
+def _rate(func, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return iterations / (time.perf_counter() - started)
+
+
+def run(iterations: int) -> None:
+    claims = {
+        "sub": "bench@example.com",
+        "exp": datetime.utcnow() + timedelta(minutes=15),
+        "jti": secrets.token_hex(16),
+    }
+    secret = secrets.token_urlsafe(32)
+    es_private, es_public = _pem_pair(ec.generate_private_key(ec.SECP256R1()))
+    rs_private, rs_public = _pem_pair(rsa.generate_private_key(65537, 2048))
+    hmac_key = jwk.construct(secret, "HS256")
+    cases = {
+        "HS256": (secret, secret, SigningKey("HS256", hmac_key, hmac_key)),
+        "ES256": (es_private, es_public, _load_pem_key(es_private)),
+        "RS256": (rs_private, rs_public, _load_pem_key(rs_private)),
+    }
+    print(f"{'':6} {'per-call encode':>16} {'per-call decode':>16} "
+          f"{'cached encode':>14} {'cached decode':>14}  (tokens/s)")
+    for algorithm, (signing_key, verifying_key, cached_key) in cases.items():
+        token = jwt.encode(claims, signing_key, algorithm=algorithm)
+        key_ring = KeyRing("bench", {"bench": cached_key})
+        cached_token = key_ring.encode(claims)
+        rates = [
+            _rate(lambda: jwt.encode(claims, signing_key, algorithm=algorithm), iterations),
+            _rate(
+                lambda: jwt.decode(token, verifying_key, algorithms=[algorithm]),
+                iterations,
+            ),
+            _rate(lambda: key_ring.encode(claims), iterations),
+            _rate(lambda: key_ring.decode(cached_token), iterations),
+        ]
+        print(f"{algorithm:6} {rates[0]:16.0f} {rates[1]:16.0f} "
+              f"{rates[2]:14.0f} {rates[3]:14.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    run(args.iterations)
+
+
+if __name__ == "__main__":
+    main()
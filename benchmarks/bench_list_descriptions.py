@@ -0,0 +1,101 @@
+"""Cost of a product list page with and without the descriptions.
+
+Adds a catalog of products with multi-kilobyte descriptions, then reads
+the whole list through the GET /product/ handler, once the default way
+(description deferred) and once with include_description. Reported per
+page: latency, the bytes the database sent over the connection (counted
+on the asyncpg transport), peak Python memory while loading and
+serializing the page (tracemalloc), and the size of the JSON response. Other products in the database are listed
+too, use an empty BENCH_DATABASE_URL for clean numbers.
+
+    python -m benchmarks.bench_list_descriptions --products 2000 --description-kb 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import tracemalloc
+
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import settings
+from api.handlers.product import _get_all_products
+from db.dals.product_dal import ProductDAL
+from db.models import Product
+
+
+class _CountingProtocol:
+    """Sits between a connection's transport and asyncpg's protocol, counts
+    the bytes received and passes every call on. Not an asyncio.Protocol,
+    its no-op methods would swallow connection_lost and the like."""
+
+    received = 0
+
+    def __init__(self, protocol: asyncio.Protocol):
+        self.protocol = protocol
+
+    def data_received(self, data: bytes) -> None:
+        _CountingProtocol.received += len(data)
+        self.protocol.data_received(data)
+
+    def __getattr__(self, name):
+        return getattr(self.protocol, name)
+
+
+def _count_received_bytes(dbapi_connection, connection_record) -> None:
+    transport = dbapi_connection.driver_connection._transport
+    transport.set_protocol(_CountingProtocol(transport.get_protocol()))
+
+
+async def _page(session_factory, include_description: bool) -> bytes:
+    async with session_factory() as session:
+        products = await _get_all_products(ProductDAL(session), include_description)
+    return json.dumps([product.dict() for product in products], default=str).encode()
+
+
+async def run(products: int, description_kb: int, pages: int) -> None:
+    engine = create_async_engine(os.getenv("BENCH_DATABASE_URL", settings.REAL_DATABASE_URL))
+    event.listen(engine.sync_engine, "connect", _count_received_bytes)
+    session_factory = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    description = ("lorem ipsum " * (description_kb * 1024 // 12 + 1))[: description_kb * 1024]
+    async with session_factory() as session, session.begin():
+        await session.execute(insert(Product), [
+            {"name": f"bench {i}", "description": description, "price": 1.0, "stock_quantity": 1}
+            for i in range(products)
+        ])
+    print(f"{'':12} {'p50 ms':>8} {'received KiB':>13} {'peak MiB':>9} {'response KiB':>13}")
+    for label, include_description in (("deferred", False), ("included", True)):
+        # warm up the pool and the statement cache
+        await _page(session_factory, include_description)
+        latencies = []
+        for _ in range(pages):
+            started = time.perf_counter()
+            await _page(session_factory, include_description)
+            latencies.append(time.perf_counter() - started)
+        _CountingProtocol.received = 0
+        await _page(session_factory, include_description)
+        received = _CountingProtocol.received
+        tracemalloc.start()
+        body = await _page(session_factory, include_description)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{label:12} {statistics.median(latencies) * 1e3:8.2f} {received / 1024:13.0f} "
+              f"{peak / 2**20:9.1f} {len(body) / 1024:13.0f}")
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--description-kb", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.products, args.description_kb, args.pages))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Commits and latency of a multi-statement endpoint, AUTOCOMMIT vs. one transaction.
+
+Runs the handler of POST /order/ with an Idempotency-Key (claim the key,
+place the order, queue its follow-up job, store the response) the way the
+endpoint does, once on an AUTOCOMMIT engine where every statement commits
+on its own, as get_db did before, and once with a transaction per request
+like get_db. DELETE /order/{id} isn't compared: its stock change takes a
+savepoint, which needs a transaction. Commits are read from
+pg_stat_database after the pools are closed, so other activity on the
+database is counted too.
+
+    python -m benchmarks.bench_unit_of_work --workers 16 --requests 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from uuid import uuid4
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import settings
+from api.handlers.order import _create_new_order_once
+from api.models.order import CreateOrder
+from db.dals.idempotency_dal import IdempotencyDAL
+from db.dals.job_dal import JobDAL
+from db.dals.order_dal import OrderDAL
+from db.dals.product_dal import ProductDAL
+from db.dals.user_dal import UserDAL
+
+DATABASE_URL = os.getenv("BENCH_DATABASE_URL", settings.REAL_DATABASE_URL)
+
+
+async def _commits() -> int:
+    engine = create_async_engine(DATABASE_URL)
+    async with engine.connect() as connection:
+        res = await connection.execute(text(
+            "SELECT xact_commit FROM pg_stat_database WHERE datname = current_database()"
+        ))
+        commits = res.scalar()
+    await engine.dispose()
+    return commits
+
+
+async def _request(session_factory, unit_of_work: bool, handler, *args):
+    session = session_factory()
+    try:
+        if unit_of_work:
+            async with session.begin():
+                return await handler(session, *args)
+        return await handler(session, *args)
+    finally:
+        await session.close()
+
+
+async def _place_order(session, body: CreateOrder):
+    # the key is claimed in a transaction of its own, like get_own_db
+    async with AsyncSession(session.bind) as claim_session:
+        return await _create_new_order_once(
+            body,
+            uuid4().hex,
+            OrderDAL(session),
+            ProductDAL(session),
+            IdempotencyDAL(session),
+            IdempotencyDAL(claim_session),
+            JobDAL(session),
+        )
+
+
+async def _client(session_factory, unit_of_work: bool, body: CreateOrder, requests: int):
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        await _request(session_factory, unit_of_work, _place_order, body)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def run(workers: int, requests: int, unit_of_work: bool):
+    options = {} if unit_of_work else {"isolation_level": "AUTOCOMMIT"}
+    engine = create_async_engine(
+        DATABASE_URL, pool_size=workers, execution_options=options
+    )
+    session_factory = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with session_factory() as session, session.begin():
+        user = await UserDAL(session).create_user(
+            name="Bench", surname="Bench", email=f"bench-{time.time_ns()}@example.com",
+            hashed_password="-",
+        )
+        product = await ProductDAL(session).create_product(
+            name="bench", description=None, price=1.0, stock_quantity=workers * requests
+        )
+    body = CreateOrder(user_id=user.user_id, product_id=product.product_id, quantity=1)
+    await engine.dispose()
+    commits = await _commits()
+    clients = await asyncio.gather(*[
+        _client(session_factory, unit_of_work, body, requests) for _ in range(workers)
+    ])
+    # closed backends flush their statistics
+    await engine.dispose()
+    await asyncio.sleep(1)
+    commits = await _commits() - commits
+    latencies = sorted(latency for client in clients for latency in client)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    return commits / len(latencies), statistics.median(latencies), p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    print(f"{'':14} {'commits/request':>16} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, unit_of_work in (("autocommit", False), ("unit of work", True)):
+        commits, p50, p99 = asyncio.run(run(args.workers, args.requests, unit_of_work))
+        print(f"{label:14} {commits:16.2f} {p50 * 1e3:8.2f} {p99 * 1e3:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
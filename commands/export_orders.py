@@ -0,0 +1,90 @@
+"""Export orders with their user and product columns as day-partitioned files.
+
+Files land in OUT_DIR/day=YYYY-MM-DD/part-<run>.<parquet|arrow>, by order_date.
+The first run (or --full) exports every order; later runs only export
+the orders changed since the previous run, tracked by the "orders_export"
+watermark on the order change feed. A row in a later part supersedes the
+rows with the same order_id in earlier parts.
+
+    python -m commands.export_orders /data/orders --format parquet
+"""
+import argparse
+import asyncio
+import time
+from pathlib import Path
+from uuid import uuid4
+
+from db.dals.watermark_dal import WatermarkDAL
+from db.session import async_session
+from exporting import (
+    iter_order_rows,
+    order_export_schema,
+    pa,
+    rows_to_record_batch,
+    split_by_day,
+)
+
+EXPORT_WATERMARK = "orders_export"
+
+
+def _open_writer(path: Path, file_format: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.ParquetWriter(path, order_export_schema(), compression="zstd")
+    return pa.ipc.new_file(path, order_export_schema())
+
+
+async def export_orders(
+    out_dir: Path, file_format: str, batch_size: int, full: bool
+) -> tuple[int, int]:
+    """Write the export, returns the number of orders and of files written"""
+    async with async_session() as session:
+        watermark_dal = WatermarkDAL(session)
+        since = None if full else await watermark_dal.get_watermark(EXPORT_WATERMARK)
+        # taken before reading orders, later changes go to the next run
+        until = await watermark_dal.get_last_event_cursor()
+    changed_between = (since, until) if since is not None else None
+
+    run = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid4().hex[:8]}"
+    writers = {}
+    exported = 0
+    try:
+        async for rows in iter_order_rows(
+            async_session, batch_size, changed_between=changed_between
+        ):
+            for day, day_rows in split_by_day(rows).items():
+                if day not in writers:
+                    writers[day] = _open_writer(
+                        out_dir / f"day={day}" / f"part-{run}.{file_format}",
+                        file_format,
+                    )
+                writers[day].write_batch(rows_to_record_batch(day_rows))
+            exported += len(rows)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    async with async_session() as session, session.begin():
+        await WatermarkDAL(session).save_watermark(EXPORT_WATERMARK, until)
+    return exported, len(writers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("out_dir", type=Path)
+    parser.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--full", action="store_true", help="ignore the watermark")
+    args = parser.parse_args()
+    if pa is None:
+        parser.error("pyarrow is required, install the 'export' extra")
+    exported, files = asyncio.run(
+        export_orders(args.out_dir, args.format, args.batch_size, args.full)
+    )
+    print(f"exported {exported} orders into {files} files")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Check every order's total_price against its product's price times quantity.
+
+Orders are read in keyset pages, each fetched as one array per column
+rather than a row per order, and compared with NumPy array arithmetic, so
+only the mismatching orders become report rows. The report is a gzipped
+CSV of the mismatches plus a JSON summary next to it. Orders without a
+product can't be checked, they are listed in the report with no price and
+counted separately.
+
+There is no price history: orders are compared with the product's current
+price, so a price change shows up as a discrepancy on older orders.
+
+    python -m commands.reconcile_orders report.csv.gz --tolerance 0.01
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import json
+from pathlib import Path
+
+from db.dals.order_dal import OrderDAL
+from db.session import async_session
+from enums import OrderStatusEnum
+
+try:
+    import numpy as np
+except ImportError:  # installed with the "reconcile" extra
+    np = None
+
+REPORT_COLUMNS = [
+    "order_id",
+    "product_id",
+    "quantity",
+    "unit_price",
+    "expected_total",
+    "total_price",
+    "difference",
+]
+
+
+def find_discrepancies(columns, tolerance: float) -> tuple[list[list], dict]:
+    """Mismatching and unpriced orders of one page and the page's totals"""
+    order_ids, product_ids, quantities, totals, prices = columns
+    quantity = np.array(quantities, dtype=np.int64)
+    total = np.array(totals, dtype=np.float64)
+    # None, an order without a product, becomes NaN
+    price = np.array(prices, dtype=np.float64)
+    expected = price * quantity
+    difference = total - expected
+    unpriced = np.isnan(price)
+    mismatched = np.flatnonzero(np.abs(difference) > tolerance)
+    report_rows = [
+        [
+            order_ids[i],
+            product_ids[i],
+            int(quantity[i]),
+            float(price[i]),
+            round(float(expected[i]), 2),
+            float(total[i]),
+            round(float(difference[i]), 2),
+        ]
+        for i in mismatched
+    ]
+    report_rows += [
+        [order_ids[i], None, int(quantity[i]), None, None, float(total[i]), None]
+        for i in np.flatnonzero(unpriced)
+    ]
+    page_totals = {
+        "orders": len(order_ids),
+        "mismatched": len(mismatched),
+        "without_product": int(unpriced.sum()),
+        "overcharged": float(difference[difference > tolerance].sum()),
+        "undercharged": float(-difference[difference < -tolerance].sum()),
+    }
+    return report_rows, page_totals
+
+
+async def reconcile_orders(
+    report_path: Path,
+    tolerance: float,
+    batch_size: int,
+    statuses: list[OrderStatusEnum],
+) -> dict:
+    summary = {
+        "orders": 0,
+        "mismatched": 0,
+        "without_product": 0,
+        "overcharged": 0.0,
+        "undercharged": 0.0,
+    }
+    after = None
+    with gzip.open(report_path, "wt", newline="") as report:
+        writer = csv.writer(report)
+        writer.writerow(REPORT_COLUMNS)
+        while True:
+            async with async_session() as session:
+                columns = await OrderDAL(session).get_order_values(
+                    after, batch_size, statuses
+                )
+            if columns.order_id is None:
+                break
+            report_rows, page_totals = find_discrepancies(columns, tolerance)
+            writer.writerows(report_rows)
+            for key, value in page_totals.items():
+                summary[key] += value
+            after = columns.order_id[-1]
+    summary_path = report_path.with_name(report_path.name.split(".")[0] + ".json")
+    summary_path.write_text(json.dumps(summary, indent=2))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("report", type=Path, help="gzipped CSV of the mismatches")
+    parser.add_argument("--tolerance", type=float, default=0.01)
+    parser.add_argument("--batch-size", type=int, default=100_000)
+    parser.add_argument(
+        "--status",
+        type=OrderStatusEnum,
+        action="append",
+        help="order statuses to check, every one but DELETED by default",
+    )
+    args = parser.parse_args()
+    if np is None:
+        parser.error("numpy is required, install the 'reconcile' extra")
+    statuses = args.status or [
+        status for status in OrderStatusEnum if status != OrderStatusEnum.DELETED
+    ]
+    summary = asyncio.run(
+        reconcile_orders(args.report, args.tolerance, args.batch_size, statuses)
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
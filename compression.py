@@ -0,0 +1,196 @@
+import zlib
+from typing import Callable
+
+from starlette.datastructures import Headers, MutableHeaders
+
+import settings
+
+try:
+    import zstandard
+except ImportError:  # installed with the "compression" extra
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # installed with the "compression" extra
+    brotli = None
+
+
+class GzipEncoder:
+    encoding = "gzip"
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        # ends the deflate block, the client can decode all it got so far
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class ZstdEncoder:
+    encoding = "zstd"
+
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    encoding = "br"
+
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def available_encoders() -> dict[str, Callable]:
+    """Encoder factories of the configured encodings, in order of preference"""
+    encoders = {
+        "gzip": lambda: GzipEncoder(settings.COMPRESSION_GZIP_LEVEL),
+    }
+    if zstandard is not None:
+        encoders["zstd"] = lambda: ZstdEncoder(settings.COMPRESSION_ZSTD_LEVEL)
+    if brotli is not None:
+        encoders["br"] = lambda: BrotliEncoder(settings.COMPRESSION_BROTLI_LEVEL)
+    return {
+        encoding: encoders[encoding]
+        for encoding in settings.COMPRESSION_ENCODINGS
+        if encoding in encoders
+    }
+
+
+def negotiate_encoding(accept_encoding: str, encodings: list[str]) -> str | None:
+    """The encoding of Accept-Encoding with the highest q-value.
+
+    Ties go to the first of encodings, the server's preference. None when
+    the client accepts none of them and the body goes out as it is.
+    """
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip():
+            accepted[coding.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressionMiddleware:
+    """Compresses response bodies with the best encoding the client accepts.
+
+    Only the configured content types are compressed and whole bodies
+    only from minimum_size on. Streamed bodies are compressed chunk by
+    chunk, each chunk flushed so the client can decode it as it arrives.
+    """
+
+    def __init__(self, app, encoders: dict[str, Callable], minimum_size: int):
+        self.app = app
+        self.encoders = encoders
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        encoding = negotiate_encoding(accept_encoding, list(self.encoders))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+        responder = _CompressingResponder(
+            send, self.encoders[encoding], self.minimum_size
+        )
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressingResponder:
+    def __init__(self, send, encoder_factory: Callable, minimum_size: int):
+        self._send = send
+        self.encoder_factory = encoder_factory
+        self.minimum_size = minimum_size
+        self._start = None
+        self._encoder = None
+        # decided with the first body message
+        self._compressing: bool | None = None
+
+    async def send(self, message) -> None:
+        if message["type"] == "http.response.start":
+            # held back until the first body tells how large the response is
+            self._start = {**message, "headers": list(message.get("headers", []))}
+            return
+        if message["type"] != "http.response.body":
+            return await self._send(message)
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self._compressing is None:
+            self._compressing = self._should_compress(body, more_body)
+            if not self._compressing:
+                await self._send(self._start)
+                return await self._send(message)
+            self._encoder = self.encoder_factory()
+            self._set_encoding_headers()
+        elif not self._compressing:
+            return await self._send(message)
+        body = self._encoder.compress(body)
+        body += self._encoder.flush() if more_body else self._encoder.finish()
+        if self._start is not None:
+            if not more_body:
+                # a whole body, its compressed size is known
+                MutableHeaders(raw=self._start["headers"])["Content-Length"] = str(len(body))
+            await self._send(self._start)
+            self._start = None
+        await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    def _should_compress(self, body: bytes, more_body: bool) -> bool:
+        headers = MutableHeaders(raw=self._start["headers"])
+        content_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+        if content_type not in settings.COMPRESSIBLE_CONTENT_TYPES:
+            return False
+        # the representation depends on Accept-Encoding even when it's small
+        headers.add_vary_header("Accept-Encoding")
+        if "content-encoding" in headers:
+            return False
+        return more_body or len(body) >= self.minimum_size
+
+    def _set_encoding_headers(self) -> None:
+        headers = MutableHeaders(raw=self._start["headers"])
+        headers["Content-Encoding"] = self._encoder.encoding
+        if "content-length" in headers:
+            # a stream's compressed size is known only at its end, the
+            # server sends it chunked
+            del headers["Content-Length"]
+        etag = headers.get("etag")
+        if etag is not None and not etag.startswith("W/"):
+            # the encoded bytes differ from the ones the strong ETag names
+            headers["ETag"] = f"W/{etag}"
@@ -19,4 +19,5 @@ class OrderWithUserSummary:
     total_price: float
     description: str
     order_status: str
+    product_id: str | None = None
     user: UserWithOrderSummary | None = None
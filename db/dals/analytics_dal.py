@@ -0,0 +1,230 @@
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from sqlalchemy import (
+    DateTime,
+    and_,
+    cast,
+    delete,
+    desc,
+    func,
+    insert,
+    literal,
+    select,
+    tuple_,
+)
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.dals.watermark_dal import WatermarkDAL, events_after
+from db.models import Order, OrderEvent, OrderRollup, Product
+from enums import OrderStatusEnum, RollupGranularityEnum
+
+BUCKET_WIDTH = {
+    RollupGranularityEnum.HOUR: timedelta(hours=1),
+    RollupGranularityEnum.DAY: timedelta(days=1),
+}
+
+
+class AnalyticsDAL:
+    """Data Access Layer for operating sales rollups"""
+
+    ROLLUP_WATERMARK = "order_rollups"
+    # pg advisory lock key, one rollup refresh at a time across all workers
+    ROLLUP_LOCK_ID = 0x6F72646572726F6C
+
+    def __init__(self, db_session: AsyncSession):
+        self.db_session = db_session
+
+    async def refresh_rollups(self, batch_size: int) -> int | None:
+        """Bring the rollups up to date with up to batch_size order events.
+
+        Must run in a transaction. Every (bucket, product) touched by the
+        events is recomputed from orders, so replaying an event is harmless
+        and the first run builds everything. Returns the number of events
+        applied, or None when another refresh is running.
+        """
+        locked = await self.db_session.execute(
+            select(func.pg_try_advisory_xact_lock(self.ROLLUP_LOCK_ID))
+        )
+        if not locked.scalar():
+            return None
+        watermark_dal = WatermarkDAL(self.db_session)
+        cursor = await watermark_dal.get_watermark(self.ROLLUP_WATERMARK)
+        if cursor is None:
+            # taken before reading orders, later changes are replayed next time
+            end = await watermark_dal.get_last_event_cursor()
+            touched = None
+            applied = 0
+        else:
+            batch = (
+                events_after(cursor)
+                .with_only_columns(OrderEvent.tx_id, OrderEvent.seq)
+                .order_by(OrderEvent.tx_id, OrderEvent.seq)
+                .limit(batch_size)
+                .subquery()
+            )
+            res = await self.db_session.execute(
+                select(batch.c.tx_id, batch.c.seq, func.count().over())
+                .order_by(desc(batch.c.tx_id), desc(batch.c.seq))
+                .limit(1)
+            )
+            last = res.fetchone()
+            if last is None:
+                return 0
+            end, applied = (last.tx_id, last.seq), last[2]
+            touched = events_after(cursor).where(
+                tuple_(OrderEvent.tx_id, OrderEvent.seq) <= tuple_(*end),
+                OrderEvent.payload["product_id"].astext.is_not(None),
+            )
+        for granularity in RollupGranularityEnum:
+            await self._recompute(granularity, touched)
+        await watermark_dal.save_watermark(self.ROLLUP_WATERMARK, end)
+        return applied
+
+    async def get_revenue(
+        self,
+        granularity: RollupGranularityEnum,
+        start: datetime,
+        end: datetime,
+        statuses: list[OrderStatusEnum],
+        product_id: UUID | None = None,
+    ) -> list[Row]:
+        query = (
+            select(
+                OrderRollup.bucket_start,
+                func.sum(OrderRollup.orders).label("orders"),
+                func.sum(OrderRollup.units).label("units"),
+                func.sum(OrderRollup.revenue).label("revenue"),
+            )
+            .where(self._rollup_range(granularity, start, end, statuses))
+            .group_by(OrderRollup.bucket_start)
+            .order_by(OrderRollup.bucket_start)
+        )
+        if product_id is not None:
+            query = query.where(OrderRollup.product_id == product_id)
+        res = await self.db_session.execute(query)
+        return res.all()
+
+    async def get_top_products(
+        self,
+        granularity: RollupGranularityEnum,
+        start: datetime,
+        end: datetime,
+        statuses: list[OrderStatusEnum],
+        order_by: str,
+        limit: int,
+    ) -> list[Row]:
+        totals = (
+            select(
+                OrderRollup.product_id,
+                func.sum(OrderRollup.orders).label("orders"),
+                func.sum(OrderRollup.units).label("units"),
+                func.sum(OrderRollup.revenue).label("revenue"),
+            )
+            .where(self._rollup_range(granularity, start, end, statuses))
+            .group_by(OrderRollup.product_id)
+            .subquery()
+        )
+        query = (
+            select(
+                totals.c.product_id,
+                Product.name,
+                totals.c.orders,
+                totals.c.units,
+                totals.c.revenue,
+            )
+            .join(Product, Product.product_id == totals.c.product_id)
+            .order_by(desc(totals.c[order_by]), totals.c.product_id)
+            .limit(limit)
+        )
+        res = await self.db_session.execute(query)
+        return res.all()
+
+    @staticmethod
+    def _rollup_range(
+        granularity: RollupGranularityEnum,
+        start: datetime,
+        end: datetime,
+        statuses: list[OrderStatusEnum],
+    ):
+        return and_(
+            OrderRollup.granularity == granularity,
+            OrderRollup.bucket_start >= start,
+            OrderRollup.bucket_start < end,
+            OrderRollup.order_status.in_(statuses),
+        )
+
+    async def _recompute(self, granularity: RollupGranularityEnum, events) -> None:
+        """Replace the rollups of the buckets touched by events, all if None"""
+        if events is None:
+            touched = (
+                select(
+                    func.date_trunc(granularity.value, Order.order_date).label(
+                        "bucket_start"
+                    ),
+                    Order.product_id,
+                )
+                .where(Order.product_id.is_not(None))
+                .distinct()
+                .cte("touched")
+            )
+        else:
+            events = events.subquery()
+            touched = (
+                select(
+                    func.date_trunc(
+                        granularity.value,
+                        cast(events.c.payload["order_date"].astext, DateTime),
+                    ).label("bucket_start"),
+                    cast(events.c.payload["product_id"].astext, PG_UUID(as_uuid=True)).label(
+                        "product_id"
+                    ),
+                )
+                .distinct()
+                .cte("touched")
+            )
+        await self.db_session.execute(
+            delete(OrderRollup).where(
+                OrderRollup.granularity == granularity,
+                tuple_(OrderRollup.bucket_start, OrderRollup.product_id).in_(
+                    select(touched.c.bucket_start, touched.c.product_id)
+                ),
+            )
+        )
+        bucket_start = func.date_trunc(granularity.value, Order.order_date)
+        recomputed = (
+            select(
+                literal(granularity, OrderRollup.granularity.type),
+                bucket_start,
+                Order.product_id,
+                Order.order_status,
+                func.count(),
+                func.sum(Order.quantity),
+                func.sum(Order.total_price),
+            )
+            .join(
+                touched,
+                and_(
+                    Order.product_id == touched.c.product_id,
+                    Order.order_date >= touched.c.bucket_start,
+                    Order.order_date < touched.c.bucket_start + BUCKET_WIDTH[granularity],
+                ),
+            )
+            .group_by(bucket_start, Order.product_id, Order.order_status)
+        )
+        await self.db_session.execute(
+            insert(OrderRollup).from_select(
+                [
+                    "granularity",
+                    "bucket_start",
+                    "product_id",
+                    "order_status",
+                    "orders",
+                    "units",
+                    "revenue",
+                ],
+                recomputed,
+            )
+        )
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, or_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from db.models import IdempotencyKey
+
+
+class IdempotencyDAL:
+    """Data Access Layer for operating idempotency keys"""
+
+    def __init__(self, db_session: AsyncSession):
+        self.db_session = db_session
+
+    async def claim_key(
+        self, key: str, request_hash: str, ttl_seconds: int, lock_seconds: int
+    ) -> bool:
+        """Reserve the key for the current request.
+
+        Returns False when another request already holds the key. Expired
+        keys and claims abandoned for lock_seconds are taken over in place.
+        """
+        now = datetime.utcnow()
+        query = (
+            insert(IdempotencyKey)
+            .values(key=key, request_hash=request_hash, created_at=now)
+            .on_conflict_do_update(
+                index_elements=[IdempotencyKey.key],
+                set_={
+                    "request_hash": request_hash,
+                    "status_code": None,
+                    "response_body": None,
+                    "created_at": now,
+                },
+                where=or_(
+                    IdempotencyKey.created_at < now - timedelta(seconds=ttl_seconds),
+                    and_(
+                        IdempotencyKey.status_code.is_(None),
+                        IdempotencyKey.created_at < now - timedelta(seconds=lock_seconds),
+                    ),
+                ),
+            )
+            .returning(IdempotencyKey.key)
+        )
+        res = await self.db_session.execute(query)
+        return res.fetchone() is not None
+
+    async def get_key(self, key: str) -> Row | None:
+        # plain columns, so polling never reads stale state from the identity map
+        query = select(
+            IdempotencyKey.request_hash,
+            IdempotencyKey.status_code,
+            IdempotencyKey.response_body,
+        ).where(IdempotencyKey.key == key)
+        res = await self.db_session.execute(query)
+        return res.fetchone()
+
+    async def save_response(self, key: str, status_code: int, response_body: str):
+        query = (
+            update(IdempotencyKey)
+            .where(IdempotencyKey.key == key)
+            .values(status_code=status_code, response_body=response_body)
+        )
+        await self.db_session.execute(query)
+
+    async def release_key(self, key: str):
+        query = delete(IdempotencyKey).where(
+            IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None)
+        )
+        await self.db_session.execute(query)
+
+    async def delete_expired(self, ttl_seconds: int) -> int:
+        cutoff = datetime.utcnow() - timedelta(seconds=ttl_seconds)
+        query = delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff)
+        res = await self.db_session.execute(query)
+        return res.rowcount
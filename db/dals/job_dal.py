@@ -0,0 +1,163 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, case, delete, exists, literal, or_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from db.models import Job
+from enums import JobStatusEnum
+
+
+class JobDAL:
+    """Data Access Layer for the background jobs queue"""
+
+    def __init__(self, db_session: AsyncSession):
+        self.db_session = db_session
+
+    async def enqueue(
+        self,
+        name: str,
+        payload: dict,
+        max_attempts: int,
+        delay_seconds: float = 0,
+        coalesce: bool = False,
+    ) -> int | None:
+        """Queue a job, it becomes visible to workers when the caller commits.
+
+        With coalesce the job is not queued when an identical one is still
+        waiting to be claimed, it would do the same work. Returns the new
+        job's id, or None when it was coalesced.
+        """
+        now = datetime.utcnow()
+        job = {
+            "name": name,
+            "payload": payload,
+            "status": JobStatusEnum.PENDING,
+            "max_attempts": max_attempts,
+            "run_after": now + timedelta(seconds=delay_seconds),
+            "created_at": now,
+        }
+        if coalesce:
+            # no unique index, racing requests may both queue it but never
+            # wait on each other
+            waiting = select(Job.job_id).where(
+                Job.name == name,
+                Job.status == JobStatusEnum.PENDING,
+                Job.attempts == 0,
+                Job.payload == literal(payload, Job.payload.type),
+            )
+            query = insert(Job).from_select(
+                list(job),
+                select(
+                    *[literal(value, Job.__table__.c[key].type) for key, value in job.items()]
+                ).where(~exists(waiting)),
+            )
+        else:
+            query = insert(Job).values(**job)
+        res = await self.db_session.execute(query.returning(Job.job_id))
+        return res.scalar_one_or_none()
+
+    async def claim(self, names: list[str], limit: int, lease_seconds: float) -> list[Row]:
+        """Lease up to limit due jobs of the given names to the caller.
+
+        Rows other workers are claiming are skipped rather than waited for.
+        Jobs whose lease expired without a result are claimed again, or
+        dead-lettered when that was their last attempt.
+        """
+        now = datetime.utcnow()
+        lease_expired = and_(Job.status == JobStatusEnum.RUNNING, Job.locked_until < now)
+        await self.db_session.execute(
+            update(Job)
+            .where(lease_expired, Job.attempts >= Job.max_attempts)
+            .values(status=JobStatusEnum.DEAD, locked_until=None, last_error="Lease expired")
+        )
+        claimable = (
+            select(Job.job_id)
+            .where(
+                Job.name.in_(names),
+                or_(
+                    and_(Job.status == JobStatusEnum.PENDING, Job.run_after <= now),
+                    lease_expired,
+                ),
+            )
+            .order_by(Job.run_after)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        query = (
+            update(Job)
+            .where(Job.job_id.in_(claimable.scalar_subquery()))
+            .values(
+                status=JobStatusEnum.RUNNING,
+                attempts=Job.attempts + 1,
+                locked_until=now + timedelta(seconds=lease_seconds),
+            )
+            .returning(Job.job_id, Job.name, Job.payload, Job.attempts)
+        )
+        res = await self.db_session.execute(query)
+        return res.all()
+
+    async def complete(self, job_id: int) -> None:
+        await self.db_session.execute(delete(Job).where(Job.job_id == job_id))
+
+    async def postpone(self, job_id: int, attempt: int, delay_seconds: float) -> bool:
+        """Put a job that couldn't start back in the queue for later.
+
+        Unlike fail, the attempt is not counted. False when the attempt's
+        lease was lost to another worker meanwhile.
+        """
+        query = (
+            update(Job)
+            .where(
+                Job.job_id == job_id,
+                Job.status == JobStatusEnum.RUNNING,
+                Job.attempts == attempt,
+            )
+            .values(
+                status=JobStatusEnum.PENDING,
+                attempts=Job.attempts - 1,
+                run_after=datetime.utcnow() + timedelta(seconds=delay_seconds),
+                locked_until=None,
+            )
+            .returning(Job.job_id)
+        )
+        res = await self.db_session.execute(query)
+        return res.scalar_one_or_none() is not None
+
+    async def fail(
+        self, job_id: int, attempt: int, error: str, retry_in_seconds: float
+    ) -> JobStatusEnum | None:
+        """Schedule another attempt, or dead-letter the job after its last one.
+
+        None when the attempt's lease was lost to another worker meanwhile.
+        """
+        query = (
+            update(Job)
+            .where(
+                Job.job_id == job_id,
+                Job.status == JobStatusEnum.RUNNING,
+                Job.attempts == attempt,
+            )
+            .values(
+                status=case(
+                    (Job.attempts >= Job.max_attempts, literal(JobStatusEnum.DEAD, Job.status.type)),
+                    else_=literal(JobStatusEnum.PENDING, Job.status.type),
+                ),
+                run_after=datetime.utcnow() + timedelta(seconds=retry_in_seconds),
+                locked_until=None,
+                last_error=error,
+            )
+            .returning(Job.status)
+        )
+        res = await self.db_session.execute(query)
+        return res.scalar_one_or_none()
+
+    async def delete_dead(self, older_than_seconds: int) -> int:
+        cutoff = datetime.utcnow() - timedelta(seconds=older_than_seconds)
+        query = delete(Job).where(
+            Job.status == JobStatusEnum.DEAD, Job.created_at < cutoff
+        )
+        res = await self.db_session.execute(query)
+        return res.rowcount
@@ -1,14 +1,28 @@
-from uuid import UUID
+from datetime import datetime
+from uuid import UUID, uuid4
 
-from sqlalchemy.orm import joinedload
-from sqlalchemy import and_, func, update
+from sqlalchemy import (
+    BigInteger,
+    Text,
+    and_,
+    cast,
+    func,
+    insert,
+    lambda_stmt,
+    literal,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.engine import Row
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import defer
 
-from api.models.user import ShowUser
-from db.models import Order, User
-from api.models.order import ShowOrder
-from enums import OrderStatusEnum
+from db.dals.watermark_dal import events_after
+from db.models import Order, OrderEvent, Product, User
+from db.notifications import ORDER_NOTIFY_CHANNEL
+from enums import OrderEventTypeEnum, OrderStatusEnum
 from dataclasses_ import OrderWithUserSummary, UserWithOrderSummary
 
 
@@ -26,16 +40,87 @@ class OrderDAL:
         total_price: float,
         description: str,
     ) -> Order:
-        new_order = Order(
-            user_id=user_id,
-            product_id=product_id,
-            quantity=quantity,
-            total_price=total_price,
-            description=description,
+        new_order = (
+            insert(Order)
+            .values(
+                order_id=uuid4(),
+                user_id=user_id,
+                product_id=product_id,
+                quantity=quantity,
+                total_price=total_price,
+                description=description,
+                order_status=OrderStatusEnum.PENDING,
+                order_date=datetime.utcnow(),
+            )
+            .returning(*Order.__table__.c)
+            .cte("new_order")
+        )
+        query = select(Order).from_statement(
+            select(new_order).add_cte(
+                self._order_event(new_order, OrderEventTypeEnum.CREATED)
+            )
+        )
+        res = await self.db_session.execute(query)
+        return res.scalars().one()
+
+    async def place_order(
+        self, user_id: UUID, product_id: UUID, quantity: int, description: str | None
+    ) -> Order | None:
+        """Take the stock and create the order priced from products.price.
+
+        One statement decrements the stock, inserts the order with
+        total_price = price * quantity and appends its outbox row. Returns
+        None without changing anything when the product doesn't exist, is
+        sharded (see ProductDAL.update_stock) or lacks the stock.
+        """
+        taken_stock = (
+            update(Product)
+            .where(
+                Product.product_id == product_id,
+                Product.stock_shards == 0,
+                Product.stock_quantity >= quantity,
+            )
+            .values(
+                stock_quantity=Product.stock_quantity - quantity,
+                version=Product.version + 1,
+            )
+            .returning(Product.product_id, Product.price)
+            .cte("taken_stock")
         )
-        self.db_session.add(new_order)
-        await self.db_session.flush()
-        return new_order
+        new_order = (
+            insert(Order)
+            .from_select(
+                [
+                    "order_id",
+                    "user_id",
+                    "product_id",
+                    "quantity",
+                    "total_price",
+                    "description",
+                    "order_status",
+                    "order_date",
+                ],
+                select(
+                    literal(uuid4(), Order.order_id.type),
+                    literal(user_id, Order.user_id.type),
+                    taken_stock.c.product_id,
+                    literal(quantity, Order.quantity.type),
+                    taken_stock.c.price * quantity,
+                    literal(description, Order.description.type),
+                    literal(OrderStatusEnum.PENDING, Order.order_status.type),
+                    literal(datetime.utcnow(), Order.order_date.type),
+                ),
+            )
+            .returning(*Order.__table__.c)
+            .cte("new_order")
+        )
+        query = select(Order).from_statement(
+            select(new_order).add_cte(
+                self._order_event(new_order, OrderEventTypeEnum.CREATED)
+            )
+        )
+        res = await self.db_session.execute(query)
+        return res.scalars().one_or_none()
 
     async def delete_order(self, order_id: UUID) -> UUID | None:
         query = (
@@ -47,84 +132,58 @@ class OrderDAL:
                 )
             )
             .values(order_status=OrderStatusEnum.DELETED)
-            .returning(Order.order_id)
         )
-        res = await self.db_session.execute(query)
-        deleted_order_id_row = res.fetchone()
-        if deleted_order_id_row is not None:
-            return deleted_order_id_row[0]
+        return await self._change_order(query, OrderEventTypeEnum.DELETED)
 
     async def get_order_by_id(self, order_id: UUID) -> OrderWithUserSummary | None:
-        query_order = select(Order).where(Order.order_id == order_id)
-        res_order = await self.db_session.execute(query_order)
-        order = res_order.scalars().first()
-
-        if not order:
-            return None
-
-        query_user = select(User).where(User.user_id == order.user_id)
-        res_user = await self.db_session.execute(query_user)
-        user = res_user.scalars().first()
+        # Hot read: the lambda statement is built and compiled once, later
+        # calls only bind order_id, and plain rows skip the identity map
+        query = lambda_stmt(
+            lambda: _order_with_user_summary().where(orders.c.order_id == order_id)
+        )
+        connection = await self.db_session.connection()
+        res = await connection.execute(query)
+        row = res.first()
 
-        if not user:
+        if not row:
             return None
 
-        query_orders = select(
-            func.count(Order.order_id).label("total_orders"),
-            func.sum(Order.total_price).label("total_amount"),
-        ).where(
-            Order.user_id == order.user_id,
-            Order.order_status != OrderStatusEnum.DELETED,
-        )
-        res_orders = await self.db_session.execute(query_orders)
-        result_orders = res_orders.first()
-        total_orders = result_orders.total_orders or 0
-        total_amount = result_orders.total_amount or 0.0
-
         return OrderWithUserSummary(
-            order_id=str(order.order_id),
-            quantity=order.quantity,
-            total_price=order.total_price,
-            description=order.description,
-            order_status=order.order_status,
+            order_id=str(row.order_id),
+            quantity=row.quantity,
+            total_price=row.total_price,
+            description=row.description,
+            order_status=row.order_status,
+            product_id=str(row.product_id) if row.product_id else None,
             user=UserWithOrderSummary(
-                user_id=str(user.user_id),
-                name=user.name,
-                surname=user.surname,
-                email=user.email,
-                is_active=user.is_active,
-                total_orders=total_orders,
-                total_amount=total_amount,
+                user_id=str(row.user_id),
+                name=row.name,
+                surname=row.surname,
+                email=row.email,
+                is_active=row.is_active,
+                total_orders=row.total_orders or 0,
+                total_amount=row.total_amount or 0.0,
             ),
         )
 
-    async def get_all_orders(self) -> list[ShowOrder]:
+    async def get_order_for_update(self, order_id: UUID) -> Row | None:
+        """The columns a status change depends on, the row locked until commit"""
         query = (
-            select(Order)
-            .options(joinedload(Order.user))
-            .order_by(Order.order_date.desc())
+            select(Order.order_id, Order.product_id, Order.quantity, Order.order_status)
+            .where(Order.order_id == order_id)
+            .with_for_update()
         )
         res = await self.db_session.execute(query)
-        orders = res.scalars().all()
-        return [
-            ShowOrder(
-                order_id=order.order_id,
-                quantity=order.quantity,
-                total_price=order.total_price,
-                description=order.description,
-                order_status=order.order_status,
-                user=ShowUser(
-                    user_id=order.user.user_id,
-                    name=order.user.name,
-                    surname=order.user.surname,
-                    email=order.user.email,
-                    is_active=order.user.is_active,
-                )
-                if order.user
-                else None,
-            )
-            for order in orders
-        ]
+        return res.first()
+
+    async def get_all_orders(self, include_description: bool = False) -> list[Order]:
+        # users and products are resolved by the request's batch loaders
+        query = select(Order).order_by(Order.order_date.desc())
+        if not include_description:
+            # unbounded text the list rarely shows, reading it raises
+            query = query.options(defer(Order.description, raiseload=True))
+        res = await self.db_session.execute(query)
+        return res.scalars().all()
 
     async def update_order(self, order_id: UUID, **kwargs) -> UUID | None:
         # Видалення поля order_status з kwargs якщо воно присутнє
@@ -142,12 +201,8 @@ class OrderDAL:
                 )
             )
             .values(kwargs)
-            .returning(Order.order_id)
         )
-        res = await self.db_session.execute(query)
-        updated_order_id_row = res.fetchone()
-        if updated_order_id_row is not None:
-            return updated_order_id_row[0]
+        return await self._change_order(query, OrderEventTypeEnum.UPDATED)
 
         # Change the order status only
 
@@ -163,9 +218,269 @@ class OrderDAL:
                 )
             )
             .values(order_status=new_status)
-            .returning(Order.order_id)
         )
+        return await self._change_order(query, OrderEventTypeEnum.STATUS_CHANGED)
+
+    async def expire_pending_orders(self, placed_before: datetime, limit: int) -> int:
+        """Cancel up to limit PENDING orders placed before placed_before.
+
+        One statement cancels the oldest ones, returns their stock to
+        products.stock_quantity with one UPDATE per product and appends
+        their outbox rows. Orders locked by another transaction are
+        skipped, a later sweep gets them. Returns the number canceled.
+        """
+        stale = (
+            select(Order.order_id)
+            .where(
+                Order.order_status == OrderStatusEnum.PENDING,
+                Order.order_date < placed_before,
+            )
+            .order_by(Order.order_date)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .cte("stale")
+        )
+        canceled = (
+            update(Order)
+            .where(Order.order_id == stale.c.order_id)
+            .values(order_status=OrderStatusEnum.CANCELED)
+            .returning(*Order.__table__.c)
+            .cte("canceled")
+        )
+        released = (
+            select(canceled.c.product_id, func.sum(canceled.c.quantity).label("quantity"))
+            .where(canceled.c.product_id.is_not(None))
+            .group_by(canceled.c.product_id)
+            .cte("released")
+        )
+        # locked in product_id order like other stock writers, an UPDATE
+        # locks rows in whatever order its join produces them
+        locked = (
+            select(Product.product_id)
+            .where(Product.product_id == released.c.product_id)
+            .order_by(Product.product_id)
+            .with_for_update(of=Product)
+            .cte("locked")
+        )
+        # stock of sharded products may go back to the product row as well,
+        # their stock is the product row plus the sub-counters
+        restocked = (
+            update(Product)
+            .where(
+                Product.product_id == locked.c.product_id,
+                Product.product_id == released.c.product_id,
+            )
+            .values(
+                stock_quantity=Product.stock_quantity + released.c.quantity,
+                version=Product.version + 1,
+            )
+            .cte("restocked")
+        )
+        notification = func.json_build_object(
+            "order_id", canceled.c.order_id,
+            "event_type", OrderEventTypeEnum.STATUS_CHANGED.value,
+            "order_status", canceled.c.order_status,
+        )
+        res = await self.db_session.execute(
+            select(
+                canceled.c.order_id,
+                func.pg_notify(ORDER_NOTIFY_CHANNEL, cast(notification, Text)),
+            ).add_cte(
+                restocked,
+                self._order_event(canceled, OrderEventTypeEnum.STATUS_CHANGED),
+            )
+        )
+        return len(res.all())
+
+    async def get_events_since(
+        self, tx_id: int, seq: int, limit: int
+    ) -> list[OrderEvent]:
+        # Transactions below the snapshot xmin are all finished, so no event
+        # can show up later before the last one returned here
+        snapshot_xmin = cast(
+            cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text), BigInteger
+        )
+        query = (
+            select(OrderEvent)
+            .where(
+                tuple_(OrderEvent.tx_id, OrderEvent.seq) > tuple_(tx_id, seq),
+                OrderEvent.tx_id < snapshot_xmin,
+            )
+            .order_by(OrderEvent.tx_id, OrderEvent.seq)
+            .limit(limit)
+        )
+        res = await self.db_session.execute(query)
+        return res.scalars().all()
+
+    async def get_orders_for_export(
+        self,
+        after: tuple[datetime, UUID] | None,
+        limit: int,
+        changed_between: tuple[tuple[int, int], tuple[int, int]] | None = None,
+    ) -> list[Row]:
+        """Next keyset page of orders with their user and product columns.
+
+        Pages are ordered by (order_date, order_id), pass the last row's
+        pair as after. With changed_between, only orders with an event in
+        that (since, until] cursor range are returned.
+        """
+        query = (
+            select(
+                Order.order_id,
+                Order.order_date,
+                Order.order_status,
+                Order.quantity,
+                Order.total_price,
+                Order.description,
+                Order.user_id,
+                User.email.label("user_email"),
+                User.name.label("user_name"),
+                User.surname.label("user_surname"),
+                Order.product_id,
+                Product.name.label("product_name"),
+                Product.price.label("product_price"),
+            )
+            .join(User, User.user_id == Order.user_id)
+            .outerjoin(Product, Product.product_id == Order.product_id)
+            .order_by(Order.order_date, Order.order_id)
+            .limit(limit)
+        )
+        if after is not None:
+            query = query.where(tuple_(Order.order_date, Order.order_id) > tuple_(*after))
+        if changed_between is not None:
+            since, until = changed_between
+            changed_orders = (
+                events_after(since)
+                .with_only_columns(OrderEvent.order_id)
+                .where(tuple_(OrderEvent.tx_id, OrderEvent.seq) <= tuple_(*until))
+            )
+            query = query.where(Order.order_id.in_(changed_orders))
+        res = await self.db_session.execute(query)
+        return res.all()
+
+    async def get_order_values(
+        self, after: UUID | None, limit: int, statuses: list[OrderStatusEnum]
+    ) -> Row:
+        """Keyset page by order_id of order totals with the product's price.
+
+        Returned as one row of arrays, order_ids, product_ids, quantities,
+        total_prices and prices, in order_id order, rather than a row per
+        order. The arrays are None when the page is empty, prices are None
+        for orders without a product.
+        """
+        page = (
+            select(
+                Order.order_id,
+                Order.product_id,
+                Order.quantity,
+                Order.total_price,
+                Product.price,
+            )
+            .outerjoin(Product, Product.product_id == Order.product_id)
+            .where(Order.order_status.in_(statuses))
+            .order_by(Order.order_id)
+            .limit(limit)
+        )
+        if after is not None:
+            page = page.where(Order.order_id > after)
+        page = page.subquery()
+        query = select(
+            *[
+                func.array_agg(aggregate_order_by(column, page.c.order_id)).label(
+                    column.name
+                )
+                for column in page.c
+            ]
+        )
+        res = await self.db_session.execute(query)
+        return res.one()
+
+    async def get_order_status(self, order_id: UUID) -> OrderStatusEnum | None:
+        query = select(Order.order_status).where(Order.order_id == order_id)
         res = await self.db_session.execute(query)
-        updated_order_id_row = res.fetchone()
-        if updated_order_id_row is not None:
-            return updated_order_id_row[0]
+        return res.scalar_one_or_none()
+
+    async def _change_order(self, query, event_type: OrderEventTypeEnum) -> UUID | None:
+        # Run an UPDATE of orders and append its outbox rows in one statement,
+        # live watchers are notified once it commits
+        changed_order = query.returning(*Order.__table__.c).cte("changed_order")
+        notification = func.json_build_object(
+            "order_id", changed_order.c.order_id,
+            "event_type", event_type.value,
+            "order_status", changed_order.c.order_status,
+        )
+        res = await self.db_session.execute(
+            select(
+                changed_order.c.order_id,
+                func.pg_notify(ORDER_NOTIFY_CHANNEL, cast(notification, Text)),
+            ).add_cte(self._order_event(changed_order, event_type))
+        )
+        changed_order_id_row = res.fetchone()
+        if changed_order_id_row is not None:
+            return changed_order_id_row[0]
+
+    @staticmethod
+    def _order_event(changed_orders, event_type: OrderEventTypeEnum):
+        """INSERT of outbox rows for the orders returned by a data-modifying CTE"""
+        payload = func.jsonb_build_object(
+            "order_id", changed_orders.c.order_id,
+            "user_id", changed_orders.c.user_id,
+            "product_id", changed_orders.c.product_id,
+            "quantity", changed_orders.c.quantity,
+            "total_price", changed_orders.c.total_price,
+            "description", changed_orders.c.description,
+            "order_status", changed_orders.c.order_status,
+            "order_date", changed_orders.c.order_date,
+        )
+        return (
+            insert(OrderEvent)
+            .from_select(
+                ["order_id", "event_type", "order_status", "payload"],
+                select(
+                    changed_orders.c.order_id,
+                    literal(event_type, OrderEvent.event_type.type),
+                    changed_orders.c.order_status,
+                    payload,
+                ),
+            )
+            .cte("order_event")
+        )
+
+
+orders = Order.__table__
+users = User.__table__
+
+
+def _order_with_user_summary():
+    """Order columns with its user and the user's totals over all of their orders"""
+    user_order = orders.alias("user_order")
+    user_orders = (
+        select(
+            func.count(user_order.c.order_id).label("total_orders"),
+            func.sum(user_order.c.total_price).label("total_amount"),
+        )
+        .where(
+            user_order.c.user_id == users.c.user_id,
+            user_order.c.order_status != OrderStatusEnum.DELETED,
+        )
+        .lateral("user_orders")
+    )
+    return (
+        select(
+            orders.c.order_id,
+            orders.c.product_id,
+            orders.c.quantity,
+            orders.c.total_price,
+            orders.c.description,
+            orders.c.order_status,
+            users.c.user_id,
+            users.c.name,
+            users.c.surname,
+            users.c.email,
+            users.c.is_active,
+            user_orders.c.total_orders,
+            user_orders.c.total_amount,
+        )
+        .join_from(orders, users, users.c.user_id == orders.c.user_id)
+        .join(user_orders, literal(True))
+    )
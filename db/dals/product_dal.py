@@ -2,8 +2,12 @@ from uuid import UUID
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import update, and_
-from db.models import Product
+from sqlalchemy import update, and_, any_, case, delete, exists, func, lambda_stmt, literal
+from sqlalchemy.engine import Row
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.orm import defer
+from sqlalchemy.orm.attributes import set_committed_value
+from db.models import Product, ProductStockShard
 from enums import ProductStatusEnum  
 
 
@@ -31,7 +35,7 @@ class ProductDAL:
         query = (
             update(Product)
             .where(and_(Product.product_id == product_id, Product.product_status != ProductStatusEnum.DELETED))
-            .values(product_status=ProductStatusEnum.DELETED)
+            .values(product_status=ProductStatusEnum.DELETED, version=Product.version + 1)
             .returning(Product.product_id)
         )
         res = await self.db_session.execute(query)
@@ -41,37 +45,345 @@ class ProductDAL:
 
     async def update_product(self, product_id: UUID, **kwargs) -> UUID | None:
         query = (update(Product).where(Product.product_id == product_id).
-                 values(**kwargs).returning(Product.product_id))
+                 values(**kwargs, version=Product.version + 1).
+                 returning(Product.product_id, Product.stock_shards))
+        if "stock_quantity" in kwargs:
+            await self._lock_stock_shards([product_id])
+            # The new quantity replaces whatever the sub-counters held
+            emptied_shards = (update(ProductStockShard).
+                              where(ProductStockShard.product_id == product_id,
+                                    ProductStockShard.quantity != 0).
+                              values(quantity=0, version=ProductStockShard.version + 1).
+                              cte("emptied_shards"))
+            query = query.add_cte(emptied_shards)
         res = await self.db_session.execute(query)
         updated_product_row = res.fetchone()
         if updated_product_row:
+            if "stock_quantity" in kwargs and updated_product_row.stock_shards:
+                await self._rebalance_stock(product_id)
             return updated_product_row[0]
 
-    async def get_product_by_id(self, product_id: UUID) -> Product | None:
-        query = select(Product).where(Product.product_id == product_id)
+    async def update_products(self, updates: list[dict]) -> list[Row]:
+        """Apply price and stock changes to many products in one statement.
+
+        updates are dicts of product_id, price and stock_quantity, None
+        keeps the current value. They are sent as three arrays unnested
+        into the UPDATE's FROM, so the statement has three parameters
+        whatever the batch size. A new stock_quantity replaces what the
+        sub-counters held and sets product_status, OUT_OF_STOCK at 0 and
+        ACTIVE otherwise; deleted products stay deleted. Returns the
+        updated products with their whole stock, sub-counters included,
+        unknown ids are left out.
+
+        Like every stock writer it locks the sub-counters first, then the
+        product rows in product_id order, so batches can't deadlock with
+        each other, with orders or with the pending order sweep.
+        """
+        await self._lock_stock_shards(
+            [update["product_id"] for update in updates if update["stock_quantity"] is not None]
+        )
+        unnested = func.unnest(
+            literal([update["product_id"] for update in updates], ARRAY(Product.product_id.type)),
+            literal([update["price"] for update in updates], ARRAY(Product.price.type)),
+            literal([update["stock_quantity"] for update in updates], ARRAY(Product.stock_quantity.type)),
+        ).table_valued("product_id", "price", "stock_quantity").render_derived()
+        batch = select(unnested.c.product_id, unnested.c.price, unnested.c.stock_quantity).cte("batch")
+        # an UPDATE locks rows in whatever order its join produces them
+        locked = (select(Product.product_id).
+                  where(Product.product_id == batch.c.product_id).
+                  order_by(Product.product_id).
+                  with_for_update(of=Product).
+                  cte("locked"))
+        emptied_shards = (update(ProductStockShard).
+                          where(ProductStockShard.product_id == batch.c.product_id,
+                                batch.c.stock_quantity.is_not(None),
+                                ProductStockShard.quantity != 0).
+                          values(quantity=0, version=ProductStockShard.version + 1).
+                          cte("emptied_shards"))
+        product_status = case(
+            (Product.product_status == ProductStatusEnum.DELETED, Product.product_status),
+            (batch.c.stock_quantity.is_(None), Product.product_status),
+            (batch.c.stock_quantity == 0,
+             literal(ProductStatusEnum.OUT_OF_STOCK, Product.product_status.type)),
+            else_=literal(ProductStatusEnum.ACTIVE, Product.product_status.type),
+        )
+        # the statement sees the sub-counters as they were before
+        # emptied_shards, a replaced stock is all on the product row
+        shard_stock = (select(func.sum(ProductStockShard.quantity)).
+                       where(ProductStockShard.product_id == Product.product_id).
+                       scalar_subquery())
+        stock_quantity = case(
+            (batch.c.stock_quantity.is_not(None), Product.stock_quantity),
+            else_=Product.stock_quantity + func.coalesce(shard_stock, 0),
+        )
+        query = (update(Product).
+                 where(Product.product_id == locked.c.product_id,
+                       Product.product_id == batch.c.product_id).
+                 values(price=func.coalesce(batch.c.price, Product.price),
+                        stock_quantity=func.coalesce(batch.c.stock_quantity, Product.stock_quantity),
+                        product_status=product_status,
+                        version=Product.version + 1).
+                 returning(Product.product_id, Product.price,
+                           stock_quantity.label("stock_quantity"), Product.product_status, Product.stock_shards,
+                           batch.c.stock_quantity.is_not(None).label("stock_replaced")).
+                 add_cte(emptied_shards).
+                 # there is nothing in the session to synchronize, and the
+                 # ORM's "fetch" strategy would replace the RETURNING clause
+                 execution_options(synchronize_session=False))
         res = await self.db_session.execute(query)
-        product = res.scalars().first()
+        products = res.all()
+        for product in products:
+            if product.stock_shards and product.stock_replaced:
+                # the stock sits on the product row now, spread it again
+                await self._rebalance_stock(product.product_id)
+        return products
+
+    async def get_product_by_id(self, product_id: UUID) -> Row | None:
+        # Hot read: the lambda statement is built and compiled once, later
+        # calls only bind product_id, and plain rows skip the identity map
+        query = lambda_stmt(
+            lambda: select(products).where(products.c.product_id == product_id)
+        )
+        connection = await self.db_session.connection()
+        res = await connection.execute(query)
+        product = res.first()
+        if product is not None and product.stock_shards:
+            # the sub-counters are summed only for the few sharded products,
+            # the subquery would slow down every other read
+            query = lambda_stmt(
+                lambda: _product_with_stock().where(products.c.product_id == product_id)
+            )
+            res = await connection.execute(query)
+            product = res.first()
         return product
 
-    async def get_all_products(self) -> list[Product]:
-        query = select(Product)
+    async def get_product_version(self, product_id: UUID) -> int | None:
+        # Cheap lookup used to answer conditional GETs without loading the row
+        shard_versions = (select(func.sum(ProductStockShard.version)).
+                          where(ProductStockShard.product_id == Product.product_id).
+                          scalar_subquery())
+        query = (select(Product.version + func.coalesce(shard_versions, 0)).
+                 where(Product.product_id == product_id))
+        res = await self.db_session.execute(query)
+        return res.scalar_one_or_none()
+
+    async def get_products_version(self) -> tuple[int, int]:
+        # Rows are never removed and every write bumps a version,
+        # so (count, sum of versions) changes whenever the catalog does
+        shard_versions = select(func.coalesce(func.sum(ProductStockShard.version), 0)).scalar_subquery()
+        query = select(func.count(Product.product_id),
+                       func.coalesce(func.sum(Product.version), 0) + shard_versions)
         res = await self.db_session.execute(query)
-        return res.scalars().all()
+        total, versions = res.one()
+        return total, versions
+
+    async def get_all_products(self, include_description: bool = False) -> list[Product]:
+        query = _without_description(select(Product), include_description)
+        res = await self.db_session.execute(query)
+        products = res.scalars().all()
+        sharded = [product for product in products if product.stock_shards]
+        if sharded:
+            await self._load_sharded_stock(sharded)
+        return products
     
+    async def get_products_by_ids(
+        self, product_ids: list[UUID], include_description: bool = False
+    ) -> list[Product]:
+        query = _without_description(
+            select(Product).where(Product.product_id.in_(product_ids)),
+            include_description,
+        )
+        res = await self.db_session.execute(query)
+        products = res.scalars().all()
+        sharded = [product for product in products if product.stock_shards]
+        if sharded:
+            await self._load_sharded_stock(sharded)
+        return products
+
     async def update_stock(self, product_id: UUID, quantity_change: int):
-        # Checking that the number is not less than 0
-        query = (update(Product).
-                 where(Product.product_id == product_id,Product.stock_quantity + quantity_change >= 0).
-                 values(stock_quantity=Product.stock_quantity + quantity_change).
-                 execution_options(synchronize_session="fetch").
-                 returning(Product.stock_quantity)
-                )
+        """Apply a stock change, refusing to go below zero.
+
+        Sharded products take the change on a random unlocked sub-counter,
+        everything else (and sharded products whose sub-counters can't
+        serve it) on products.stock_quantity, all in one statement.
+        Returns the remaining quantity of the counter that served the
+        change, or None when there is not enough stock.
+
+        Stock left on the product row is not moved back to the sub-counters
+        here, that would lock them while the product row is held. They are
+        always served first and the next rebalance pools it.
+        """
         try:
-            result = await self.db_session.execute(query)
-            updated_stock_row = result.fetchone()
-            if updated_stock_row:
-                return updated_stock_row[0]
-            else:
-                return None
+            # a savepoint, so a failed change leaves the caller's transaction usable
+            async with self.db_session.begin_nested() as savepoint:
+                res = await self.db_session.execute(self._stock_change_query(product_id, quantity_change))
+                remaining, stock_shards = res.one()
+                if remaining is None:
+                    # An UPDATE that waited for the product row keeps it locked
+                    # even when the row no longer matches, release it before
+                    # the sub-counters are locked below
+                    await savepoint.rollback()
+            if stock_shards and remaining is None and quantity_change < 0:
+                # Every sub-counter that could serve it was busy, wait for one
+                async with self.db_session.begin_nested() as savepoint:
+                    res = await self.db_session.execute(
+                        self._stock_change_query(product_id, quantity_change, wait_for_shard=True)
+                    )
+                    remaining = res.one()[0]
+                    if remaining is None:
+                        await savepoint.rollback()
+            if stock_shards and remaining is None and quantity_change < 0:
+                # Sub-counters are too fragmented, pool the stock and
+                # reserve the requested quantity on the product row
+                async with self.db_session.begin_nested():
+                    if await self._rebalance_stock(product_id, reserve=-quantity_change):
+                        res = await self.db_session.execute(self._stock_change_query(product_id, quantity_change))
+                        remaining = res.one()[0]
+            return remaining
         except IntegrityError:
-            return None
\ No newline at end of file
+            return None
+
+    @staticmethod
+    def _stock_change_query(product_id: UUID, quantity_change: int, wait_for_shard: bool = False):
+        # A sub-counter another change holds is skipped, or waited for with
+        # wait_for_shard. Only that single row is waited for, never a second
+        # one while holding it.
+        shard_no = (select(ProductStockShard.shard_no).
+                    where(ProductStockShard.product_id == product_id,
+                          ProductStockShard.quantity + quantity_change >= 0).
+                    order_by(func.random()).
+                    limit(1))
+        if not wait_for_shard:
+            shard_no = shard_no.with_for_update(skip_locked=True)
+        shard = (update(ProductStockShard).
+                 where(ProductStockShard.product_id == product_id,
+                       ProductStockShard.shard_no == shard_no.scalar_subquery(),
+                       ProductStockShard.quantity + quantity_change >= 0).
+                 values(quantity=ProductStockShard.quantity + quantity_change,
+                        version=ProductStockShard.version + 1).
+                 returning(ProductStockShard.quantity).
+                 cte("shard_change"))
+        product = (update(Product).
+                   where(Product.product_id == product_id,
+                         Product.stock_quantity + quantity_change >= 0,
+                         ~exists(select(shard.c.quantity))).
+                   values(stock_quantity=Product.stock_quantity + quantity_change,
+                          version=Product.version + 1).
+                   returning(Product.stock_quantity).
+                   cte("product_change"))
+        return select(
+            func.coalesce(select(shard.c.quantity).scalar_subquery(),
+                          select(product.c.stock_quantity).scalar_subquery()),
+            select(Product.stock_shards).where(Product.product_id == product_id).scalar_subquery(),
+        )
+
+    async def set_stock_shards(self, product_id: UUID, shards: int) -> UUID | None:
+        """Split the stock of a hot product into shards sub-counters, 0 turns it off"""
+        await self._lock_stock_shards([product_id])
+        query = (update(Product).
+                 where(Product.product_id == product_id).
+                 values(stock_shards=shards, version=Product.version + 1).
+                 returning(Product.product_id))
+        res = await self.db_session.execute(query)
+        updated_product_row = res.fetchone()
+        if not updated_product_row:
+            return None
+        if shards:
+            new_shards = insert(ProductStockShard).values(
+                [{"product_id": product_id, "shard_no": shard_no, "quantity": 0}
+                 for shard_no in range(shards)]
+            ).on_conflict_do_nothing()
+            await self.db_session.execute(new_shards)
+        await self._rebalance_stock(product_id)
+        # Surplus sub-counters were emptied by the rebalance
+        await self.db_session.execute(
+            delete(ProductStockShard).where(ProductStockShard.product_id == product_id,
+                                            ProductStockShard.shard_no >= shards,
+                                            ProductStockShard.quantity == 0)
+        )
+        return updated_product_row[0]
+
+    async def _lock_stock_shards(self, product_ids: list[UUID]) -> None:
+        # Writers lock sub-counters before product rows, both in a fixed
+        # order, so concurrent stock changes can't deadlock
+        query = (select(ProductStockShard.product_id).
+                 where(ProductStockShard.product_id ==
+                       any_(literal(product_ids, ARRAY(ProductStockShard.product_id.type)))).
+                 order_by(ProductStockShard.product_id, ProductStockShard.shard_no).
+                 with_for_update())
+        await self.db_session.execute(query)
+
+    async def _rebalance_stock(self, product_id: UUID, reserve: int = 0) -> bool | None:
+        """Spread the whole stock of a product evenly over its sub-counters.
+
+        Up to reserve units stay on products.stock_quantity for the caller
+        to take, and everything does when the product is no longer sharded.
+        Sub-counters are locked before the product row, in shard order.
+        Returns whether the product had at least reserve units.
+        """
+        locked_shards = (select(ProductStockShard.quantity).
+                         where(ProductStockShard.product_id == product_id).
+                         order_by(ProductStockShard.shard_no).
+                         with_for_update().
+                         cte("locked_shards"))
+        sharded_total = select(func.coalesce(func.sum(locked_shards.c.quantity), 0)).scalar_subquery()
+        total = (select(Product.product_id,
+                        (Product.stock_quantity + sharded_total).label("amount"),
+                        Product.stock_shards.label("shards")).
+                 where(Product.product_id == product_id).
+                 with_for_update().
+                 cte("total_stock"))
+        spread = case((total.c.shards > 0, total.c.amount - func.least(total.c.amount, reserve)),
+                      else_=0)
+        base = (update(Product).
+                where(Product.product_id == total.c.product_id).
+                values(stock_quantity=total.c.amount - spread, version=Product.version + 1).
+                returning(Product.product_id, total.c.amount, total.c.shards, spread.label("spread")).
+                cte("product_stock"))
+        shard_share = (base.c.spread // base.c.shards +
+                       case((ProductStockShard.shard_no < base.c.spread % base.c.shards, 1), else_=0))
+        shards = (update(ProductStockShard).
+                  where(ProductStockShard.product_id == base.c.product_id).
+                  values(quantity=case((ProductStockShard.shard_no < base.c.shards, shard_share), else_=0),
+                         version=ProductStockShard.version + 1).
+                  cte("shard_stock"))
+        query = select(base.c.amount >= reserve).add_cte(shards)
+        res = await self.db_session.execute(query)
+        return res.scalar_one_or_none()
+
+    async def _load_sharded_stock(self, products: list[Product]):
+        # Report the stock of sharded products as product row plus sub-counters
+        query = (select(ProductStockShard.product_id, func.sum(ProductStockShard.quantity)).
+                 where(ProductStockShard.product_id.in_([product.product_id for product in products])).
+                 group_by(ProductStockShard.product_id))
+        res = await self.db_session.execute(query)
+        sharded_stock = dict(res.all())
+        for product in products:
+            total = product.stock_quantity + sharded_stock.get(product.product_id, 0)
+            set_committed_value(product, "stock_quantity", total)
+
+
+products = Product.__table__
+stock_shards = ProductStockShard.__table__
+
+
+def _product_with_stock():
+    """Product columns, stock_quantity including the product's sub-counters"""
+    shard_stock = (select(func.sum(stock_shards.c.quantity)).
+                   where(stock_shards.c.product_id == products.c.product_id).
+                   scalar_subquery())
+    return select(
+        *[column for column in products.c if column.name != "stock_quantity"],
+        (products.c.stock_quantity + func.coalesce(shard_stock, 0)).label("stock_quantity"),
+    )
+
+
+def _without_description(query, include_description: bool):
+    """Leave the unbounded description out of a list query unless asked for.
+
+    It can be kilobytes per product while list views rarely show it.
+    Reading the deferred attribute raises instead of lazy loading it.
+    """
+    if include_description:
+        return query
+    return query.options(defer(Product.description, raiseload=True))
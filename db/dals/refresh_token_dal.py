@@ -0,0 +1,73 @@
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import and_, delete, update
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from db.models import RefreshToken, User
+
+
+class RefreshTokenDAL:
+    """Data Access Layer for operating refresh tokens"""
+
+    def __init__(self, db_session: AsyncSession):
+        self.db_session = db_session
+
+    async def create_token(
+        self, token_hash: str, family_id: UUID, user_id: UUID, expires_at: datetime
+    ) -> None:
+        new_token = RefreshToken(
+            token_hash=token_hash,
+            family_id=family_id,
+            user_id=user_id,
+            expires_at=expires_at,
+        )
+        self.db_session.add(new_token)
+        await self.db_session.flush()
+
+    async def use_token(self, token_hash: str) -> Row | None:
+        """Mark a valid refresh token as used and return its owner.
+
+        Only one caller can use a token: the UPDATE matches while used_at is
+        still NULL, the token is not expired and its user is active.
+        """
+        query = (
+            update(RefreshToken)
+            .where(
+                and_(
+                    RefreshToken.token_hash == token_hash,
+                    RefreshToken.used_at.is_(None),
+                    RefreshToken.expires_at > datetime.utcnow(),
+                    RefreshToken.user_id == User.user_id,
+                    User.is_active == True,  # noqa: E712
+                )
+            )
+            .values(used_at=datetime.utcnow())
+            .returning(RefreshToken.family_id, User.user_id, User.email)
+        )
+        res = await self.db_session.execute(query)
+        return res.fetchone()
+
+    async def revoke_reused_family(self, token_hash: str) -> int:
+        """Drop all tokens of the family if this token was already used"""
+        return await self._delete_family(
+            RefreshToken.token_hash == token_hash, RefreshToken.used_at.is_not(None)
+        )
+
+    async def revoke_family(self, token_hash: str) -> int:
+        return await self._delete_family(RefreshToken.token_hash == token_hash)
+
+    async def _delete_family(self, *token_conditions) -> int:
+        family = (
+            select(RefreshToken.family_id).where(*token_conditions).scalar_subquery()
+        )
+        query = delete(RefreshToken).where(RefreshToken.family_id == family)
+        res = await self.db_session.execute(query)
+        return res.rowcount
+
+    async def delete_expired(self) -> int:
+        query = delete(RefreshToken).where(RefreshToken.expires_at < datetime.utcnow())
+        res = await self.db_session.execute(query)
+        return res.rowcount
@@ -0,0 +1,50 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Text, cast, delete, func, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from db.models import RevokedToken
+
+
+class RevokedTokenDAL:
+    """Data Access Layer for operating revoked access tokens"""
+
+    def __init__(self, db_session: AsyncSession):
+        self.db_session = db_session
+
+    async def revoke(self, jti: str, expires_at: datetime) -> None:
+        query = (
+            insert(RevokedToken)
+            .values(jti=jti, expires_at=expires_at)
+            .on_conflict_do_nothing(index_elements=[RevokedToken.jti])
+        )
+        await self.db_session.execute(query)
+
+    async def is_revoked(self, jti: str) -> bool:
+        query = select(RevokedToken.seq).where(RevokedToken.jti == jti)
+        res = await self.db_session.execute(query)
+        return res.first() is not None
+
+    async def get_revoked_since(self, tx_id: int, seq: int) -> list[Row]:
+        # see OrderDAL.get_events_since, rows of running transactions wait
+        snapshot_xmin = cast(
+            cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text), BigInteger
+        )
+        query = (
+            select(RevokedToken.tx_id, RevokedToken.seq, RevokedToken.jti)
+            .where(
+                tuple_(RevokedToken.tx_id, RevokedToken.seq) > tuple_(tx_id, seq),
+                RevokedToken.tx_id < snapshot_xmin,
+            )
+            .order_by(RevokedToken.tx_id, RevokedToken.seq)
+        )
+        res = await self.db_session.execute(query)
+        return res.all()
+
+    async def delete_expired(self) -> int:
+        query = delete(RevokedToken).where(RevokedToken.expires_at < datetime.utcnow())
+        res = await self.db_session.execute(query)
+        return res.rowcount
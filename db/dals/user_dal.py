@@ -1,12 +1,12 @@
 from uuid import UUID
 
-from sqlalchemy import and_, update, func
+from sqlalchemy import and_, func, lambda_stmt, update
+from sqlalchemy.engine import Row
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from dataclasses_ import UserWithOrderSummary
 
 from db.models import User, Order
-from api.models.user import ShowUser
 from enums import OrderStatusEnum
 
 
@@ -68,12 +68,19 @@ class UserDAL:
             total_amount=total_amount,
         )
 
-    async def get_user_by_email(self, email: str) -> ShowUser | None:
-        query = select(User).where(User.email == email)
+    async def get_users_by_ids(self, user_ids: list[UUID]) -> list[User]:
+        query = select(User).where(User.user_id.in_(user_ids))
         res = await self.db_session.execute(query)
-        user_row = res.fetchone()
-        if user_row is not None:
-            return user_row[0]
+        return res.scalars().all()
+
+    async def get_user_by_email(self, email: str) -> Row | None:
+        # Hot read on every login: a cached lambda statement run on the
+        # connection, returning a plain row with the users columns
+        users = User.__table__
+        query = lambda_stmt(lambda: select(users).where(users.c.email == email))
+        connection = await self.db_session.connection()
+        res = await connection.execute(query)
+        return res.first()
 
     async def update_user(self, user_id: UUID, **kwargs) -> UUID | None:
         query = (
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Text, cast, desc, func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models import OrderEvent, Watermark
+
+
+class WatermarkDAL:
+    """Data Access Layer for operating positions of order_events consumers"""
+
+    def __init__(self, db_session: AsyncSession):
+        self.db_session = db_session
+
+    async def get_watermark(self, name: str) -> tuple[int, int] | None:
+        query = select(Watermark.tx_id, Watermark.seq).where(Watermark.name == name)
+        res = await self.db_session.execute(query)
+        row = res.fetchone()
+        return tuple(row) if row is not None else None
+
+    async def save_watermark(self, name: str, cursor: tuple[int, int]) -> None:
+        tx_id, seq = cursor
+        query = (
+            insert(Watermark)
+            .values(name=name, tx_id=tx_id, seq=seq)
+            .on_conflict_do_update(
+                index_elements=[Watermark.name],
+                set_={"tx_id": tx_id, "seq": seq, "updated_at": datetime.utcnow()},
+            )
+        )
+        await self.db_session.execute(query)
+
+    async def get_last_event_cursor(self) -> tuple[int, int]:
+        """Cursor of the newest event a consumer can safely have seen"""
+        query = (
+            events_after((0, 0))
+            .with_only_columns(OrderEvent.tx_id, OrderEvent.seq)
+            .order_by(desc(OrderEvent.tx_id), desc(OrderEvent.seq))
+            .limit(1)
+        )
+        res = await self.db_session.execute(query)
+        last = res.fetchone()
+        return tuple(last) if last is not None else (0, 0)
+
+
+def events_after(cursor: tuple[int, int]):
+    """Select of the order events after cursor, in commit-safe range.
+
+    Events of transactions still running when the statement starts are
+    left out, see OrderDAL.get_events_since.
+    """
+    snapshot_xmin = cast(
+        cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text), BigInteger
+    )
+    return select(OrderEvent).where(
+        tuple_(OrderEvent.tx_id, OrderEvent.seq) > tuple_(*cursor),
+        OrderEvent.tx_id < snapshot_xmin,
+    )
@@ -0,0 +1,94 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, Iterable
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.dals.product_dal import ProductDAL
+from db.dals.user_dal import UserDAL
+from db.models import Product, User
+
+
+class BatchLoader:
+    """Coalesces the loads of one request into a single query per batch.
+
+    Keys passed to load() before the event loop gets to run the batch are
+    fetched together with one fetch_many(keys) call, which returns the
+    found values by key. Every key is fetched at most once, later loads of
+    it return the memoized value, None when it wasn't found.
+    """
+
+    def __init__(
+        self,
+        fetch_many: Callable[[list], Awaitable[dict]],
+        lock: asyncio.Lock,
+    ):
+        self.fetch_many = fetch_many
+        # shared by the loaders of a session, it runs one query at a time
+        self.lock = lock
+        self._values: dict[Hashable, asyncio.Future] = {}
+        self._batch: list[Hashable] = []
+        # the event loop only keeps weak references to tasks
+        self._dispatching: set[asyncio.Task] = set()
+
+    def load(self, key: Hashable) -> asyncio.Future:
+        if key not in self._values:
+            loop = asyncio.get_running_loop()
+            self._values[key] = loop.create_future()
+            if not self._batch:
+                loop.call_soon(self._start_dispatch)
+            self._batch.append(key)
+        return self._values[key]
+
+    async def load_many(self, keys: Iterable[Hashable]) -> list:
+        return await asyncio.gather(*(self.load(key) for key in keys))
+
+    def _start_dispatch(self) -> None:
+        task = asyncio.ensure_future(self._dispatch())
+        self._dispatching.add(task)
+        task.add_done_callback(self._dispatching.discard)
+
+    async def _dispatch(self) -> None:
+        keys, self._batch = self._batch, []
+        try:
+            async with self.lock:
+                values = await self.fetch_many(keys)
+        except Exception as err:
+            for key in keys:
+                # not memoized, a later load may try again
+                self._values.pop(key).set_exception(err)
+            return
+        for key in keys:
+            self._values[key].set_result(values.get(key))
+
+
+class RequestLoaders:
+    """Batch loaders of the entities orders refer to, one set per request.
+
+    Products come without their description unless include_description.
+    """
+
+    def __init__(self, db_session: AsyncSession, include_description: bool = False):
+        lock = asyncio.Lock()
+        self.users = BatchLoader(self._fetch_users(UserDAL(db_session)), lock)
+        self.products = BatchLoader(
+            self._fetch_products(ProductDAL(db_session), include_description), lock
+        )
+
+    @staticmethod
+    def _fetch_users(user_dal: UserDAL):
+        async def fetch_users(user_ids: list[UUID]) -> dict[UUID, User]:
+            users = await user_dal.get_users_by_ids(user_ids)
+            return {user.user_id: user for user in users}
+
+        return fetch_users
+
+    @staticmethod
+    def _fetch_products(product_dal: ProductDAL, include_description: bool):
+        async def fetch_products(product_ids: list[UUID]) -> dict[UUID, Product]:
+            products = await product_dal.get_products_by_ids(
+                product_ids, include_description
+            )
+            return {product.product_id: product for product in products}
+
+        return fetch_products
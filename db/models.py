@@ -1,10 +1,27 @@
 from datetime import datetime
 import uuid
 
-from sqlalchemy import DateTime, Enum, Column, ForeignKey, String, Boolean
-from sqlalchemy.dialects.postgresql import UUID, INTEGER, FLOAT
+from sqlalchemy import (
+    BigInteger,
+    DateTime,
+    Enum,
+    Column,
+    ForeignKey,
+    Identity,
+    Index,
+    String,
+    Boolean,
+    text,
+)
+from sqlalchemy.dialects.postgresql import UUID, INTEGER, FLOAT, JSONB
 from sqlalchemy.orm import declarative_base, relationship
-from enums import OrderStatusEnum, ProductStatusEnum
+from enums import (
+    JobStatusEnum,
+    OrderEventTypeEnum,
+    OrderStatusEnum,
+    ProductStatusEnum,
+    RollupGranularityEnum,
+)
 
 
 # BLOCK WITH DATABASE MODELS #
@@ -26,6 +43,16 @@ class User(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # rollups recompute one product's orders in a time bucket
+        Index("ix_orders_product_id_order_date", "product_id", "order_date"),
+        # the stale PENDING orders sweep, only the few pending ones are indexed
+        Index(
+            "ix_orders_pending_order_date",
+            "order_date",
+            postgresql_where=text("order_status = 'PENDING'"),
+        ),
+    )
 
     order_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.user_id"), nullable=False)
@@ -40,6 +67,32 @@ class Order(Base):
     user = relationship("User", back_populates="orders")
 
 
+class OrderEvent(Base):
+    """Outbox row written by the same statement as the order change.
+
+    tx_id is the id of the writing transaction, readers only take events
+    of transactions older than every running one so none can be skipped.
+    """
+
+    __tablename__ = "order_events"
+    __table_args__ = (Index("ix_order_events_tx_id_seq", "tx_id", "seq"),)
+
+    seq = Column(BigInteger, Identity(), primary_key=True)
+    tx_id = Column(
+        BigInteger,
+        server_default=text("(pg_current_xact_id()::text)::bigint"),
+        nullable=False,
+    )
+    order_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    event_type = Column(Enum(OrderEventTypeEnum), nullable=False)
+    order_status = Column(Enum(OrderStatusEnum), nullable=False)
+    # snapshot of the order after the change
+    payload = Column(JSONB, nullable=False)
+    created_at = Column(
+        DateTime, server_default=text("timezone('utc', now())"), nullable=False
+    )
+
+
 class Product(Base):
     __tablename__ = "products"
 
@@ -51,3 +104,115 @@ class Product(Base):
     product_status = Column(
         Enum(ProductStatusEnum), default=ProductStatusEnum.ACTIVE, nullable=False
     )
+    # bumped on every write, used to build strong ETags for the catalog
+    version = Column(INTEGER, default=1, server_default="1", nullable=False)
+    # number of ProductStockShard rows holding part of the stock, 0 for plain mode
+    stock_shards = Column(INTEGER, default=0, server_default="0", nullable=False)
+
+
+class ProductStockShard(Base):
+    """Sub-counter of a hot product's stock.
+
+    The available stock of a product is its stock_quantity plus the sum
+    of its shards, so decrements for one SKU can lock different rows.
+    """
+
+    __tablename__ = "product_stock_shards"
+
+    product_id = Column(
+        UUID(as_uuid=True), ForeignKey("products.product_id"), primary_key=True
+    )
+    shard_no = Column(INTEGER, primary_key=True)
+    quantity = Column(INTEGER, default=0, nullable=False)
+    version = Column(INTEGER, default=1, server_default="1", nullable=False)
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    # both stay NULL while the first request with this key is still running
+    status_code = Column(INTEGER, nullable=True)
+    response_body = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    # sha256 of the opaque token, the token itself is never stored
+    token_hash = Column(String(64), primary_key=True)
+    # every token rotated from one login shares the family of the first one
+    family_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.user_id"), nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    # set once the token was exchanged, using it again means it leaked
+    used_at = Column(DateTime, nullable=True)
+
+
+class RevokedToken(Base):
+    """Access tokens revoked before their expiry, mirrored by revocation.py"""
+
+    __tablename__ = "revoked_tokens"
+    __table_args__ = (Index("ix_revoked_tokens_tx_id_seq", "tx_id", "seq"),)
+
+    seq = Column(BigInteger, Identity(), primary_key=True)
+    # same commit-safe cursor as order_events
+    tx_id = Column(
+        BigInteger,
+        server_default=text("(pg_current_xact_id()::text)::bigint"),
+        nullable=False,
+    )
+    jti = Column(String(64), nullable=False, unique=True)
+    # the row is useless once the token would have expired anyway
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class OrderRollup(Base):
+    """Orders, units and revenue per time bucket, product and order status"""
+
+    __tablename__ = "order_rollups"
+
+    granularity = Column(Enum(RollupGranularityEnum), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    product_id = Column(UUID(as_uuid=True), primary_key=True)
+    order_status = Column(Enum(OrderStatusEnum), primary_key=True)
+    orders = Column(INTEGER, nullable=False)
+    units = Column(INTEGER, nullable=False)
+    revenue = Column(FLOAT, nullable=False)
+
+
+class Watermark(Base):
+    """How far a consumer of order_events has got, as a (tx_id, seq) cursor"""
+
+    __tablename__ = "watermarks"
+
+    name = Column(String(64), primary_key=True)
+    tx_id = Column(BigInteger, nullable=False)
+    seq = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class Job(Base):
+    """Work done after the request that enqueued it, see jobs.py.
+
+    Finished jobs are deleted, the table only holds queued, running and
+    dead-lettered ones.
+    """
+
+    __tablename__ = "jobs"
+    __table_args__ = (Index("ix_jobs_status_run_after", "status", "run_after"),)
+
+    job_id = Column(BigInteger, Identity(), primary_key=True)
+    name = Column(String(64), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    status = Column(Enum(JobStatusEnum), nullable=False)
+    attempts = Column(INTEGER, default=0, server_default="0", nullable=False)
+    max_attempts = Column(INTEGER, nullable=False)
+    # not claimed before, set further out by every failed attempt
+    run_after = Column(DateTime, nullable=False)
+    # lease of a RUNNING job, a worker that died is taken over once it expires
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
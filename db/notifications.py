@@ -0,0 +1,111 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from logging import getLogger
+from typing import AsyncIterator
+from uuid import UUID
+
+import asyncpg
+
+import settings
+
+logger = getLogger(__name__)
+
+# channel OrderDAL notifies on whenever an order row changes
+ORDER_NOTIFY_CHANNEL = "order_changes"
+
+
+class OrderNotificationListener:
+    """One LISTEN connection per worker, fanned out to per-order subscribers.
+
+    Notifications carry {"order_id", "event_type", "order_status"}. A
+    subscriber gets a bounded queue; when it falls behind only the newest
+    notifications are kept, since watchers only care about the latest status.
+    After a reconnect subscribers receive None, as notifications sent while
+    the connection was down are lost and they should re-read the order.
+    Without a dsn the primary database is used, resolved when started.
+    """
+
+    def __init__(
+        self, dsn: str | None, reconnect_interval: float, queue_size: int
+    ):
+        self.dsn = dsn
+        self.reconnect_interval = reconnect_interval
+        self.queue_size = queue_size
+        self._subscribers: dict[UUID, set[asyncio.Queue]] = {}
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            if self.dsn is None:
+                # asyncpg takes a plain libpq URL, without the SQLAlchemy
+                # driver suffix
+                self.dsn = settings.REAL_DATABASE_URL.replace(
+                    "postgresql+asyncpg://", "postgresql://", 1
+                )
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    @asynccontextmanager
+    async def subscribe(self, order_id: UUID) -> AsyncIterator[asyncio.Queue]:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(order_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            queues = self._subscribers[order_id]
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[order_id]
+
+    async def _listen(self) -> None:
+        connected_before = False
+        while True:
+            closed = asyncio.Event()
+            try:
+                connection = await asyncpg.connect(self.dsn)
+            except (OSError, asyncpg.PostgresError):
+                logger.exception("Can't connect the order notification listener")
+                await asyncio.sleep(self.reconnect_interval)
+                continue
+            try:
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(ORDER_NOTIFY_CHANNEL, self._on_notify)
+                if connected_before:
+                    self._broadcast_resync()
+                connected_before = True
+                await closed.wait()
+                logger.warning("Order notification listener lost its connection")
+            except (OSError, asyncpg.PostgresError):
+                logger.exception("Order notification listener failed")
+            finally:
+                connection.terminate()
+            await asyncio.sleep(self.reconnect_interval)
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        notification = json.loads(payload)
+        for queue in self._subscribers.get(UUID(notification["order_id"]), ()):
+            self._put_latest(queue, notification)
+
+    def _broadcast_resync(self) -> None:
+        for queues in self._subscribers.values():
+            for queue in queues:
+                self._put_latest(queue, None)
+
+    @staticmethod
+    def _put_latest(queue: asyncio.Queue, item) -> None:
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(item)
+
+
+order_listener = OrderNotificationListener(
+    None,
+    reconnect_interval=settings.ORDER_NOTIFY_RECONNECT_INTERVAL,
+    queue_size=settings.ORDER_WATCH_QUEUE_SIZE,
+)
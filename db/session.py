@@ -1,6 +1,13 @@
+import asyncio
+import functools
+import itertools
+import time
 from typing import Generator
 
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
 import settings as settings
@@ -8,22 +15,159 @@ import settings as settings
 
 # BLOCK FOR COMMON INTERACTION WITH DATABASE #
 
-# create async engine for interaction with database
-engine = create_async_engine(
-    settings.REAL_DATABASE_URL,
-    future=True,
-    echo=True,
-    execution_options={"isolation_level": "AUTOCOMMIT"},
-)
+# Engines are created on first use rather than at import time, so importing
+# the app (workers starting, test collection, commands) stays cheap.
 
-# create session for the interaction with database
-async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+@functools.cache
+def get_engine() -> AsyncEngine:
+    """Async engine for interaction with the primary database"""
+    return create_async_engine(
+        settings.REAL_DATABASE_URL,
+        future=True,
+        echo=True,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=0,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    )
+
+
+@functools.cache
+def get_read_only_engine() -> AsyncEngine:
+    """The primary engine with its transactions started READ ONLY"""
+    return get_engine().execution_options(postgresql_readonly=True)
+
+
+@functools.cache
+def _session_factory() -> sessionmaker:
+    return sessionmaker(get_engine(), expire_on_commit=False, class_=AsyncSession)
+
+
+def async_session(**kwargs) -> AsyncSession:
+    """Create session for the interaction with database.
+
+    Statements run in a transaction that lasts until commit or close, use
+    `async with async_session() as session, session.begin():` to write.
+    """
+    return _session_factory()(**kwargs)
+
+
+# cookie telling get_read_db that the client has just written to the primary
+PRIMARY_UNTIL_COOKIE = "primary_until"
+
+
+class ReplicaPool:
+    """Round-robin pool of read replica engines with periodic health checks"""
+
+    def __init__(self, urls: list[str], check_interval: float, check_timeout: float):
+        self.engines: list[AsyncEngine] = [
+            create_async_engine(
+                url,
+                future=True,
+                echo=True,
+                pool_pre_ping=True,
+                pool_size=settings.DB_POOL_SIZE,
+                max_overflow=0,
+                pool_timeout=settings.DB_POOL_TIMEOUT,
+                execution_options={"postgresql_readonly": True},
+            )
+            for url in urls
+        ]
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self._healthy = [True] * len(self.engines)
+        self._checked_at = [0.0] * len(self.engines)
+        self._counter = itertools.count()
+
+    async def _is_alive(self, engine: AsyncEngine) -> bool:
+        try:
+            async with asyncio.timeout(self.check_timeout):
+                async with engine.connect() as connection:
+                    await connection.execute(text("SELECT 1"))
+        except (OSError, TimeoutError, DBAPIError):
+            return False
+        return True
+
+    async def get_engine(self) -> AsyncEngine | None:
+        """Return the next healthy replica, or None when the primary should be used"""
+        for _ in range(len(self.engines)):
+            index = next(self._counter) % len(self.engines)
+            now = time.monotonic()
+            if now - self._checked_at[index] >= self.check_interval:
+                # mark as checked first so concurrent requests don't probe too
+                self._checked_at[index] = now
+                self._healthy[index] = await self._is_alive(self.engines[index])
+            if self._healthy[index]:
+                return self.engines[index]
+        return None
+
+    def mark_unhealthy(self, engine: AsyncEngine) -> None:
+        index = self.engines.index(engine)
+        self._healthy[index] = False
+        self._checked_at[index] = time.monotonic()
+
+    async def dispose(self) -> None:
+        for engine in self.engines:
+            await engine.dispose()
+
+
+@functools.cache
+def get_replica_pool() -> ReplicaPool:
+    return ReplicaPool(
+        settings.REPLICA_DATABASE_URLS,
+        check_interval=settings.REPLICA_HEALTH_CHECK_INTERVAL,
+        check_timeout=settings.REPLICA_HEALTH_CHECK_TIMEOUT,
+    )
+
+
+async def dispose_engines() -> None:
+    """Close the pooled connections of the engines created so far"""
+    if get_engine.cache_info().currsize:
+        await get_engine().dispose()
+    if get_replica_pool.cache_info().currsize:
+        await get_replica_pool().dispose()
 
 
 async def get_db() -> Generator:  # type: ignore
-    """Dependency for getting async session"""
-    try:
-        session: AsyncSession = async_session()
+    """Dependency for getting async session, one unit of work per request.
+
+    Everything the endpoint does runs in a single transaction, committed
+    when it returns and rolled back when it raises.
+    """
+    async with async_session() as session, session.begin():
         yield session
+
+
+async def get_own_db() -> Generator:  # type: ignore
+    """Dependency for a session apart from the request's transaction.
+
+    For writes other requests must see before this one ends, each in a
+    short `async with session.begin():` of its own.
+    """
+    async with async_session() as session:
+        yield session
+
+
+async def get_read_db(request: Request) -> Generator:  # type: ignore
+    """Dependency for getting async session for read-only endpoints.
+
+    Served by a replica unless none is healthy or the client wrote
+    something within READ_AFTER_WRITE_WINDOW seconds, in a READ ONLY
+    transaction either way.
+    """
+    replica = None
+    primary_until = request.cookies.get(PRIMARY_UNTIL_COOKIE, "")
+    if not (primary_until.isdigit() and int(primary_until) > time.time()):
+        replica = await get_replica_pool().get_engine()
+    session: AsyncSession = async_session(bind=replica or get_read_only_engine())
+    try:
+        async with session.begin():
+            yield session
+    except (OSError, DBAPIError) as err:
+        if replica is not None and (
+            isinstance(err, OSError) or err.connection_invalidated
+        ):
+            get_replica_pool().mark_unhealthy(replica)
+        raise
     finally:
         await session.close()
@@ -1,10 +1,16 @@
 from typing import Annotated
 
 from fastapi import Depends
+from db.dals.analytics_dal import AnalyticsDAL
+from db.dals.idempotency_dal import IdempotencyDAL
+from db.dals.job_dal import JobDAL
 from db.dals.order_dal import OrderDAL
 from db.dals.product_dal import ProductDAL
+from db.dals.refresh_token_dal import RefreshTokenDAL
+from db.dals.revoked_token_dal import RevokedTokenDAL
 from db.dals.user_dal import UserDAL
-from db.session import get_db
+from db.loaders import RequestLoaders
+from db.session import get_db, get_own_db, get_read_db
 from sqlalchemy.ext.asyncio import AsyncSession
 
 
@@ -16,3 +22,34 @@ async def get_product_dal(db_session: Annotated[AsyncSession, Depends(get_db)])
 
 async def get_user_dal(db_session: Annotated[AsyncSession, Depends(get_db)]) -> UserDAL:
     return UserDAL(db_session=db_session)
+
+async def get_idempotency_dal(db_session: Annotated[AsyncSession, Depends(get_db)]) -> IdempotencyDAL:
+    return IdempotencyDAL(db_session=db_session)
+
+async def get_idempotency_claim_dal(db_session: Annotated[AsyncSession, Depends(get_own_db)]) -> IdempotencyDAL:
+    return IdempotencyDAL(db_session=db_session)
+
+async def get_job_dal(db_session: Annotated[AsyncSession, Depends(get_db)]) -> JobDAL:
+    return JobDAL(db_session=db_session)
+
+async def get_refresh_token_dal(db_session: Annotated[AsyncSession, Depends(get_db)]) -> RefreshTokenDAL:
+    return RefreshTokenDAL(db_session=db_session)
+
+async def get_revoked_token_dal(db_session: Annotated[AsyncSession, Depends(get_db)]) -> RevokedTokenDAL:
+    return RevokedTokenDAL(db_session=db_session)
+
+
+async def get_read_order_dal(db_session: Annotated[AsyncSession, Depends(get_read_db)]) -> OrderDAL:
+    return OrderDAL(db_session=db_session)
+
+async def get_read_product_dal(db_session: Annotated[AsyncSession, Depends(get_read_db)]) -> ProductDAL:
+    return ProductDAL(db_session=db_session)
+
+async def get_read_user_dal(db_session: Annotated[AsyncSession, Depends(get_read_db)]) -> UserDAL:
+    return UserDAL(db_session=db_session)
+
+async def get_read_analytics_dal(db_session: Annotated[AsyncSession, Depends(get_read_db)]) -> AnalyticsDAL:
+    return AnalyticsDAL(db_session=db_session)
+
+async def get_read_loaders(db_session: Annotated[AsyncSession, Depends(get_read_db)], include_description: bool = False) -> RequestLoaders:
+    return RequestLoaders(db_session=db_session, include_description=include_description)
@@ -13,3 +13,22 @@ class ProductStatusEnum(StrEnum):
     ACTIVE = "ACTIVE"
     OUT_OF_STOCK = "OUT_OF_STOCK"
     DELETED = "DELETED"
+
+
+class OrderEventTypeEnum(StrEnum):
+    CREATED = "CREATED"
+    UPDATED = "UPDATED"
+    STATUS_CHANGED = "STATUS_CHANGED"
+    DELETED = "DELETED"
+
+
+class RollupGranularityEnum(StrEnum):
+    HOUR = "hour"
+    DAY = "day"
+
+
+class JobStatusEnum(StrEnum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    # out of attempts, kept for inspection and manual requeueing
+    DEAD = "DEAD"
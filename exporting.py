@@ -0,0 +1,97 @@
+import io
+from collections import defaultdict
+from typing import AsyncIterator, Callable
+
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.dals.order_dal import OrderDAL
+from enums import OrderStatusEnum
+
+try:
+    import pyarrow as pa
+except ImportError:  # installed with the "export" extra
+    pa = None
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+# one dictionary for every batch, Arrow IPC files can't replace it midway
+ORDER_STATUSES = [status.value for status in OrderStatusEnum]
+
+
+def order_export_schema() -> "pa.Schema":
+    return pa.schema([
+        ("order_id", pa.string()),
+        ("order_date", pa.timestamp("us")),
+        ("order_status", pa.dictionary(pa.int8(), pa.string())),
+        ("quantity", pa.int32()),
+        ("total_price", pa.float64()),
+        ("description", pa.string()),
+        ("user_id", pa.string()),
+        ("user_email", pa.string()),
+        ("user_name", pa.string()),
+        ("user_surname", pa.string()),
+        ("product_id", pa.string()),
+        ("product_name", pa.string()),
+        ("product_price", pa.float64()),
+    ])
+
+
+def rows_to_record_batch(rows: list[Row]) -> "pa.RecordBatch":
+    schema = order_export_schema()
+    columns = {name: [] for name in schema.names}
+    for row in rows:
+        for name, value in row._mapping.items():
+            # UUIDs travel as plain strings
+            if value is not None and name.endswith("_id"):
+                value = str(value)
+            columns[name].append(value)
+    columns["order_status"] = pa.DictionaryArray.from_arrays(
+        pa.array(
+            [ORDER_STATUSES.index(status) for status in columns["order_status"]],
+            pa.int8(),
+        ),
+        pa.array(ORDER_STATUSES),
+    )
+    return pa.RecordBatch.from_pydict(columns, schema=schema)
+
+
+async def iter_order_rows(
+    session_factory: Callable[[], AsyncSession],
+    batch_size: int,
+    changed_between: tuple[tuple[int, int], tuple[int, int]] | None = None,
+) -> AsyncIterator[list[Row]]:
+    """Keyset pages of orders to export, each read with a short-lived session"""
+    after = None
+    while True:
+        async with session_factory() as session:
+            rows = await OrderDAL(session).get_orders_for_export(
+                after, batch_size, changed_between=changed_between
+            )
+        if not rows:
+            return
+        yield rows
+        after = (rows[-1].order_date, rows[-1].order_id)
+
+
+def split_by_day(rows: list[Row]) -> dict[str, list[Row]]:
+    days = defaultdict(list)
+    for row in rows:
+        days[row.order_date.date().isoformat()].append(row)
+    return days
+
+
+async def stream_arrow(batches: AsyncIterator[list[Row]]) -> AsyncIterator[bytes]:
+    """Arrow IPC stream of the row pages, one chunk per record batch"""
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, order_export_schema()) as writer:
+        async for rows in batches:
+            writer.write_batch(rows_to_record_batch(rows))
+            yield _drain(sink)
+    yield _drain(sink)
+
+
+def _drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
@@ -8,6 +8,11 @@ class Hasher:
     def verify_password(plain_password, hashed_password):
         return pwd_context.verify(plain_password, hashed_password)
 
+    @staticmethod
+    def dummy_verify_password() -> None:
+        """Same cost as verify_password, for users that don't exist"""
+        pwd_context.dummy_verify()
+
     @staticmethod
     def get_password_hash(password: str) -> str:
         return pwd_context.hash(password)
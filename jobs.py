@@ -0,0 +1,149 @@
+import asyncio
+import random
+from logging import getLogger
+from typing import Awaitable, Callable
+
+from sqlalchemy.engine import Row
+
+import settings
+from db.dals.job_dal import JobDAL
+from db.session import async_session
+from enums import JobStatusEnum
+from tasks import refresh_order_rollups
+
+logger = getLogger(__name__)
+
+REFRESH_ORDER_ROLLUPS_JOB = "refresh_order_rollups"
+
+
+class RetryJob(Exception):
+    """The job can't run right now and should be attempted again later.
+
+    Unlike other errors it doesn't use up one of the job's attempts.
+    """
+
+
+async def _refresh_order_rollups(payload: dict) -> None:
+    if not await refresh_order_rollups():
+        # the running refresh may have read the events before this job's
+        # order was committed
+        raise RetryJob("Another rollup refresh is running")
+
+
+class JobRunner:
+    """Runs the jobs table's due jobs in the background of one worker.
+
+    Handlers enqueue jobs with JobDAL in their own transaction, so a job
+    exists exactly when the request's changes were committed. Any number
+    of workers run jobs side by side: a job is claimed with SKIP LOCKED
+    and leased to one of them, at most concurrency at a time each. A
+    failed attempt is retried with exponential backoff until the job's
+    max_attempts, then the job is dead-lettered. A job raising RetryJob is
+    postponed instead, without counting the attempt. Jobs are run at least
+    once, a lease that expires before the result is stored means another
+    attempt, so handlers must be safe to repeat.
+    """
+
+    def __init__(
+        self,
+        handlers: dict[str, Callable[[dict], Awaitable]],
+        concurrency: int,
+        poll_interval: float,
+        lease_seconds: float,
+    ):
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._running: set[asyncio.Task] = set()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        # unfinished jobs are run again once their leases expire
+        if self._task is not None:
+            self._task.cancel()
+            for task in self._running:
+                task.cancel()
+            await asyncio.gather(self._task, *self._running, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            free = self.concurrency - len(self._running)
+            if not free:
+                await asyncio.wait(self._running, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            try:
+                async with async_session() as session, session.begin():
+                    jobs = await JobDAL(session).claim(
+                        list(self.handlers), free, self.lease_seconds
+                    )
+            except Exception:
+                logger.exception("Claiming jobs failed")
+                jobs = []
+            for job in jobs:
+                task = asyncio.create_task(self._execute(job))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+            if len(jobs) < free:
+                # the queue is drained for now
+                await asyncio.sleep(self.poll_interval)
+
+    async def _execute(self, job: Row) -> None:
+        try:
+            await self.handlers[job.name](job.payload)
+        except RetryJob as err:
+            logger.info("Job %s %s postponed: %s", job.name, job.job_id, err)
+            result = self._postpone(job)
+        except Exception as err:
+            logger.exception("Job %s %s failed", job.name, job.job_id)
+            result = self._fail(job, err)
+        else:
+            result = self._complete(job)
+        try:
+            await result
+        except Exception:
+            logger.exception(
+                "Storing the result of job %s %s failed, it runs again when its lease expires",
+                job.name,
+                job.job_id,
+            )
+
+    async def _complete(self, job: Row) -> None:
+        async with async_session() as session, session.begin():
+            await JobDAL(session).complete(job.job_id)
+
+    async def _postpone(self, job: Row) -> None:
+        async with async_session() as session, session.begin():
+            await JobDAL(session).postpone(job.job_id, job.attempts, self._retry_delay(1))
+
+    async def _fail(self, job: Row, err: Exception) -> None:
+        async with async_session() as session, session.begin():
+            status = await JobDAL(session).fail(
+                job.job_id, job.attempts, repr(err), self._retry_delay(job.attempts)
+            )
+        if status == JobStatusEnum.DEAD:
+            logger.error(
+                "Job %s %s dead-lettered after %s attempts", job.name, job.job_id, job.attempts
+            )
+
+    @staticmethod
+    def _retry_delay(attempts: int) -> float:
+        delay = min(
+            settings.JOB_MAX_RETRY_BACKOFF,
+            settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1),
+        )
+        # jitter, so jobs that failed together don't retry together
+        return delay * random.uniform(0.5, 1)
+
+
+job_runner = JobRunner(
+    handlers={REFRESH_ORDER_ROLLUPS_JOB: _refresh_order_rollups},
+    concurrency=settings.JOB_CONCURRENCY,
+    poll_interval=settings.JOB_POLL_INTERVAL,
+    lease_seconds=settings.JOB_LEASE_SECONDS,
+)
@@ -1,32 +1,134 @@
-import uvicorn
+import asyncio
+import time
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.routing import APIRouter
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 
+import settings
+from admission import AdmissionMiddleware, admission_controller, database_busy
+from compression import CompressionMiddleware, available_encoders
 from api.routers.user import user_router
 from api.routers.order import order_router
 from api.routers.login import login_router
 from api.routers.product import product_router
+from api.routers.analytics import analytics_router
+from db.notifications import order_listener
+from db.session import PRIMARY_UNTIL_COOKIE, dispose_engines
+from jobs import job_runner
+from tasks import (
+    expire_stale_pending_orders,
+    purge_dead_jobs,
+    purge_expired_idempotency_keys,
+    purge_expired_refresh_tokens,
+    purge_expired_revoked_tokens,
+    refresh_order_rollups,
+    run_periodically,
+)
 
 # BLOCK WITH API ROUTES #
 
-# create instance of the app
-app = FastAPI(title="nnp-university")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # start background maintenance and stop it together with the app
+    order_listener.start()
+    job_runner.start()
+    background_tasks = [
+        asyncio.create_task(
+            run_periodically(
+                purge_expired_idempotency_keys, settings.IDEMPOTENCY_PURGE_INTERVAL
+            )
+        ),
+        asyncio.create_task(
+            run_periodically(
+                purge_expired_refresh_tokens, settings.REFRESH_TOKEN_PURGE_INTERVAL
+            )
+        ),
+        asyncio.create_task(
+            run_periodically(
+                purge_expired_revoked_tokens, settings.REVOKED_TOKEN_PURGE_INTERVAL
+            )
+        ),
+        asyncio.create_task(
+            run_periodically(
+                refresh_order_rollups, settings.ORDER_ROLLUP_REFRESH_INTERVAL
+            )
+        ),
+        asyncio.create_task(
+            run_periodically(
+                expire_stale_pending_orders, settings.PENDING_ORDER_SWEEP_INTERVAL
+            )
+        ),
+        asyncio.create_task(
+            run_periodically(purge_dead_jobs, settings.JOB_PURGE_INTERVAL)
+        ),
+    ]
+    yield
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await job_runner.stop()
+    await order_listener.stop()
+    await dispose_engines()
 
-# create the instance for the routes
-main_api_router = APIRouter()
 
-# set routes to the app instance
-main_api_router.include_router(user_router, prefix="/user", tags=["user"])
+async def stick_to_primary_after_write(request: Request, call_next):
+    """Send the client's reads to the primary for a while after it wrote"""
+    response = await call_next(request)
+    if (
+        settings.REPLICA_DATABASE_URLS
+        and request.method not in ("GET", "HEAD", "OPTIONS")
+        and response.status_code < 400
+    ):
+        response.set_cookie(
+            PRIMARY_UNTIL_COOKIE,
+            str(int(time.time()) + settings.READ_AFTER_WRITE_WINDOW),
+            max_age=settings.READ_AFTER_WRITE_WINDOW,
+            httponly=True,
+        )
+    return response
 
-main_api_router.include_router(order_router, prefix="/order", tags=["order"])
 
-main_api_router.include_router(login_router, prefix="/login", tags=["login"])
+def create_app() -> FastAPI:
+    """Build the application, nothing here touches the database"""
+    # create instance of the app
+    app = FastAPI(title="nnp-university", lifespan=lifespan)
 
-main_api_router.include_router(product_router, prefix="/product", tags=["product"])
+    # create the instance for the routes
+    main_api_router = APIRouter()
 
-app.include_router(main_api_router)
+    # set routes to the app instance
+    main_api_router.include_router(user_router, prefix="/user", tags=["user"])
+
+    main_api_router.include_router(order_router, prefix="/order", tags=["order"])
+
+    main_api_router.include_router(login_router, prefix="/login", tags=["login"])
+
+    main_api_router.include_router(product_router, prefix="/product", tags=["product"])
+
+    main_api_router.include_router(
+        analytics_router, prefix="/analytics", tags=["analytics"]
+    )
+
+    app.include_router(main_api_router)
+    # innermost, an http middleware would hand it every body as a stream
+    app.add_middleware(
+        CompressionMiddleware,
+        encoders=available_encoders(),
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+    )
+    app.middleware("http")(stick_to_primary_after_write)
+    # outermost, so rejected requests cost as little as possible
+    app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+    app.add_exception_handler(PoolTimeoutError, database_busy)
+    return app
+
+
+app = create_app()
 
 if __name__ == "__main__":
+    import uvicorn
+
     # run app on the host and port
     uvicorn.run(app, host="localhost", port=8000)
@@ -0,0 +1,98 @@
+import asyncio
+import hashlib
+import math
+import time
+
+import settings
+from db.dals.revoked_token_dal import RevokedTokenDAL
+
+
+class BloomFilter:
+    """Fixed size Bloom filter of strings, sized for capacity and error rate"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # double hashing: k positions out of one 128-bit digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+
+class RevocationList:
+    """In-process mirror of the revoked_tokens table.
+
+    Lookups hit a Bloom filter, so almost every token is cleared without
+    a query; only filter positives are confirmed in the database. The
+    filter is caught up with the rows added since its cursor at most once
+    per refresh_interval, and rebuilt from scratch once it holds more
+    rows than it was sized for, dropping the rows purged since. A rebuilt
+    filter is sized for twice the rows left, so a table that outgrew
+    capacity isn't reloaded on every refresh.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, refresh_interval: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self._filter = BloomFilter(capacity, error_rate)
+        # rows loaded from the table, the jtis added by this worker are
+        # loaded again by a later refresh and only counted then
+        self._loaded = 0
+        self._cursor = (0, 0)
+        self._refreshed_at = -math.inf
+        self._lock = asyncio.Lock()
+
+    async def is_revoked(self, jti: str, revoked_token_dal: RevokedTokenDAL) -> bool:
+        if time.monotonic() - self._refreshed_at >= self.refresh_interval:
+            await self._refresh(revoked_token_dal)
+        if jti not in self._filter:
+            return False
+        return await revoked_token_dal.is_revoked(jti)
+
+    def add(self, jti: str) -> None:
+        """Make a revocation done by this worker visible here right away"""
+        self._filter.add(jti)
+
+    async def _refresh(self, revoked_token_dal: RevokedTokenDAL) -> None:
+        async with self._lock:
+            # another request may have refreshed while we waited for the lock
+            if time.monotonic() - self._refreshed_at < self.refresh_interval:
+                return
+            if self._loaded >= self._filter.capacity:
+                rows = await revoked_token_dal.get_revoked_since(0, 0)
+                self._filter = BloomFilter(
+                    max(self.capacity, 2 * len(rows)), self.error_rate
+                )
+                self._loaded = 0
+            else:
+                rows = await revoked_token_dal.get_revoked_since(*self._cursor)
+            for tx_id, seq, jti in rows:
+                self._filter.add(jti)
+                self._cursor = (tx_id, seq)
+            self._loaded += len(rows)
+            self._refreshed_at = time.monotonic()
+
+
+revocation_list = RevocationList(
+    capacity=settings.REVOCATION_FILTER_CAPACITY,
+    error_rate=settings.REVOCATION_FILTER_ERROR_RATE,
+    refresh_interval=settings.REVOCATION_REFRESH_INTERVAL,
+)
@@ -1,12 +1,95 @@
+import functools
+import hashlib
+import secrets
 from datetime import datetime
 from datetime import timedelta
-from typing import Optional
+from pathlib import Path
+from typing import NamedTuple, Optional
+from uuid import uuid4
 
-from jose import jwt
+from jose import jwk, jwt, JWTError
+from jose.backends.base import Key
 
 import settings
 
 
+class SigningKey(NamedTuple):
+    algorithm: str
+    # None for public keys kept only to verify tokens of a retired key
+    private_key: Key | None
+    public_key: Key
+
+
+class KeyRing:
+    """JWT keys by kid, each parsed once and reused for every token"""
+
+    def __init__(self, active_kid: str, keys: dict[str, SigningKey]):
+        active_key = keys.get(active_kid)
+        if active_key is None or active_key.private_key is None:
+            raise ValueError(f"No private key for the active JWT key id {active_kid!r}")
+        self.active_kid = active_kid
+        self.keys = keys
+
+    def encode(self, claims: dict) -> str:
+        key = self.keys[self.active_kid]
+        return jwt.encode(
+            claims,
+            key.private_key,
+            algorithm=key.algorithm,
+            headers={"kid": self.active_kid},
+        )
+
+    def decode(self, token: str) -> dict:
+        kid = jwt.get_unverified_header(token).get("kid")
+        if kid not in self.keys:
+            raise JWTError("Unknown JWT key id")
+        key = self.keys[kid]
+        return jwt.decode(token, key.public_key, algorithms=[key.algorithm])
+
+
+def _algorithm_for(key) -> str:
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+    if isinstance(key, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+        return "RS256"
+    if isinstance(key, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)):
+        curves = {"secp256r1": "ES256", "secp384r1": "ES384", "secp521r1": "ES512"}
+        if key.curve.name in curves:
+            return curves[key.curve.name]
+    # python-jose has no EdDSA support, Ed25519 keys end up here too
+    raise ValueError(f"Unsupported JWT key type {type(key).__name__}")
+
+
+def _load_pem_key(pem: bytes) -> SigningKey:
+    from cryptography.hazmat.primitives.serialization import (
+        load_pem_private_key,
+        load_pem_public_key,
+    )
+
+    if b"PRIVATE KEY" in pem:
+        algorithm = _algorithm_for(load_pem_private_key(pem, password=None))
+        private_key = jwk.construct(pem, algorithm)
+        return SigningKey(algorithm, private_key, private_key.public_key())
+    algorithm = _algorithm_for(load_pem_public_key(pem))
+    return SigningKey(algorithm, None, jwk.construct(pem, algorithm))
+
+
+@functools.cache
+def get_key_ring() -> KeyRing:
+    """Key ring from JWT_KEY_DIR (<kid>.pem files), or SECRET_KEY without it"""
+    if settings.JWT_KEY_DIR is None:
+        key = jwk.construct(settings.SECRET_KEY, settings.ALGORITHM)
+        return KeyRing(
+            settings.JWT_ACTIVE_KID,
+            {settings.JWT_ACTIVE_KID: SigningKey(settings.ALGORITHM, key, key)},
+        )
+    keys = {
+        path.stem: _load_pem_key(path.read_bytes())
+        for path in sorted(Path(settings.JWT_KEY_DIR).glob("*.pem"))
+    }
+    return KeyRing(settings.JWT_ACTIVE_KID, keys)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -15,8 +98,23 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + timedelta(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(
-        to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM
-    )
-    return encoded_jwt
\ No newline at end of file
+    # jti lets a single token be revoked before it expires
+    to_encode.update({"exp": expire, "jti": uuid4().hex})
+    encoded_jwt = get_key_ring().encode(to_encode)
+    return encoded_jwt
+
+
+def decode_access_token(token: str) -> dict:
+    """Verify a token against the key named by its kid, raises JWTError"""
+    return get_key_ring().decode(token)
+
+
+def create_refresh_token() -> tuple[str, str]:
+    """Return a new opaque refresh token and the hash to store for it"""
+    token = secrets.token_urlsafe(32)
+    return token, hash_refresh_token(token)
+
+
+def hash_refresh_token(token: str) -> str:
+    # tokens are random, a fast hash is enough to not store them in clear
+    return hashlib.sha256(token.encode()).hexdigest()
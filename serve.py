@@ -0,0 +1,48 @@
+"""Serve the app with several worker processes sharing one listening socket.
+
+    python serve.py --workers 4 --port 8000
+
+The event loop and HTTP parser are uvloop and httptools when the "serve"
+extra is installed. Each worker sizes its database pool from
+DB_CONNECTION_BUDGET divided by the number of workers, so together they
+never open more connections than the budget. Signals to the parent:
+
+    SIGHUP   replace the workers one after the other, e.g. after a deploy;
+             connections arriving meanwhile wait in the socket's backlog
+    SIGTERM  stop, letting every worker finish its in-flight requests
+             for up to GRACEFUL_SHUTDOWN_TIMEOUT seconds
+
+Workers added with SIGTTIN keep the pool size computed at startup and can
+exceed the budget.
+"""
+import argparse
+import os
+
+import uvicorn
+
+import settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=settings.WEB_CONCURRENCY)
+    args = parser.parse_args()
+    # workers are fresh interpreters reading settings again, give them the
+    # actual count so their pools add up to DB_CONNECTION_BUDGET
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        # "auto" picks uvloop and httptools when installed
+        loop="auto",
+        http="auto",
+        timeout_graceful_shutdown=settings.GRACEFUL_SHUTDOWN_TIMEOUT,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,164 @@ load_dotenv()
 REAL_DATABASE_URL = os.getenv("REAL_DATABASE_URL")
 TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
 
+# Worker processes started by serve.py, one per core by default
+WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+# Connections all the workers together may open to each database server.
+# Every worker keeps one for LISTEN (db/notifications.py), the rest is its pool.
+DB_CONNECTION_BUDGET: int = int(os.getenv("DB_CONNECTION_BUDGET", 100))
+DB_POOL_SIZE: int = max(1, DB_CONNECTION_BUDGET // WEB_CONCURRENCY - 1)
+# seconds a request waits for a pooled connection before a 503
+DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", 5))
+# Admission control (admission.py): requests in flight per worker, the rest
+# queue by priority for at most their queue timeout, then get a 503
+ADMISSION_MAX_CONCURRENCY: int = int(
+    os.getenv("ADMISSION_MAX_CONCURRENCY", DB_POOL_SIZE)
+)
+ADMISSION_MAX_QUEUE: int = int(os.getenv("ADMISSION_MAX_QUEUE", 200))
+ADMISSION_QUEUE_TIMEOUT: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 2))
+# order placement is admitted first and may wait longer
+ADMISSION_ORDER_QUEUE_TIMEOUT: float = float(
+    os.getenv("ADMISSION_ORDER_QUEUE_TIMEOUT", 5)
+)
+# list and export endpoints are admitted last and shed first
+ADMISSION_LIST_QUEUE_TIMEOUT: float = float(
+    os.getenv("ADMISSION_LIST_QUEUE_TIMEOUT", 0.5)
+)
+ADMISSION_LIST_CONCURRENCY: int = int(
+    os.getenv("ADMISSION_LIST_CONCURRENCY", max(1, ADMISSION_MAX_CONCURRENCY // 2))
+)
+ADMISSION_EXPORT_CONCURRENCY: int = int(os.getenv("ADMISSION_EXPORT_CONCURRENCY", 2))
+ADMISSION_RETRY_AFTER: int = int(os.getenv("ADMISSION_RETRY_AFTER", 1))
+# seconds a stopping worker lets in-flight requests finish
+GRACEFUL_SHUTDOWN_TIMEOUT: int = int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", 30))
+
 SECRET_KEY: str = os.getenv("SECRET_KEY")
 ALGORITHM: str = os.getenv("ALGORITHM")
-ACCESS_TOKEN_EXPIRE_MINUTES: int = os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")
\ No newline at end of file
+# Directory of <kid>.pem RSA/EC keys for asymmetric JWTs, SECRET_KEY is used
+# when unset. Public-only files keep tokens of retired keys verifiable.
+JWT_KEY_DIR: str | None = os.getenv("JWT_KEY_DIR")
+JWT_ACTIVE_KID: str = os.getenv("JWT_ACTIVE_KID", "default")
+ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 15))
+# access tokens are renewed with a refresh token instead of the password
+REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 30))
+REFRESH_TOKEN_PURGE_INTERVAL: int = int(os.getenv("REFRESH_TOKEN_PURGE_INTERVAL", 3600))
+
+# HTTP caching policies for the catalog endpoints
+PRODUCT_CACHE_CONTROL: str = os.getenv("PRODUCT_CACHE_CONTROL", "public, max-age=30")
+PRODUCT_LIST_CACHE_CONTROL: str = os.getenv(
+    "PRODUCT_LIST_CACHE_CONTROL", "public, max-age=10"
+)
+
+# Response compression (compression.py), in order of preference. zstd and
+# br are used only when the "compression" extra is installed.
+COMPRESSION_ENCODINGS: list[str] = [
+    encoding.strip()
+    for encoding in os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",")
+    if encoding.strip()
+]
+# bodies smaller than this are sent as they are, streams are always compressed
+COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSION_GZIP_LEVEL: int = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+COMPRESSION_ZSTD_LEVEL: int = int(os.getenv("COMPRESSION_ZSTD_LEVEL", 3))
+COMPRESSION_BROTLI_LEVEL: int = int(os.getenv("COMPRESSION_BROTLI_LEVEL", 4))
+# event streams are left out, every event has to reach the client as it is sent
+COMPRESSIBLE_CONTENT_TYPES: list[str] = [
+    content_type.strip()
+    for content_type in os.getenv(
+        "COMPRESSIBLE_CONTENT_TYPES",
+        "application/json,text/plain,text/html,text/csv,"
+        "application/vnd.apache.arrow.stream",
+    ).split(",")
+    if content_type.strip()
+]
+
+# Optional comma separated list of read replicas for GET endpoints
+REPLICA_DATABASE_URLS: list[str] = [
+    url.strip() for url in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if url.strip()
+]
+REPLICA_HEALTH_CHECK_INTERVAL: float = float(
+    os.getenv("REPLICA_HEALTH_CHECK_INTERVAL", 5)
+)
+REPLICA_HEALTH_CHECK_TIMEOUT: float = float(os.getenv("REPLICA_HEALTH_CHECK_TIMEOUT", 1))
+# Seconds during which a client that wrote something keeps reading from the primary
+READ_AFTER_WRITE_WINDOW: int = int(os.getenv("READ_AFTER_WRITE_WINDOW", 5))
+
+# Idempotency-Key handling for order creation
+IDEMPOTENCY_KEY_TTL_SECONDS: int = int(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", 86400))
+# claims older than this without a stored response are considered abandoned
+IDEMPOTENCY_LOCK_TIMEOUT: int = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", 60))
+IDEMPOTENCY_WAIT_TIMEOUT: float = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", 10))
+IDEMPOTENCY_POLL_INTERVAL: float = float(os.getenv("IDEMPOTENCY_POLL_INTERVAL", 0.2))
+IDEMPOTENCY_PURGE_INTERVAL: int = int(os.getenv("IDEMPOTENCY_PURGE_INTERVAL", 3600))
+
+# Upper bound for sub-counters of a hot product's stock
+MAX_STOCK_SHARDS: int = int(os.getenv("MAX_STOCK_SHARDS", 64))
+# Products one PATCH /product/batch may update
+PRODUCT_BATCH_MAX_SIZE: int = int(os.getenv("PRODUCT_BATCH_MAX_SIZE", 50000))
+
+# Order change feed
+ORDER_CHANGES_PAGE_SIZE: int = int(os.getenv("ORDER_CHANGES_PAGE_SIZE", 500))
+ORDER_CHANGES_POLL_INTERVAL: float = float(os.getenv("ORDER_CHANGES_POLL_INTERVAL", 1))
+SSE_HEARTBEAT_INTERVAL: float = float(os.getenv("SSE_HEARTBEAT_INTERVAL", 15))
+
+# Live order status streams (LISTEN/NOTIFY)
+ORDER_NOTIFY_RECONNECT_INTERVAL: float = float(
+    os.getenv("ORDER_NOTIFY_RECONNECT_INTERVAL", 2)
+)
+ORDER_WATCH_QUEUE_SIZE: int = int(os.getenv("ORDER_WATCH_QUEUE_SIZE", 16))
+
+# Access token revocation list, mirrored in a Bloom filter per worker
+REVOCATION_FILTER_CAPACITY: int = int(os.getenv("REVOCATION_FILTER_CAPACITY", 100000))
+REVOCATION_FILTER_ERROR_RATE: float = float(
+    os.getenv("REVOCATION_FILTER_ERROR_RATE", 0.001)
+)
+# seconds a revocation made by another worker may take to be seen here
+REVOCATION_REFRESH_INTERVAL: float = float(os.getenv("REVOCATION_REFRESH_INTERVAL", 1))
+REVOKED_TOKEN_PURGE_INTERVAL: int = int(os.getenv("REVOKED_TOKEN_PURGE_INTERVAL", 3600))
+
+# Login throttling, checked before any database or password hash work. The
+# email limit is per email and client IP, the looser account limit is per
+# email across all IPs
+LOGIN_IP_ATTEMPTS_PER_MINUTE: float = float(os.getenv("LOGIN_IP_ATTEMPTS_PER_MINUTE", 10))
+LOGIN_IP_BURST: int = int(os.getenv("LOGIN_IP_BURST", 20))
+LOGIN_EMAIL_ATTEMPTS_PER_MINUTE: float = float(
+    os.getenv("LOGIN_EMAIL_ATTEMPTS_PER_MINUTE", 2)
+)
+LOGIN_EMAIL_BURST: int = int(os.getenv("LOGIN_EMAIL_BURST", 5))
+LOGIN_ACCOUNT_ATTEMPTS_PER_MINUTE: float = float(
+    os.getenv("LOGIN_ACCOUNT_ATTEMPTS_PER_MINUTE", 20)
+)
+LOGIN_ACCOUNT_BURST: int = int(os.getenv("LOGIN_ACCOUNT_BURST", 50))
+LOGIN_THROTTLE_MAX_KEYS: int = int(os.getenv("LOGIN_THROTTLE_MAX_KEYS", 100000))
+# take the client IP from the last X-Forwarded-For entry, only behind a
+# single proxy that appends it
+TRUST_FORWARDED_FOR: bool = os.getenv("TRUST_FORWARDED_FOR", "false").lower() == "true"
+
+# Sales rollups maintained from the order change feed
+ORDER_ROLLUP_REFRESH_INTERVAL: int = int(os.getenv("ORDER_ROLLUP_REFRESH_INTERVAL", 60))
+ORDER_ROLLUP_BATCH_SIZE: int = int(os.getenv("ORDER_ROLLUP_BATCH_SIZE", 5000))
+
+# Background jobs (jobs.py): jobs each worker process runs at once
+JOB_CONCURRENCY: int = int(os.getenv("JOB_CONCURRENCY", 4))
+# seconds an idle runner waits before looking for due jobs again
+JOB_POLL_INTERVAL: float = float(os.getenv("JOB_POLL_INTERVAL", 1))
+# a job running longer than this is taken to be lost and run again elsewhere
+JOB_LEASE_SECONDS: int = int(os.getenv("JOB_LEASE_SECONDS", 300))
+JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+# the retry delay doubles with every failed attempt, up to the maximum
+JOB_RETRY_BACKOFF: float = float(os.getenv("JOB_RETRY_BACKOFF", 2))
+JOB_MAX_RETRY_BACKOFF: float = float(os.getenv("JOB_MAX_RETRY_BACKOFF", 600))
+# dead-lettered jobs are kept this long after being queued for inspection
+JOB_DEAD_RETENTION_SECONDS: int = int(os.getenv("JOB_DEAD_RETENTION_SECONDS", 604800))
+JOB_PURGE_INTERVAL: int = int(os.getenv("JOB_PURGE_INTERVAL", 3600))
+
+# PENDING orders older than this are canceled and their stock released
+PENDING_ORDER_TTL_SECONDS: int = int(os.getenv("PENDING_ORDER_TTL_SECONDS", 86400))
+PENDING_ORDER_SWEEP_INTERVAL: int = int(os.getenv("PENDING_ORDER_SWEEP_INTERVAL", 300))
+# orders canceled per transaction, bounds how long the sweep holds row locks
+PENDING_ORDER_SWEEP_BATCH_SIZE: int = int(
+    os.getenv("PENDING_ORDER_SWEEP_BATCH_SIZE", 500)
+)
+
+# rows per Arrow record batch of GET /order/export
+ORDER_EXPORT_BATCH_SIZE: int = int(os.getenv("ORDER_EXPORT_BATCH_SIZE", 10000))
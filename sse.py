@@ -0,0 +1,14 @@
+def format_sse(data: str, event: str | None = None, event_id: str | None = None) -> str:
+    """Serialize one Server-Sent Events message"""
+    message = ""
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    if event is not None:
+        message += f"event: {event}\n"
+    for line in data.splitlines() or [""]:
+        message += f"data: {line}\n"
+    return message + "\n"
+
+
+# comment line keeping idle connections open through proxies
+SSE_HEARTBEAT = ": ping\n\n"
@@ -0,0 +1,87 @@
+import asyncio
+from datetime import datetime, timedelta
+from logging import getLogger
+from typing import Awaitable, Callable
+
+import settings
+from db.dals.analytics_dal import AnalyticsDAL
+from db.dals.idempotency_dal import IdempotencyDAL
+from db.dals.job_dal import JobDAL
+from db.dals.order_dal import OrderDAL
+from db.dals.refresh_token_dal import RefreshTokenDAL
+from db.dals.revoked_token_dal import RevokedTokenDAL
+from db.session import async_session
+
+logger = getLogger(__name__)
+
+
+async def run_periodically(func: Callable[[], Awaitable], interval: float) -> None:
+    """Run func every interval seconds until cancelled, logging failures"""
+    while True:
+        try:
+            await func()
+        except Exception:
+            logger.exception("Periodic task %s failed", func.__name__)
+        await asyncio.sleep(interval)
+
+
+async def purge_expired_idempotency_keys() -> None:
+    async with async_session() as session, session.begin():
+        deleted = await IdempotencyDAL(session).delete_expired(
+            settings.IDEMPOTENCY_KEY_TTL_SECONDS
+        )
+    if deleted:
+        logger.info("Purged %s expired idempotency keys", deleted)
+
+
+async def purge_expired_refresh_tokens() -> None:
+    async with async_session() as session, session.begin():
+        deleted = await RefreshTokenDAL(session).delete_expired()
+    if deleted:
+        logger.info("Purged %s expired refresh tokens", deleted)
+
+
+async def purge_expired_revoked_tokens() -> None:
+    async with async_session() as session, session.begin():
+        deleted = await RevokedTokenDAL(session).delete_expired()
+    if deleted:
+        logger.info("Purged %s expired revoked tokens", deleted)
+
+
+async def purge_dead_jobs() -> None:
+    async with async_session() as session, session.begin():
+        deleted = await JobDAL(session).delete_dead(settings.JOB_DEAD_RETENTION_SECONDS)
+    if deleted:
+        logger.info("Purged %s dead-lettered jobs", deleted)
+
+
+async def refresh_order_rollups() -> bool:
+    """Catch up in batches, False when another refresh was already running"""
+    while True:
+        # each batch is committed with its watermark
+        async with async_session() as session, session.begin():
+            applied = await AnalyticsDAL(session).refresh_rollups(
+                settings.ORDER_ROLLUP_BATCH_SIZE
+            )
+        if applied is None:
+            return False
+        if applied < settings.ORDER_ROLLUP_BATCH_SIZE:
+            return True
+
+
+async def expire_stale_pending_orders() -> None:
+    placed_before = datetime.utcnow() - timedelta(
+        seconds=settings.PENDING_ORDER_TTL_SECONDS
+    )
+    expired = 0
+    while True:
+        # one short transaction per chunk, the locks don't pile up
+        async with async_session() as session, session.begin():
+            canceled = await OrderDAL(session).expire_pending_orders(
+                placed_before, settings.PENDING_ORDER_SWEEP_BATCH_SIZE
+            )
+        expired += canceled
+        if canceled < settings.PENDING_ORDER_SWEEP_BATCH_SIZE:
+            break
+    if expired:
+        logger.info("Canceled %s stale pending orders", expired)
@@ -9,7 +9,7 @@ from sqlalchemy.orm import sessionmaker
 from starlette.testclient import TestClient
 
 import settings
-from db.session import get_db
+from db.session import get_db, get_own_db, get_read_db
 from main import app
 from typing import Generator, Any
 
@@ -22,6 +22,7 @@ test_async_session = sessionmaker(test_engine, expire_on_commit=False, class_=As
 
 CLEAN_TABLES = [
     "users",
+    "idempotency_keys",
 ]
 
 
@@ -62,10 +63,18 @@ async def _get_test_db():
 
         # create session for the interaction with database
         test_async_session = sessionmaker(test_engine, expire_on_commit=False, class_=AsyncSession)
-        yield test_async_session()
+        # one transaction per request, like db.session.get_db
+        async with test_async_session() as session, session.begin():
+            yield session
     finally:
         pass
 
+async def _get_own_test_db():
+    # apart from the request's transaction, like db.session.get_own_db
+    async with test_async_session() as session:
+        yield session
+
+
 @pytest.fixture(scope="function")
 async def client() -> Generator[TestClient, Any, None]: # type: ignore
     """
@@ -74,6 +83,8 @@ async def client() -> Generator[TestClient, Any, None]: # type: ignore
     """
 
     app.dependency_overrides[get_db] = _get_test_db
+    app.dependency_overrides[get_read_db] = _get_test_db
+    app.dependency_overrides[get_own_db] = _get_own_test_db
     with TestClient(app) as client:
         yield client
 
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRule, Overloaded
+
+URGENT = AdmissionRule(priority=0, max_concurrency=None, queue_timeout=1)
+BULK = AdmissionRule(priority=2, max_concurrency=None, queue_timeout=1)
+
+
+async def test_freed_slot_goes_to_highest_priority():
+    controller = AdmissionController(max_concurrency=1, max_queue=10)
+    await controller.acquire("list", BULK)
+    admitted = []
+
+    async def request(route, rule):
+        await controller.acquire(route, rule)
+        admitted.append(route)
+        controller.release(route)
+
+    waiting = [
+        asyncio.create_task(request("list", BULK)),
+        asyncio.create_task(request("order", URGENT)),
+    ]
+    await asyncio.sleep(0)
+    controller.release("list")
+    await asyncio.gather(*waiting)
+    assert admitted == ["order", "list"]
+
+
+async def test_rejects_after_queue_timeout():
+    controller = AdmissionController(max_concurrency=1, max_queue=10)
+    await controller.acquire("order", URGENT)
+    with pytest.raises(Overloaded):
+        await controller.acquire("list", BULK._replace(queue_timeout=0.01))
+    controller.release("order")
+    await controller.acquire("list", BULK)
+
+
+async def test_route_limit_and_full_queue():
+    controller = AdmissionController(max_concurrency=5, max_queue=1)
+    export = AdmissionRule(priority=2, max_concurrency=1, queue_timeout=0.01)
+    await controller.acquire("export", export)
+    await controller.acquire("order", URGENT)
+    waiting = asyncio.create_task(controller.acquire("export", export))
+    await asyncio.sleep(0)
+    with pytest.raises(Overloaded):
+        await controller.acquire("export", export._replace(queue_timeout=1))
+    with pytest.raises(Overloaded):
+        await waiting
@@ -0,0 +1,97 @@
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import settings
+from db.dals.analytics_dal import AnalyticsDAL
+
+
+async def _refresh_rollups():
+    engine = create_async_engine(settings.TEST_DATABASE_URL)
+    session_factory = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    applied = None
+    while applied != 0:
+        async with session_factory() as session, session.begin():
+            applied = await AnalyticsDAL(session).refresh_rollups(batch_size=1000)
+        assert applied is not None
+    await engine.dispose()
+
+
+async def test_get_revenue_empty_range(client):
+    resp = client.get(
+        "/analytics/revenue",
+        params={"start": "2000-01-01", "end": "2000-01-02", "granularity": "hour"},
+    )
+    assert resp.status_code == 200
+    assert resp.json() == {"granularity": "hour", "buckets": []}
+
+
+async def test_get_top_products_rejects_inverted_range(client):
+    resp = client.get(
+        "/analytics/products/top", params={"start": "2000-01-02", "end": "2000-01-01"}
+    )
+    assert resp.status_code == 422
+
+
+async def test_rollups_follow_order_changes(client):
+    user = client.post("/user/", data=json.dumps({
+      "name": "Nikolai",
+      "surname": "Sviridov",
+      "email": "rollups@kek.com",
+      "password": "SamplePass1!",
+    })).json()
+    laptop, mouse = [
+        client.post("/product/", data=json.dumps({
+          "name": name,
+          "price": price,
+          "stock_quantity": 100,
+        })).json()
+        for name, price in (("Laptop", 10.0), ("Mouse", 5.0))
+    ]
+    orders = [
+        client.post("/order/", data=json.dumps({
+          "user_id": user["user_id"],
+          "product_id": product["product_id"],
+          "quantity": quantity,
+        })).json()
+        for product, quantity in ((laptop, 2), (laptop, 1), (mouse, 3))
+    ]
+    await _refresh_rollups()
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    day = {"start": today.isoformat(), "end": (today + timedelta(days=1)).isoformat()}
+
+    resp = client.get(
+        "/analytics/revenue",
+        params={**day, "granularity": "day", "product_id": laptop["product_id"]},
+    )
+    assert resp.status_code == 200
+    assert [
+        (bucket["orders"], bucket["units"], bucket["revenue"])
+        for bucket in resp.json()["buckets"]
+    ] == [(2, 3, 30.0)]
+    resp = client.get("/analytics/products/top", params={**day, "limit": 100})
+    top = {product["product_id"]: product for product in resp.json()}
+    assert (top[laptop["product_id"]]["units"], top[laptop["product_id"]]["revenue"]) == (3, 30.0)
+    assert (top[mouse["product_id"]]["units"], top[mouse["product_id"]]["revenue"]) == (3, 15.0)
+
+    # changed orders are recomputed, not counted a second time
+    client.patch(
+      f"/order/{orders[0]['order_id']}",
+      data=json.dumps({"quantity": 4, "total_price": 40.0, "order_status": None}),
+    )
+    client.delete(f"/order/{orders[2]['order_id']}")
+    await _refresh_rollups()
+    resp = client.get(
+        "/analytics/revenue",
+        params={**day, "granularity": "hour", "product_id": laptop["product_id"]},
+    )
+    buckets = resp.json()["buckets"]
+    assert sum(bucket["orders"] for bucket in buckets) == 2
+    assert sum(bucket["units"] for bucket in buckets) == 5
+    assert sum(bucket["revenue"] for bucket in buckets) == 50.0
+    resp = client.get("/analytics/products/top", params={**day, "limit": 100})
+    top = {product["product_id"]: product for product in resp.json()}
+    assert top[laptop["product_id"]]["revenue"] == 50.0
+    assert mouse["product_id"] not in top
@@ -0,0 +1,84 @@
+import gzip
+import zlib
+
+from compression import CompressionMiddleware, GzipEncoder, negotiate_encoding
+
+ENCODERS = {"gzip": lambda: GzipEncoder(6)}
+
+
+def test_negotiate_encoding_by_quality_then_preference():
+    encodings = ["zstd", "br", "gzip"]
+    assert negotiate_encoding("gzip, br", encodings) == "br"
+    assert negotiate_encoding("br;q=0.5, gzip", encodings) == "gzip"
+    assert negotiate_encoding("*;q=0.1, gzip;q=0", encodings) == "zstd"
+    assert negotiate_encoding("identity", encodings) is None
+    assert negotiate_encoding("", encodings) is None
+
+
+async def _respond(messages, accept_encoding="gzip"):
+    async def app(scope, receive, send):
+        for message in messages:
+            await send(message)
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    middleware = CompressionMiddleware(app, ENCODERS, minimum_size=100)
+    scope = {"type": "http", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    await middleware(scope, None, send)
+    return dict(sent[0]["headers"]), [message["body"] for message in sent[1:]]
+
+
+def _start(content_type: bytes, length: int | None = None):
+    headers = [(b"content-type", content_type), (b"etag", b'"v1"')]
+    if length is not None:
+        headers.append((b"content-length", str(length).encode()))
+    return {"type": "http.response.start", "status": 200, "headers": headers}
+
+
+async def test_compresses_large_json_body():
+    body = b'{"items": [' + b'"item", ' * 100 + b'"item"]}'
+    headers, bodies = await _respond([
+        _start(b"application/json", len(body)),
+        {"type": "http.response.body", "body": body},
+    ])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert headers[b"vary"] == b"Accept-Encoding"
+    assert headers[b"etag"] == b'W/"v1"'
+    assert int(headers[b"content-length"]) == len(bodies[0])
+    assert gzip.decompress(bodies[0]) == body
+
+
+async def test_small_and_event_stream_bodies_are_sent_as_they_are():
+    headers, bodies = await _respond([
+        _start(b"application/json", 2),
+        {"type": "http.response.body", "body": b"{}"},
+    ])
+    assert b"content-encoding" not in headers
+    assert bodies == [b"{}"]
+    event = b"data: " + b"x" * 200 + b"\n\n"
+    headers, bodies = await _respond([
+        _start(b"text/event-stream"),
+        {"type": "http.response.body", "body": event, "more_body": True},
+        {"type": "http.response.body", "body": b""},
+    ])
+    assert b"content-encoding" not in headers
+    assert bodies == [event, b""]
+
+
+async def test_streams_are_compressed_chunk_by_chunk():
+    chunks = [b"a,b\n" * 10, b"c,d\n" * 10]
+    headers, bodies = await _respond([
+        _start(b"text/csv"),
+        {"type": "http.response.body", "body": chunks[0], "more_body": True},
+        {"type": "http.response.body", "body": chunks[1], "more_body": True},
+        {"type": "http.response.body", "body": b""},
+    ])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    # every flushed chunk decodes on its own, before the stream ends
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    assert decompressor.decompress(bodies[0]) == chunks[0]
+    assert decompressor.decompress(bodies[1] + bodies[2]) == chunks[1]
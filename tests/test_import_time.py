@@ -0,0 +1,62 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# cumulative import time of main, measured with python -X importtime
+IMPORT_TIME_BUDGET_US = 2_000_000
+# imported on first use only, never while the app starts
+LAZY_MODULES = ["numpy", "pyarrow", "uvicorn"]
+
+
+def _import_profile() -> dict[str, int]:
+    """Cumulative import time in microseconds of every module main imports"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        profile[name.strip()] = int(cumulative)
+    return profile
+
+
+def test_main_import_time_within_budget():
+    profile = _import_profile()
+    assert profile["main"] < IMPORT_TIME_BUDGET_US
+    assert not [module for module in LAZY_MODULES if module in profile]
+
+
+def test_main_import_does_not_create_engine():
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import main, db.session as s; print(s.get_engine.cache_info().currsize)",
+        ],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "0"
+
+
+def test_main_imports_without_database_settings():
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if key not in ("REAL_DATABASE_URL", "TEST_DATABASE_URL")
+    }
+    subprocess.run(
+        [sys.executable, "-c", "import main"],
+        cwd=Path(__file__).parent.parent,
+        env=env,
+        check=True,
+    )
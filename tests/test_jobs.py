@@ -0,0 +1,146 @@
+import asyncio
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import settings
+from db.dals.job_dal import JobDAL
+from db.models import Job
+from enums import JobStatusEnum
+from jobs import JobRunner
+
+
+@pytest.fixture
+async def job_session():
+    engine = create_async_engine(settings.TEST_DATABASE_URL)
+    yield sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    await engine.dispose()
+
+
+async def _enqueue(job_session, name, count=1, max_attempts=3):
+    async with job_session() as session, session.begin():
+        for i in range(count):
+            await JobDAL(session).enqueue(name, {"i": i}, max_attempts)
+
+
+async def _claim(job_session, name, limit=10, lease_seconds=60):
+    async with job_session() as session, session.begin():
+        return await JobDAL(session).claim([name], limit, lease_seconds)
+
+
+async def _get_job(job_session, job_id):
+    async with job_session() as session:
+        return (await session.execute(select(Job).where(Job.job_id == job_id))).scalar_one()
+
+
+async def test_claim_skips_jobs_leased_by_others(job_session):
+    name = f"test-{uuid4()}"
+    await _enqueue(job_session, name, count=3)
+    async with job_session() as session, session.begin():
+        first = await JobDAL(session).claim([name], 2, 60)
+        # the first claim is still uncommitted, its rows are skipped rather
+        # than waited for
+        second = await asyncio.wait_for(_claim(job_session, name), timeout=5)
+    assert len(first) == 2
+    assert len(second) == 1
+    assert {job.job_id for job in first}.isdisjoint(job.job_id for job in second)
+    assert await _claim(job_session, name) == []
+
+
+def test_retry_delay_backs_off_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(settings, "JOB_RETRY_BACKOFF", 2)
+    monkeypatch.setattr(settings, "JOB_MAX_RETRY_BACKOFF", 600)
+    for attempts, full_delay in ((1, 2), (2, 4), (5, 32), (20, 600)):
+        delay = JobRunner._retry_delay(attempts)
+        assert full_delay / 2 <= delay <= full_delay
+
+
+async def test_failed_job_is_retried_then_dead_lettered(job_session):
+    name = f"test-{uuid4()}"
+    await _enqueue(job_session, name, max_attempts=2)
+    [job] = await _claim(job_session, name)
+    async with job_session() as session, session.begin():
+        status = await JobDAL(session).fail(job.job_id, job.attempts, "boom", 60)
+    assert status == JobStatusEnum.PENDING
+    # backed off, not claimable before run_after
+    assert await _claim(job_session, name) == []
+    stored = await _get_job(job_session, job.job_id)
+    assert stored.run_after > datetime.utcnow() + timedelta(seconds=50)
+
+    async with job_session() as session, session.begin():
+        await session.execute(
+            update(Job).where(Job.job_id == job.job_id).values(run_after=datetime.utcnow())
+        )
+    [job] = await _claim(job_session, name)
+    assert job.attempts == 2
+    async with job_session() as session, session.begin():
+        status = await JobDAL(session).fail(job.job_id, job.attempts, "boom", 0)
+    assert status == JobStatusEnum.DEAD
+    assert await _claim(job_session, name) == []
+    stored = await _get_job(job_session, job.job_id)
+    assert stored.last_error == "boom"
+
+
+async def test_expired_lease_is_claimed_again(job_session):
+    name = f"test-{uuid4()}"
+    await _enqueue(job_session, name, max_attempts=2)
+    [job] = await _claim(job_session, name, lease_seconds=0)
+    assert job.attempts == 1
+    # the worker died, its lease runs out and another one takes the job over
+    [job] = await _claim(job_session, name, lease_seconds=0)
+    assert job.attempts == 2
+    async with job_session() as session, session.begin():
+        # the first worker's late result no longer matches its attempt
+        assert await JobDAL(session).fail(job.job_id, 1, "late", 0) is None
+
+    # out of attempts, the expired lease dead-letters the job
+    assert await _claim(job_session, name) == []
+    stored = await _get_job(job_session, job.job_id)
+    assert stored.status == JobStatusEnum.DEAD
+    assert stored.last_error == "Lease expired"
+
+
+async def test_postponed_job_keeps_its_attempts(job_session):
+    name = f"test-{uuid4()}"
+    await _enqueue(job_session, name, max_attempts=1)
+    for _ in range(3):
+        [job] = await _claim(job_session, name)
+        assert job.attempts == 1
+        async with job_session() as session, session.begin():
+            assert await JobDAL(session).postpone(job.job_id, job.attempts, 0)
+    stored = await _get_job(job_session, job.job_id)
+    assert stored.status == JobStatusEnum.PENDING
+    assert stored.attempts == 0
+    # still waiting to be claimed, so an identical job coalesces into it
+    async with job_session() as session, session.begin():
+        assert await JobDAL(session).enqueue(name, {"i": 0}, 1, coalesce=True) is None
+
+
+async def test_delete_dead_keeps_recent_and_live_jobs(job_session):
+    name = f"test-{uuid4()}"
+    await _enqueue(job_session, name, count=3)
+    async with job_session() as session, session.begin():
+        job_ids = (
+            await session.execute(select(Job.job_id).where(Job.name == name).order_by(Job.job_id))
+        ).scalars().all()
+        old = datetime.utcnow() - timedelta(days=30)
+        await session.execute(
+            update(Job)
+            .where(Job.job_id.in_(job_ids[:2]))
+            .values(status=JobStatusEnum.DEAD)
+        )
+        await session.execute(
+            update(Job).where(Job.job_id.in_(job_ids[1:])).values(created_at=old)
+        )
+    async with job_session() as session, session.begin():
+        await JobDAL(session).delete_dead(older_than_seconds=86400)
+    async with job_session() as session:
+        remaining = (
+            await session.execute(select(Job.job_id).where(Job.name == name).order_by(Job.job_id))
+        ).scalars().all()
+    # the recent dead job and the old pending one stay
+    assert remaining == [job_ids[0], job_ids[2]]
@@ -0,0 +1,35 @@
+import asyncio
+
+from db.loaders import BatchLoader
+
+
+async def test_batch_loader_coalesces_and_memoizes():
+    batches = []
+
+    async def fetch_many(keys):
+        batches.append(sorted(keys))
+        return {key: key * 10 for key in keys if key != 3}
+
+    loader = BatchLoader(fetch_many, asyncio.Lock())
+    values = await asyncio.gather(*(loader.load(key) for key in [1, 2, 1, 3]))
+    assert values == [10, 20, 10, None]
+    assert await loader.load_many([2, 4]) == [20, 40]
+    assert batches == [[1, 2, 3], [4]]
+    assert not loader._dispatching
+
+
+async def test_batch_loader_keeps_dispatch_task_until_done():
+    release = asyncio.Event()
+
+    async def fetch_many(keys):
+        await release.wait()
+        return {key: key for key in keys}
+
+    loader = BatchLoader(fetch_many, asyncio.Lock())
+    value = loader.load(1)
+    await asyncio.sleep(0)
+    assert len(loader._dispatching) == 1
+    release.set()
+    assert await value == 1
+    await asyncio.sleep(0)
+    assert not loader._dispatching
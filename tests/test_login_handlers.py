@@ -0,0 +1,79 @@
+import json
+
+from fastapi import Request
+
+import settings
+from api.handlers.login import _client_ip
+
+
+async def test_refresh_token_rotation(client):
+    client.post("/user/", data=json.dumps({
+      "name": "Nikolai",
+      "surname": "Sviridov",
+      "email": "lol@kek.com",
+      "password": "SamplePass1!",
+    }))
+    resp = client.post(
+        "/login/token", data={"username": "lol@kek.com", "password": "SamplePass1!"}
+    )
+    assert resp.status_code == 200
+    tokens = resp.json()
+    resp = client.post(
+        "/login/refresh", data=json.dumps({"refresh_token": tokens["refresh_token"]})
+    )
+    assert resp.status_code == 200
+    rotated = resp.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+    resp = client.get(
+        "/login/test_auth_endpoint",
+        headers={"Authorization": f"Bearer {rotated['access_token']}"},
+    )
+    assert resp.status_code == 200
+    current_user = resp.json()["current_user"]
+    assert current_user["email"] == "lol@kek.com"
+    assert "hashed_password" not in current_user
+    # replaying a used refresh token revokes the whole login
+    resp = client.post(
+        "/login/refresh", data=json.dumps({"refresh_token": tokens["refresh_token"]})
+    )
+    assert resp.status_code == 401
+    resp = client.post(
+        "/login/refresh", data=json.dumps({"refresh_token": rotated["refresh_token"]})
+    )
+    assert resp.status_code == 401
+
+
+async def test_logout_revokes_access_token(client):
+    client.post("/user/", data=json.dumps({
+      "name": "Nikolai",
+      "surname": "Sviridov",
+      "email": "lol@kek.com",
+      "password": "SamplePass1!",
+    }))
+    tokens = client.post(
+        "/login/token", data={"username": "lol@kek.com", "password": "SamplePass1!"}
+    ).json()
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    resp = client.post(
+        "/login/logout",
+        headers=headers,
+        data=json.dumps({"refresh_token": tokens["refresh_token"]}),
+    )
+    assert resp.status_code == 204
+    assert client.get("/login/test_auth_endpoint", headers=headers).status_code == 401
+    resp = client.post(
+        "/login/refresh", data=json.dumps({"refresh_token": tokens["refresh_token"]})
+    )
+    assert resp.status_code == 401
+
+
+def test_client_ip_is_the_one_the_proxy_appended(monkeypatch):
+    monkeypatch.setattr(settings, "TRUST_FORWARDED_FOR", True)
+    request = Request({
+        "type": "http",
+        "headers": [(b"x-forwarded-for", b"6.6.6.6, 10.0.0.7")],
+        "client": ("10.0.0.1", 1234),
+    })
+    assert _client_ip(request) == "10.0.0.7"
+    monkeypatch.setattr(settings, "TRUST_FORWARDED_FOR", False)
+    assert _client_ip(request) == "10.0.0.1"
@@ -0,0 +1,188 @@
+import json
+from datetime import datetime, timedelta
+from uuid import UUID, uuid4
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import settings
+from db.dals.order_dal import OrderDAL
+
+
+async def test_create_order_idempotency_key(client):
+    user = client.post("/user/", data=json.dumps({
+      "name": "Nikolai",
+      "surname": "Sviridov",
+      "email": "lol@kek.com",
+      "password": "SamplePass1!",
+    })).json()
+    product = client.post("/product/", data=json.dumps({
+      "name": "Laptop",
+      "price": 999.0,
+      "stock_quantity": 5,
+    })).json()
+    order_data = {
+      "user_id": user["user_id"],
+      "product_id": product["product_id"],
+      "quantity": 2,
+      "total_price": 1998.0,
+    }
+    headers = {"Idempotency-Key": "order-1"}
+    first = client.post("/order/", data=json.dumps(order_data), headers=headers)
+    retry = client.post("/order/", data=json.dumps(order_data), headers=headers)
+    assert first.status_code == 200
+    assert retry.status_code == 200
+    assert retry.json() == first.json()
+    order_data["total_price"] = 1.0
+    retry = client.post("/order/", data=json.dumps(order_data), headers=headers)
+    assert retry.status_code == 200
+    assert retry.json() == first.json()
+    resp = client.get(f"/product/{product['product_id']}")
+    assert resp.json()["stock_quantity"] == 3
+    order_data["quantity"] = 1
+    resp = client.post("/order/", data=json.dumps(order_data), headers=headers)
+    assert resp.status_code == 422
+
+
+async def test_create_order_price_from_product(client):
+    user = client.post("/user/", data=json.dumps({
+      "name": "Nikolai",
+      "surname": "Sviridov",
+      "email": "lol@kek.com",
+      "password": "SamplePass1!",
+    })).json()
+    product = client.post("/product/", data=json.dumps({
+      "name": "Laptop",
+      "price": 999.0,
+      "stock_quantity": 5,
+    })).json()
+    resp = client.post("/order/", data=json.dumps({
+      "user_id": user["user_id"],
+      "product_id": product["product_id"],
+      "quantity": 2,
+      "total_price": 1.0,
+    }))
+    assert resp.status_code == 200
+    assert resp.json()["total_price"] == 1998.0
+    resp = client.post("/order/", data=json.dumps({
+      "user_id": user["user_id"],
+      "product_id": product["product_id"],
+      "quantity": 4,
+    }))
+    assert resp.status_code == 400
+    resp = client.get(f"/product/{product['product_id']}")
+    assert resp.json()["stock_quantity"] == 3
+
+
+
+async def test_create_order_queues_one_rollup_refresh(client, asyncpg_pool):
+    user = client.post("/user/", data=json.dumps({
+      "name": "Nikolai",
+      "surname": "Sviridov",
+      "email": "jobs@kek.com",
+      "password": "SamplePass1!",
+    })).json()
+    product = client.post("/product/", data=json.dumps({
+      "name": "Laptop",
+      "price": 999.0,
+      "stock_quantity": 5,
+    })).json()
+    for _ in range(3):
+        resp = client.post("/order/", data=json.dumps({
+          "user_id": user["user_id"],
+          "product_id": product["product_id"],
+          "quantity": 1,
+        }))
+        assert resp.status_code == 200
+    async with asyncpg_pool.acquire() as connection:
+        waiting = await connection.fetchval(
+            """SELECT count(*) FROM jobs
+            WHERE name = 'refresh_order_rollups' AND status = 'PENDING' AND attempts = 0;"""
+        )
+    assert waiting == 1
+
+
+async def test_expire_pending_orders_releases_stock(client, asyncpg_pool):
+    user = client.post("/user/", data=json.dumps({
+      "name": "Nikolai",
+      "surname": "Sviridov",
+      "email": "sweep@kek.com",
+      "password": "SamplePass1!",
+    })).json()
+    product = client.post("/product/", data=json.dumps({
+      "name": "Laptop",
+      "price": 999.0,
+      "stock_quantity": 5,
+    })).json()
+    orders = [
+        client.post("/order/", data=json.dumps({
+          "user_id": user["user_id"],
+          "product_id": product["product_id"],
+          "quantity": quantity,
+        })).json()
+        for quantity in (1, 2)
+    ]
+    async with asyncpg_pool.acquire() as connection:
+        await connection.execute(
+            """UPDATE orders SET order_date = order_date - interval '2 days'
+            WHERE order_id = $1;""",
+            UUID(orders[1]["order_id"]),
+        )
+    engine = create_async_engine(settings.TEST_DATABASE_URL)
+    session_factory = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with session_factory() as session, session.begin():
+        canceled = await OrderDAL(session).expire_pending_orders(
+            datetime.utcnow() - timedelta(days=1), limit=100
+        )
+    await engine.dispose()
+    assert canceled == 1
+    assert client.get(f"/product/{product['product_id']}").json()["stock_quantity"] == 4
+    assert client.get(f"/order/{orders[1]['order_id']}").json()["order_status"] == "CANCELED"
+    # the stock of a canceled order isn't returned twice
+    assert client.delete(f"/order/{orders[1]['order_id']}").status_code == 200
+    assert client.get(f"/product/{product['product_id']}").json()["stock_quantity"] == 4
+
+async def test_get_order_changes(client):
+    user = client.post("/user/", data=json.dumps({
+      "name": "Nikolai",
+      "surname": "Sviridov",
+      "email": "lol@kek.com",
+      "password": "SamplePass1!",
+    })).json()
+    product = client.post("/product/", data=json.dumps({
+      "name": "Laptop",
+      "price": 999.0,
+      "stock_quantity": 5,
+    })).json()
+    cursor = client.get("/order/changes").json()["cursor"]
+    order = client.post("/order/", data=json.dumps({
+      "user_id": user["user_id"],
+      "product_id": product["product_id"],
+      "quantity": 1,
+      "total_price": 999.0,
+    })).json()
+    client.patch(
+      f"/order/{order['order_id']}",
+      data=json.dumps({"quantity": 2, "total_price": 1998.0, "order_status": None}),
+    )
+    resp = client.get(f"/order/changes?since={cursor}")
+    assert resp.status_code == 200
+    changes = resp.json()
+    assert [event["event_type"] for event in changes["events"]] == ["CREATED", "UPDATED"]
+    assert changes["events"][-1]["payload"]["quantity"] == 2
+    resp = client.get(f"/order/changes?since={changes['cursor']}")
+    assert resp.json() == {"events": [], "cursor": changes["cursor"]}
+
+
+async def test_stream_order_status_unknown_order(client):
+    resp = client.get(f"/order/{uuid4()}/events")
+    assert resp.status_code == 404
+
+
+async def test_export_orders_arrow_stream(client):
+    resp = client.get("/order/export")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    assert resp.headers["x-export-cursor"]
+    resp = client.get("/order/export", params={"since": "bad"})
+    assert resp.status_code == 422
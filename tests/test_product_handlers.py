@@ -0,0 +1,104 @@
+import json
+
+
+async def test_get_product_conditional(client):
+    product_data = {
+      "name": "Laptop",
+      "description": "14 inch",
+      "price": 999.0,
+      "stock_quantity": 5,
+    }
+    resp = client.post("/product/", data=json.dumps(product_data))
+    product_id = resp.json()["product_id"]
+    resp = client.get(f"/product/{product_id}")
+    assert resp.status_code == 200
+    etag = resp.headers["etag"]
+    assert resp.headers["cache-control"]
+    resp = client.get(f"/product/{product_id}", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.headers["etag"] == etag
+    resp = client.patch(f"/product/{product_id}", data=json.dumps({"price": 899.0}))
+    assert resp.status_code == 200
+    resp = client.get(f"/product/{product_id}", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["etag"] != etag
+    assert resp.json()["price"] == 899.0
+
+
+async def test_product_stock_shards(client):
+    product_data = {
+      "name": "Console",
+      "price": 499.0,
+      "stock_quantity": 7,
+    }
+    product_id = client.post("/product/", data=json.dumps(product_data)).json()["product_id"]
+    resp = client.put(f"/product/{product_id}/stock-shards", data=json.dumps({"shards": 4}))
+    assert resp.status_code == 200
+    assert resp.json() == {"updated_product_id": product_id}
+    assert client.get(f"/product/{product_id}").json()["stock_quantity"] == 7
+    client.patch(f"/product/{product_id}", data=json.dumps({"stock_quantity": 9}))
+    assert client.get(f"/product/{product_id}").json()["stock_quantity"] == 9
+    resp = client.put(f"/product/{product_id}/stock-shards", data=json.dumps({"shards": 0}))
+    assert resp.status_code == 200
+    assert client.get(f"/product/{product_id}").json()["stock_quantity"] == 9
+
+
+async def test_get_all_products_description_opt_in(client):
+    product_data = {
+      "name": "Tablet",
+      "description": "10 inch, " * 500,
+      "price": 299.0,
+      "stock_quantity": 3,
+    }
+    product_id = client.post("/product/", data=json.dumps(product_data)).json()["product_id"]
+    resp = client.get("/product/")
+    assert resp.status_code == 200
+    listed = {product["product_id"]: product for product in resp.json()}
+    assert listed[product_id]["description"] is None
+    etag = resp.headers["etag"]
+    resp = client.get("/product/", params={"include_description": True})
+    assert resp.headers["etag"] != etag
+    listed = {product["product_id"]: product for product in resp.json()}
+    assert listed[product_id]["description"] == product_data["description"]
+    assert client.get(f"/product/{product_id}").json()["description"] == product_data["description"]
+
+
+async def test_update_products_batch(client):
+    product_ids = [
+        client.post(
+            "/product/",
+            data=json.dumps({"name": f"Cable {i}", "price": 9.0, "stock_quantity": 2}),
+        ).json()["product_id"]
+        for i in range(3)
+    ]
+    client.put(f"/product/{product_ids[2]}/stock-shards", data=json.dumps({"shards": 4}))
+    missing_id = "00000000-0000-0000-0000-000000000000"
+    body = {"updates": [
+        {"product_id": product_ids[0], "price": 7.5},
+        {"product_id": product_ids[1], "stock_quantity": 0},
+        {"product_id": product_ids[2], "price": 11.0, "stock_quantity": 30},
+        {"product_id": missing_id, "stock_quantity": 1},
+    ]}
+    resp = client.patch("/product/batch", data=json.dumps(body))
+    assert resp.status_code == 200
+    assert resp.json()["results"] == [
+        {"product_id": product_ids[0], "updated": True, "price": 7.5,
+         "stock_quantity": 2, "product_status": "ACTIVE"},
+        {"product_id": product_ids[1], "updated": True, "price": 9.0,
+         "stock_quantity": 0, "product_status": "OUT_OF_STOCK"},
+        {"product_id": product_ids[2], "updated": True, "price": 11.0,
+         "stock_quantity": 30, "product_status": "ACTIVE"},
+        {"product_id": missing_id, "updated": False, "price": None,
+         "stock_quantity": None, "product_status": None},
+    ]
+    assert client.get(f"/product/{product_ids[2]}").json()["stock_quantity"] == 30
+    # a price change leaves the stock on the sub-counters, it is still reported
+    body = {"updates": [{"product_id": product_ids[2], "price": 12.0}]}
+    resp = client.patch("/product/batch", data=json.dumps(body))
+    assert resp.json()["results"][0]["stock_quantity"] == 30
+    assert client.get(f"/product/{product_ids[2]}").json()["stock_quantity"] == 30
+    body = {"updates": [{"product_id": product_ids[1], "stock_quantity": 5}]}
+    resp = client.patch("/product/batch", data=json.dumps(body))
+    assert resp.json()["results"][0]["product_status"] == "ACTIVE"
+    body = {"updates": [{"product_id": product_ids[0]}]}
+    assert client.patch("/product/batch", data=json.dumps(body)).status_code == 422
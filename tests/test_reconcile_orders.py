@@ -0,0 +1,27 @@
+from uuid import uuid4
+
+from commands.reconcile_orders import find_discrepancies
+
+
+def test_find_discrepancies():
+    product_id = uuid4()
+    order_ids = [uuid4() for _ in range(5)]
+    columns = (
+        order_ids,
+        [product_id, product_id, product_id, product_id, None],
+        [2, 3, 1, 1, 4],
+        [20.0, 27.0, 12.5, 10.004, 40.0],
+        [10.0, 10.0, 10.0, 10.0, None],
+    )
+    report_rows, totals = find_discrepancies(columns, tolerance=0.01)
+    assert [row[0] for row in report_rows] == [order_ids[1], order_ids[2], order_ids[4]]
+    assert report_rows[0][4:] == [30.0, 27.0, -3.0]
+    # an order without a product can't be checked, it is listed unpriced
+    assert report_rows[2] == [order_ids[4], None, 4, None, None, 40.0, None]
+    assert totals == {
+        "orders": 5,
+        "mismatched": 2,
+        "without_product": 1,
+        "overcharged": 2.5,
+        "undercharged": 3.0,
+    }
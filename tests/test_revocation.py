@@ -0,0 +1,48 @@
+from uuid import uuid4
+
+from revocation import BloomFilter, RevocationList
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    added = [uuid4().hex for _ in range(1000)]
+    for jti in added:
+        bloom.add(jti)
+    assert all(jti in bloom for jti in added)
+
+
+def test_bloom_filter_false_positive_rate():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for _ in range(1000):
+        bloom.add(uuid4().hex)
+    false_positives = sum(uuid4().hex in bloom for _ in range(10000))
+    assert false_positives < 300
+
+
+class _RevokedTokens:
+    """Stands in for RevokedTokenDAL, rows are (tx_id, seq, jti)"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.cursors = []
+
+    async def get_revoked_since(self, tx_id, seq):
+        self.cursors.append((tx_id, seq))
+        return [row for row in self.rows if row[:2] > (tx_id, seq)]
+
+    async def is_revoked(self, jti):
+        return any(row[2] == jti for row in self.rows)
+
+
+async def test_revocation_list_rebuild_is_sized_for_the_live_rows():
+    dal = _RevokedTokens([(1, seq, f"jti-{seq}") for seq in range(10)])
+    revocations = RevocationList(capacity=4, error_rate=0.01, refresh_interval=0)
+    assert await revocations.is_revoked("jti-3", dal)
+    # over capacity, rebuilt once with room for the rows left
+    assert not await revocations.is_revoked("other", dal)
+    assert revocations._filter.capacity == 20
+    # jtis revoked here aren't counted until a refresh loads their rows
+    for i in range(12):
+        revocations.add(f"local-{i}")
+        await revocations.is_revoked("other", dal)
+    assert dal.cursors == [(0, 0), (0, 0)] + [(1, 9)] * 12
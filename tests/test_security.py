@@ -0,0 +1,32 @@
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from jose import JWTError
+
+from security import KeyRing, _load_pem_key
+
+
+def _private_pem():
+    return ec.generate_private_key(ec.SECP256R1()).private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+
+
+def _public_only(key):
+    return key._replace(private_key=None)
+
+
+def test_key_ring_rotation():
+    old_key, new_key = _load_pem_key(_private_pem()), _load_pem_key(_private_pem())
+    old_ring = KeyRing("old", {"old": old_key})
+    token = old_ring.encode({"sub": "lol@kek.com"})
+    # the retired key only verifies, new tokens are signed with the new one
+    ring = KeyRing("new", {"old": _public_only(old_key), "new": new_key})
+    assert ring.decode(token) == {"sub": "lol@kek.com"}
+    assert ring.decode(ring.encode({"sub": "a"})) == {"sub": "a"}
+    with pytest.raises(JWTError):
+        KeyRing("new", {"new": new_key}).decode(token)
+    with pytest.raises(ValueError):
+        KeyRing("old", {"old": _public_only(old_key)})
@@ -0,0 +1,47 @@
+from throttling import InMemoryThrottleBackend, LoginThrottle
+
+
+async def test_token_bucket_refills():
+    backend = InMemoryThrottleBackend(max_keys=10)
+    assert await backend.take("ip:1", rate=1, burst=2, now=0) == 0
+    assert await backend.take("ip:1", rate=1, burst=2, now=0) == 0
+    assert await backend.take("ip:1", rate=1, burst=2, now=0) == 1
+    assert await backend.take("ip:1", rate=1, burst=2, now=0.5) == 0.5
+    assert await backend.take("ip:1", rate=1, burst=2, now=1.5) == 0
+
+
+async def test_token_bucket_drops_least_recently_used_keys():
+    backend = InMemoryThrottleBackend(max_keys=2)
+    for key in ("a", "b", "c"):
+        await backend.take(key, rate=1, burst=1, now=0)
+    assert await backend.take("a", rate=1, burst=1, now=0) == 0
+    assert await backend.take("c", rate=1, burst=1, now=0) == 1
+
+
+async def test_login_throttle_by_email_per_ip():
+    throttle = LoginThrottle(
+        InMemoryThrottleBackend(max_keys=100),
+        ip_rate=1, ip_burst=10, email_rate=0.01, email_burst=2,
+        account_rate=0.01, account_burst=10,
+    )
+    assert await throttle.check("10.0.0.1", "lol@kek.com") == 0
+    assert await throttle.check("10.0.0.1", "LOL@kek.com") == 0
+    assert await throttle.check("10.0.0.1", "lol@kek.com") > 0
+    assert await throttle.check("10.0.0.1", "other@kek.com") == 0
+    # the attacker's attempts don't lock the owner out from their own IP
+    assert await throttle.check("10.0.0.2", "lol@kek.com") == 0
+
+
+async def test_login_throttle_by_account_across_ips():
+    throttle = LoginThrottle(
+        InMemoryThrottleBackend(max_keys=100),
+        ip_rate=1, ip_burst=10, email_rate=0.01, email_burst=2,
+        account_rate=0.01, account_burst=10,
+    )
+    # every IP stays under its own limits, the account's bucket runs out
+    results = [
+        await throttle.check(f"10.0.1.{i}", "LOL@kek.com") for i in range(12)
+    ]
+    assert results[:10] == [0] * 10
+    assert all(retry_after > 0 for retry_after in results[10:])
+    assert await throttle.check("10.0.1.99", "other@kek.com") == 0
@@ -0,0 +1,95 @@
+import time
+from collections import OrderedDict
+from typing import Protocol
+
+import settings
+
+
+class ThrottleBackend(Protocol):
+    """Storage of token buckets, swap in a shared one to throttle across workers"""
+
+    async def take(self, key: str, rate: float, burst: int, now: float) -> float:
+        """Take a token from the bucket of key.
+
+        Returns 0 when a token was taken, else the seconds until the next
+        token is available. Buckets refill rate tokens per second up to burst.
+        """
+
+
+class InMemoryThrottleBackend:
+    """Per-process buckets, (tokens, updated_at) per key, least recently used
+    keys are dropped beyond max_keys so a flood of keys can't exhaust memory"""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int, now: float) -> float:
+        tokens, updated_at = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+        if tokens >= 1:
+            tokens -= 1
+            retry_after = 0.0
+        else:
+            retry_after = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+class LoginThrottle:
+    """Token buckets for login attempts, per client IP, per email and IP,
+    and per email across all IPs.
+
+    The tight email and IP bucket limits guessing one account from one
+    place. The account bucket bounds guessing it from many IPs, it is
+    larger, so it takes many IPs over their own limit to lock the owner
+    out. An attempt only draws from a bucket once the ones before it let
+    it through.
+    """
+
+    def __init__(
+        self,
+        backend: ThrottleBackend,
+        ip_rate: float,
+        ip_burst: int,
+        email_rate: float,
+        email_burst: int,
+        account_rate: float,
+        account_burst: int,
+    ):
+        self.backend = backend
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst
+        self.email_rate = email_rate
+        self.email_burst = email_burst
+        self.account_rate = account_rate
+        self.account_burst = account_burst
+
+    async def check(self, ip: str, email: str) -> float:
+        """Seconds the client must wait, 0 when the attempt may go ahead"""
+        # wall clock, buckets in a shared backend are updated by many hosts
+        now = time.time()
+        email = email.lower()
+        buckets = [
+            (f"ip:{ip}", self.ip_rate, self.ip_burst),
+            (f"email:{email}:{ip}", self.email_rate, self.email_burst),
+            (f"account:{email}", self.account_rate, self.account_burst),
+        ]
+        for key, rate, burst in buckets:
+            retry_after = await self.backend.take(key, rate, burst, now)
+            if retry_after:
+                return retry_after
+        return 0.0
+
+
+login_throttle = LoginThrottle(
+    InMemoryThrottleBackend(max_keys=settings.LOGIN_THROTTLE_MAX_KEYS),
+    ip_rate=settings.LOGIN_IP_ATTEMPTS_PER_MINUTE / 60,
+    ip_burst=settings.LOGIN_IP_BURST,
+    email_rate=settings.LOGIN_EMAIL_ATTEMPTS_PER_MINUTE / 60,
+    email_burst=settings.LOGIN_EMAIL_BURST,
+    account_rate=settings.LOGIN_ACCOUNT_ATTEMPTS_PER_MINUTE / 60,
+    account_burst=settings.LOGIN_ACCOUNT_BURST,
+)